@@ -5,7 +5,7 @@ This script uses OpenAI GPT to enhance existing yoga business data by:
 1. Analyzing completeness of current data
 2. Using AI to extract missing information
 3. Improving data quality and consistency
-4. Processing in cost-controlled batches
+4. Processing in cost-controlled batches with concurrent API requests
 
 Author: AI Assistant
 For: Bali Yoga Studios & Retreats Project
@@ -15,7 +15,9 @@ Date: August 2025
 import json
 import os
 import time
+import asyncio
 import argparse
+from array import array
 from pathlib import Path
 from datetime import datetime
 import sys
@@ -35,20 +37,272 @@ except ImportError:
     print("❌ Error: openai not installed. Run: pip install openai")
     sys.exit(1)
 
-MODEL_NAME = "gpt-4o-mini"  # Can be changed to other models as needed
+from yoga_rate_limiter import (
+    AdaptiveRateLimiter,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    parse_retry_after
+)
+from yoga_response_cache import ResponseCache, DEFAULT_CACHE_FILE, make_cache_key
+from yoga_run_journal import RunJournal, load_journal
+from yoga_batch_mode import BatchJob, BATCH_PRICE_MULTIPLIER
+from yoga_cost_ledger import CostLedger, SharedCostLedger, TokenCounter, get_pricing, price_tokens, usage_tokens
+from yoga_business_record import BusinessRecord
+from yoga_columnar_analysis import CompletenessAnalysis, ANALYSIS_CHUNK_SIZE
+from yoga_json_stream import iter_chunks
+from yoga_incremental import PreviousOutput, STATUS_NEW, STATUS_CHANGED, STATUS_EXPIRED, STATUS_UNCHANGED
+from yoga_retry_queue import (
+    RetryQueue,
+    DEFAULT_MAX_ATTEMPTS,
+    dead_letter_path,
+    load_dead_letter,
+    write_dead_letter
+)
+from yoga_priority_scheduler import BudgetSelector
+from yoga_dedup import DuplicateFinder, copy_enhancement
+from yoga_rule_extraction import RuleExtractor
+from yoga_postgres_sink import PostgresSink, DEFAULT_TABLE, DATABASE_URL_VARIABLES, redact_dsn
+from yoga_sharding import (
+    shard_of, parse_shard, shard_path, shared_ledger_path, merge_shards, merge_dead_letters, merge_stats,
+    strip_options, worker_args, run_workers
+)
+from yoga_hedging import HedgePolicy, DEFAULT_HEDGE_PERCENTILE, DEFAULT_HEDGE_BUDGET_SHARE
+from yoga_snapshot import Snapshot, dataset_writer, is_snapshot, iter_businesses, read_metadata
+from yoga_search_index import SearchIndex, search_index_path
+from yoga_metrics import (
+    RunMetrics, NULL_METRICS, DEFAULT_SNAPSHOT_INTERVAL,
+    STAGE_SLOT_WAIT, STAGE_PARSE, STAGE_MERGE
+)
+from yoga_response_schema import (
+    ENHANCEMENT_FIELDS,
+    PACKED_RESPONSE_FORMAT,
+    extract_json_object,
+    output_token_limit,
+    response_format,
+    validate_enhancement
+)
+
+MODEL_NAME = "gpt-4o-mini"  # Can be changed to other models as needed (see MODEL_PRICING)
+
+# HTTP statuses worth retrying: rate limited, or a transient server-side failure
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Businesses scoring below this completeness get enhanced
+ENHANCEMENT_THRESHOLD = 70
+
+# Fields merge_ai_enhancement writes, carried over when --incremental reuses an enhancement
+AI_ENHANCED_FIELDS = (
+    'yoga_styles', 'amenities', 'languages_spoken', 'business_description', 'opening_hours',
+    'phone_number', 'website', 'email_address', 'meditation_offered', 'teacher_training',
+    'drop_in_price_usd', 'price_range', 'ai_enhancement_confidence', 'ai_enhanced',
+    'ai_enhancement_timestamp', 'ai_input_fingerprint'
+)
+DEFAULT_INCREMENTAL_TTL_DAYS = 30
+
+# Cities listed in the completeness analysis
+CITY_BREAKDOWN_ROWS = 10
+
+# Prompt prefixes shorter than this aren't cached by the provider; longer ones
+# are cached in increments, after the first request that carries them
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+# Output size assumed for cost projections until the cache has real averages
+DEFAULT_EXPECTED_OUTPUT_TOKENS = 350
+
+# Request packing: several businesses share one prompt's instructions and context
+PACK_OUTPUT_TOKENS_PER_BUSINESS = 400  # Generous per-business answer size
+MAX_PACK_OUTPUT_TOKENS = 16000  # Stay under the model's output limit
+
+# Output tokens allowed per field when re-asking for fields that failed validation
+FIELD_REASK_OUTPUT_TOKENS = 150
+
+# Static prompt sections. Everything that doesn't depend on the business goes
+# in the system message, so every request starts with the same prefix and the
+# provider's prompt cache can serve it; only the business details vary.
+ENHANCEMENT_JSON_FORMAT = """{
+    "enhanced_yoga_styles": ["list of yoga styles offered, e.g., Hatha, Vinyasa, Yin, etc."],
+    "enhanced_amenities": ["specific amenities offered, e.g., mats, showers, pool, etc."],
+    "enhanced_languages": ["languages spoken by instructors, e.g., English, Indonesian, etc."],
+    "enhanced_description": "professional 1-2 sentence business description",
+    "enhanced_opening_hours": [{"day": "Monday", "hours": "7 AM to 7 PM"}, ...] or null if unknown,
+    "enhanced_phone_number": "phone number in international format",
+    "enhanced_website": "website URL or null if unknown",
+    "enhanced_email": "email address or null if unknown",
+    "meditation_offered": true/false,
+    "teacher_training": true/false,
+    "drop_in_price_usd": 15 (approximate drop-in class price in USD or null),
+    "price_range": "budget/mid-range/luxury",
+    "confidence_score": 85
+}"""
+
+ENHANCEMENT_RULES = """RULES:
+1. For yoga styles: Be specific (not just "yoga" but actual styles taught)
+2. For amenities: Include physical facilities and services
+3. For languages: Focus on languages used for instruction
+4. For description: Create a professional, accurate description
+5. Only include information you're confident about
+6. If no additional info can be inferred, return null or empty arrays
+7. Confidence score: 0-100 based on how certain you are about the enhancements
+8. For opening hours: Use the format shown above with day and hours
+9. For price: Estimate based on location and amenities if unknown"""
+
+BALI_YOGA_CONTEXT = """CONTEXT ABOUT BALI YOGA SCENE:
+- Ubud is known as Bali's yoga hub with many studios and retreats
+- Canggu and Seminyak are popular beach areas with yoga studios
+- Many studios offer teacher training programs
+- Common amenities include mats, props, showers, and cafes
+- Typical drop-in prices range from $8-20 USD
+- Many studios offer both group and private classes"""
+
+# Labels used by the website's filters (lib/filter-options.ts), so enhanced
+# values line up with what visitors can filter on
+YOGA_STYLE_VOCABULARY = (
+    ('Hatha', 'gentle, alignment-focused practice'),
+    ('Yin', 'slow, meditative poses'),
+    ('Vinyasa', 'flow-based movement'),
+    ('Meditation', 'mindfulness and breathing'),
+    ('Ashtanga', 'traditional dynamic practice'),
+    ('Restorative', 'deeply relaxing poses'),
+    ('Kundalini', 'spiritual awakening practice'),
+    ('Power Yoga', 'strength-building flow'),
+    ('Hot Yoga', 'heated room practice'),
+    ('Iyengar', 'precision and alignment'),
+    ('Aerial Yoga', 'suspended yoga practice'),
+    ('Gentle Yoga', 'beginner-friendly practice')
+)
+AMENITY_VOCABULARY = (
+    ('Showers', 'clean shower facilities'),
+    ('Yoga Mats Provided', 'free mat rental'),
+    ('Yoga Shop', 'equipment and clothing'),
+    ('Changing Rooms', 'private changing areas'),
+    ('Massage Services', 'on-site massage therapy'),
+    ('Spa Services', 'full spa treatments'),
+    ('Yoga Props', 'blocks, straps, bolsters'),
+    ('Cafe', 'healthy food and drinks'),
+    ('Free WiFi', 'complimentary internet'),
+    ('Parking Available', 'parking space'),
+    ('Accommodation', 'on-site lodging'),
+    ('Garden Setting', 'natural outdoor space'),
+    ('Swimming Pool', 'pool access included'),
+    ('Restaurant', 'full dining service'),
+    ('Organic Food', 'healthy, organic meals'),
+    ('Sound System', 'quality audio equipment'),
+    ('Air Conditioning', 'climate controlled'),
+    ('Scenic Views', 'beautiful surroundings')
+)
+LANGUAGE_VOCABULARY = ('English', 'Indonesian', 'German', 'French', 'Dutch', 'Spanish', 'Italian', 'Japanese')
+
+PREFERRED_VALUES = f"""PREFERRED VALUES (use these exact names where they apply; add others only when clearly offered):
+Yoga styles:
+{chr(10).join(f"- {label}: {description}" for label, description in YOGA_STYLE_VOCABULARY)}
+Amenities:
+{chr(10).join(f"- {label}: {description}" for label, description in AMENITY_VOCABULARY)}
+Languages: {', '.join(LANGUAGE_VOCABULARY)}"""
+
+FIELD_GUIDANCE = """FIELD GUIDANCE:
+- Phone numbers: international format starting with +62 for Indonesian numbers, e.g. "+62 812-3456-7890"
+- Website: the business's own site only; Instagram, Facebook and booking-platform pages are not websites
+- Email: only an address you can actually attribute to the business; never guess one from the website domain
+- Opening hours: one entry per day using full English day names; use "Closed" for closed days
+- Description: factual and specific to this business (setting, styles, who it suits), with no superlatives or marketing claims
+- Price range: budget is about $5-15, mid-range $15-30, and luxury $30 and up per drop-in class or resort pricing
+- Areas: South Bali (Seminyak, Canggu, Uluwatu, Denpasar), Central Bali (Ubud, Gianyar), East Bali (Karangasem, Amed, Candidasa), North Bali (Lovina, Singaraja), West Bali (Tabanan, Bedugul), and the islands (Nusa Penida, Lembongan)"""
+
+SYSTEM_MESSAGE = f"""You are an expert at extracting and enhancing yoga business information in Bali. Always return valid JSON.
+
+TASK: You will be given the known data for one or more yoga businesses in Bali. Enhance and expand each business's information. Use the existing data as context but improve and add to it. Fields that aren't listed for a business are unknown.
+
+For a single business, return ONLY valid JSON in this exact format:
+{ENHANCEMENT_JSON_FORMAT}
+
+When several businesses are given, each introduced by its id in square brackets, return ONLY valid JSON: an object whose keys are the business ids (every id exactly once), each mapping to an object in the format above.
+
+{ENHANCEMENT_RULES}
+
+{PREFERRED_VALUES}
+
+{FIELD_GUIDANCE}
+
+{BALI_YOGA_CONTEXT}"""
 
 class YogaBusinessAIEnhancer:
-    def __init__(self, max_cost=30.0, batch_size=50):
+    def __init__(self, max_cost=30.0, batch_size=50, concurrency=8,
+                 requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_retries=5,
+                 use_cache=True, cache_only=False, cache_file=None, base_url=None,
+                 pack_size=1, max_attempts=DEFAULT_MAX_ATTEMPTS, prioritize=True, assume_yes=False,
+                 quiet=False, metrics=None, shard=None, shared_ledger=None, dedup=True,
+                 db_url=None, db_table=DEFAULT_TABLE, rule_extraction=True, hedge=None, search_index=True):
         """
         Initialize the AI enhancer
         
         Args:
             max_cost (float): Maximum cost in USD to spend
             batch_size (int): Number of businesses to process per batch
+            concurrency (int): Maximum number of API requests in flight at once
+            requests_per_minute (int): Request rate limit to pace against
+            tokens_per_minute (int): Token rate limit to pace against
+            max_retries (int): Retries per request on rate limits and server errors
+            use_cache (bool): Reuse stored responses for identical requests
+            cache_only (bool): Never call the API; only use cached responses
+            cache_file (str): Path to the response cache database
+            base_url (str): Alternative API base URL (e.g. a local stand-in server)
+            pack_size (int): Businesses per request (1 disables packing)
+            max_attempts (int): Attempts per business before it is dead-lettered
+            prioritize (bool): When the budget can't cover every business, spend it
+                on the best value per dollar instead of in file order
+            assume_yes (bool): Start enhancing without asking for confirmation
+            quiet (bool): Leave out per-business progress lines
+            metrics (RunMetrics): Where to record timings and counters (default: nowhere)
+            shard (tuple): (index, count) to only enhance the businesses in one shard
+            shared_ledger (str): SQLite ledger whose budget is shared with other workers
+            dedup (bool): Enhance one business per cluster of duplicate listings and
+                copy its result to the rest
+            db_url (str): Postgres/Supabase connection string to upsert the output into
+                instead of writing a JSON file
+            db_table (str): Table to upsert into
+            rule_extraction (bool): Fill what text rules can find before deciding
+                which businesses still need the model
+            hedge (HedgePolicy): Send a duplicate of calls slower than recent ones
+                and use whichever answers first (default: no hedging)
+            search_index (bool): Keep a search and facet index sidecar next to the output file
         """
         self.max_cost = max_cost
         self.batch_size = batch_size
-        self.current_cost = 0.0
+        self.concurrency = max(1, concurrency)
+        self.pack_size = min(max(1, pack_size), MAX_PACK_OUTPUT_TOKENS // PACK_OUTPUT_TOKENS_PER_BUSINESS)
+        # Shrinks when packed answers get cut off at max_tokens, grows back on success
+        self.pack_limit = self.pack_size
+        self.prioritize = prioritize
+        self.assume_yes = assume_yes
+        self.quiet = quiet
+        # Spend is charged from API-reported usage. Requests in flight hold a
+        # worst-case reservation so concurrent calls can't overshoot max_cost.
+        get_pricing(MODEL_NAME)  # Fail fast on a model with no known pricing
+        self.shard = shard
+        self.ledger = SharedCostLedger(shared_ledger, max_cost) if shared_ledger else CostLedger(max_cost)
+        self.metrics = metrics or NULL_METRICS
+        self.metrics.gauge('cost_spent_usd', lambda: round(self.ledger.spent, 6))
+        self.metrics.gauge('cost_reserved_usd', lambda: round(self.ledger.reserved, 6))
+        self.metrics.gauge('cost_limit_usd', lambda: self.max_cost)
+        self.token_counter = TokenCounter(MODEL_NAME)
+        self.budget_exhausted = False
+        self.journal = None
+        self.previous = None
+        self.dedup = dedup
+        self.db_url = db_url
+        self.db_table = db_table
+        self.extractor = RuleExtractor(
+            (label for label, _ in YOGA_STYLE_VOCABULARY), (label for label, _ in AMENITY_VOCABULARY),
+            LANGUAGE_VOCABULARY, ENHANCEMENT_THRESHOLD
+        ) if rule_extraction else None
+        self.duplicates = {}  # str(duplicate id) -> str(id of the business enhanced for it)
+        self.hedge = hedge
+        self.search_index = search_index
+        # Failed businesses are retried once the main pass is done
+        self.retry_queue = RetryQueue(max_attempts)
+        self.failures = {}  # business id -> (error, transient) of its last failed request
         self.base_folder = Path(__file__).parent
         
         # Initialize OpenAI client
@@ -58,7 +312,19 @@ class YogaBusinessAIEnhancer:
             print("Please set your OpenAI API key before running this script")
             sys.exit(1)
             
-        self.client = openai.OpenAI(api_key=api_key)
+        # Retries are handled by the rate limiter, which knows about all requests in flight
+        self.client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+        self.rate_limiter = AdaptiveRateLimiter(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_retries=max_retries
+        )
+        
+        # Response cache, keyed by everything that determines the model's answer
+        self.cache_only = cache_only
+        self.cache = None
+        if use_cache or cache_only:
+            self.cache = ResponseCache(cache_file or self.base_folder / DEFAULT_CACHE_FILE)
         
         # Statistics tracking
         self.stats = {
@@ -72,28 +338,72 @@ class YogaBusinessAIEnhancer:
             'websites_added': 0,
             'opening_hours_added': 0,
             'phone_numbers_added': 0,
-            'failed_enhancements': 0
+            'failed_enhancements': 0,
+            'rate_limit_retries': 0,
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'packed_requests': 0,
+            'pack_fallbacks': 0,
+            'reused_unchanged': 0,
+            'repaired_responses': 0,
+            'field_reasks': 0,
+            'unusable_responses': 0,
+            'wasted_cost': 0.0,
+            'retried_successfully': 0,
+            'dead_lettered': 0,
+            'deferred_by_priority': 0,
+            'rule_extracted': 0,
+            'rule_completed': 0,
+            'duplicates_copied': 0,
+            'dedup_saved_cost': 0.0,
+            'hedged_calls': 0,
+            'hedge_wins': 0,
+            'hedges_skipped': 0,
+            'completeness_gain': 0,
+            'field_targeted_requests': 0,
+            'fields_requested': 0
         }
+        # Seconds spent in API calls, split by whether the prompt prefix was cached
+        self.call_latency = {'cached': [0, 0.0], 'uncached': [0, 0.0]}
+        # Every call's latency in seconds, for percentiles
+        self.latencies = array('d')
         
-        # Cost tracking (approximate)
-        self.cost_per_1k_tokens = {
-            'gpt-4o-mini': {'input': 0.00015, 'output': 0.0006}
+        self.max_output_tokens = 800
+        self.request_params = {
+            'temperature': 0.7,
+            'max_tokens': self.max_output_tokens,
+            'response_format': response_format(MODEL_NAME)
         }
 
+    def progress(self, message):
+        """Print a per-business progress line, unless running quietly"""
+        if not self.quiet:
+            print(message)
+
+    @property
+    def current_cost(self):
+        """Actual spend so far, from API-reported usage"""
+        return self.ledger.spent
+
     def load_existing_data(self, input_file=None):
         """Load the existing yoga business data"""
         if not input_file:
             input_file = self.base_folder / "yoga_businesses_enriched_full.json"
+        input_file = Path(input_file)
         
         if not input_file.exists():
             print(f"❌ Error: {input_file} not found!")
             return None
         
         try:
-            with open(input_file, 'r', encoding='utf-8') as file:
-                data = json.load(file)
+            if is_snapshot(input_file):
+                with Snapshot(input_file) as snapshot:
+                    businesses = list(snapshot)
+            else:
+                with open(input_file, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                businesses = data.get('businesses', [])
             
-            businesses = data.get('businesses', [])
             print(f"✅ Loaded {len(businesses)} yoga businesses from existing data")
             return businesses
             
@@ -101,363 +411,967 @@ class YogaBusinessAIEnhancer:
             print(f"❌ Error loading data: {e}")
             return None
 
-    def calculate_completeness_score(self, business):
+    def load_previous_output(self, previous_file, ttl_days=DEFAULT_INCREMENTAL_TTL_DAYS):
         """
-        Calculate how complete a yoga business's data is (0-100)
+        Enable incremental mode against the output of an earlier run
         
         Args:
-            business (dict): Business data
+            previous_file (str): Previous output JSON file
+            ttl_days (float): Enhancements older than this are redone
             
         Returns:
-            int: Completeness score out of 100
+            bool: True if the previous output was indexed
         """
-        score = 0
-        
-        # Essential information (50 points total)
-        # Website score (15 points)
-        if business.get('website'):
-            score += 15
+        previous_path = Path(previous_file)
+        if not previous_path.exists():
+            print(f"❌ Error: previous output {previous_path} not found!")
+            return False
+        try:
+            self.previous = PreviousOutput(previous_path, AI_ENHANCED_FIELDS, ttl_days)
+        except ValueError as e:
+            print(f"❌ Error reading previous output: {e}")
+            return False
+        print(f"♻️  Incremental mode: {self.previous.count} enhanced businesses indexed from {previous_path} (TTL {ttl_days:g} days)")
+        return True
+
+    def reuse_previous_enhancement(self, business):
+        """
+        Re-apply the previous run's enhancement to a business that hasn't changed
         
-        # Opening hours score (15 points)
-        opening_hours = business.get('opening_hours', '')
-        if opening_hours and opening_hours != '[]':
-            score += 15
+        The AI-written fields come from the previous output; everything else
+        (review counts, images, ...) comes from the current input.
         
-        # Phone number score (10 points)
-        if business.get('phone_number'):
-            score += 10
+        Args:
+            business (dict|BusinessRecord): Business from the current input
             
-        # Review score (10 points)
-        if business.get('review_score') is not None:
-            score += 10
+        Returns:
+            dict: Enhanced business data, or None if it needs enhancing again
+        """
+        if not self.previous:
+            return None
+        record = BusinessRecord.of(business)
+        status, fields = self.previous.check(record)
+        if status != STATUS_UNCHANGED:
+            return None
+        reused = record.raw.copy()
+        reused.update(fields)
+        return reused
+
+    def stream_businesses(self, input_path):
+        """
+        Iterate over the businesses in a dataset file without loading it all
+        
+        Args:
+            input_path (Path): Input JSON or snapshot file
             
-        # Enhanced information (50 points total)
-        # Yoga styles score (15 points)
-        yoga_styles = business.get('yoga_styles', []) or []
-        if isinstance(yoga_styles, str):
-            try:
-                yoga_styles = json.loads(yoga_styles)
-            except:
-                yoga_styles = []
-                
-        if len(yoga_styles) >= 3:
-            score += 15
-        elif len(yoga_styles) >= 1:
-            score += 10
-        
-        # Business description score (15 points)
-        description = business.get('business_description', '') or ''
-        if len(description) > 150:
-            score += 15
-        elif len(description) > 75:
-            score += 10
-        elif len(description) > 25:
-            score += 5
-        
-        # Amenities score (10 points)
-        amenities = business.get('amenities', []) or []
-        if isinstance(amenities, str):
-            try:
-                amenities = json.loads(amenities)
-            except:
-                amenities = []
-                
-        if len(amenities) >= 3:
-            score += 10
-        elif len(amenities) >= 1:
-            score += 5
-        
-        # Languages score (5 points)
-        languages = business.get('languages_spoken', []) or []
-        if isinstance(languages, str):
-            try:
-                languages = json.loads(languages)
-            except:
-                languages = []
-                
-        if len(languages) >= 1:
-            score += 5
+        Returns:
+            iterator: Business dicts in file order (only this worker's shard, if
+                sharded), with whatever the extraction rules found filled in
+        """
+        businesses = iter_businesses(input_path)
+        if self.shard:
+            index, count = self.shard
+            businesses = (business for business in businesses if shard_of(business.get('id'), count) == index)
+        if self.extractor:
+            businesses = self.extractor.extract_all(businesses)
+        return businesses
+
+    def find_duplicates(self, input_path):
+        """
+        Find duplicate listings among the businesses that need enhancement
+        
+        Streams the input once more before the analysis. Only the most
+        complete business of each cluster is enhanced; the rest are left out
+        of the projection and copy its result once the run is done.
         
-        # Social media score (5 points)
-        has_instagram = bool(business.get('instagram_url'))
-        has_facebook = bool(business.get('facebook_url'))
-        if has_instagram and has_facebook:
-            score += 5
-        elif has_instagram or has_facebook:
-            score += 3
+        Args:
+            input_path (Path): Input JSON file
+            
+        Returns:
+            int: Businesses that will copy another's enhancement
+        """
+        finder = DuplicateFinder()
+        for business in self.stream_businesses(input_path):
+            record = BusinessRecord(business)
+            if record.completeness_score < ENHANCEMENT_THRESHOLD:
+                finder.add(record)
+        self.duplicates = finder.canonical_map()
+        if finder.oversized_blocks:
+            print(f"🔎 Ignored {finder.oversized_blocks} shared phones/domains/postcode names too common to identify a business")
+        return len(self.duplicates)
+
+    def calculate_completeness_score(self, business):
+        """
+        Calculate how complete a yoga business's data is (0-100)
         
-        return min(score, 100)
+        Args:
+            business (dict|BusinessRecord): Business data
+            
+        Returns:
+            int: Completeness score out of 100 (cached on the record)
+        """
+        return BusinessRecord.of(business).completeness_score
 
-    def needs_enhancement(self, business, threshold=70):
+    def needs_enhancement(self, business, threshold=ENHANCEMENT_THRESHOLD):
         """
         Determine if a yoga business needs AI enhancement
         
         Args:
-            business (dict): Business data
+            business (dict|BusinessRecord): Business data
             threshold (int): Minimum completeness score to skip enhancement
             
         Returns:
             bool: True if needs enhancement
         """
-        score = self.calculate_completeness_score(business)
-        return score < threshold
+        return self.calculate_completeness_score(business) < threshold
 
-    def create_enhancement_prompt(self, business):
+    def format_business_details(self, business):
         """
-        Create an AI prompt for enhancing yoga business data
+        Format the known data for a business as prompt lines
         
         Args:
-            business (dict): Business data
+            business (dict|BusinessRecord): Business data
             
         Returns:
-            str: Formatted prompt for AI
+            str: "- Field: value" lines (cached on the record)
         """
+        return BusinessRecord.of(business).details
+
+    def create_packed_prompt(self, businesses):
+        """
+        Create the user prompt for several businesses, tagged by id
         
-        # Gather existing data
-        name = business.get('name', 'Unknown Business')
-        category = business.get('category_name', 'Yoga studio')
-        address = business.get('address', '')
-        city = business.get('city', '')
-        website = business.get('website', '')
+        Args:
+            businesses (list): BusinessRecord for each business in the pack
+            
+        Returns:
+            str: Known details of each business (the instructions are in SYSTEM_MESSAGE)
+        """
+        details = "\n\n".join(f"[id: {business.id}]\n{business.details}" for business in businesses)
+        return f"BUSINESSES ({len(businesses)}):\n\n{details}"
+
+    def create_enhancement_prompt(self, business, fields=ENHANCEMENT_FIELDS):
+        """
+        Create the user prompt for enhancing one yoga business
         
-        # Handle potential JSON strings
-        yoga_styles = business.get('yoga_styles', [])
-        if isinstance(yoga_styles, str):
+        Args:
+            business (dict|BusinessRecord): Business data
+            fields (tuple): Answer fields to ask for
+            
+        Returns:
+            str: Known details of the business (the instructions are in SYSTEM_MESSAGE),
+                limited to the given fields when they aren't all of them
+        """
+        prompt = f"BUSINESS DETAILS:\n{self.format_business_details(business)}"
+        if len(fields) < len(ENHANCEMENT_FIELDS):
+            prompt += f"\n\nReturn ONLY these fields: {', '.join(fields)}"
+        return prompt
+
+    def requested_fields(self, business):
+        """
+        Answer fields worth asking for, given what the business already has
+        
+        Mirrors merge_ai_enhancement: a phone, website, email or opening
+        hours already known is never overwritten, so asking for it again only
+        buys output tokens that are thrown away. Lists are asked for until
+        they reach the length that scores full points.
+        
+        Args:
+            business (dict|BusinessRecord): Business data
+            
+        Returns:
+            tuple: Fields to request, in prompt order (confidence_score always)
+        """
+        record = BusinessRecord.of(business)
+        raw = record.raw
+        missing = {
+            'enhanced_yoga_styles': len(record.yoga_styles or []) < 3,
+            'enhanced_amenities': len(record.amenities or []) < 3,
+            'enhanced_languages': not record.languages,
+            'enhanced_description': len(str(record.description or '')) <= 150,
+            'enhanced_opening_hours': not record.has_opening_hours,
+            'enhanced_phone_number': not record.phone,
+            'enhanced_website': not record.website,
+            'enhanced_email': not record.email,
+            'meditation_offered': raw.get('meditation_offered') is not True,
+            'teacher_training': raw.get('teacher_training') is not True,
+            'drop_in_price_usd': raw.get('drop_in_price_usd') is None,
+            'price_range': not raw.get('price_range'),
+            'confidence_score': True
+        }
+        return tuple(field for field in ENHANCEMENT_FIELDS if missing[field])
+
+    def enhancement_request(self, business):
+        """
+        Fields, prompt and request parameters for enhancing one business
+        
+        A business missing everything gets the full request unchanged, so
+        its cache key is the same as before field targeting; any other gets
+        a schema and max_tokens covering only its missing fields.
+        
+        Args:
+            business (dict|BusinessRecord): Business data
+            
+        Returns:
+            tuple: (fields, user prompt, request parameters)
+        """
+        fields = self.requested_fields(business)
+        prompt = self.create_enhancement_prompt(business, fields)
+        if len(fields) == len(ENHANCEMENT_FIELDS):
+            return fields, prompt, self.request_params
+        params = dict(
+            self.request_params,
+            max_tokens=output_token_limit(fields, self.max_output_tokens),
+            response_format=response_format(MODEL_NAME, fields)
+        )
+        return fields, prompt, params
+
+    def build_messages(self, prompt):
+        """Chat messages for an enhancement prompt"""
+        return [
+            {"role": "system", "content": SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt}
+        ]
+
+    def parse_ai_response(self, content, fields=ENHANCEMENT_FIELDS):
+        """
+        Parse and validate the model's JSON answer for one business
+        
+        Code fences, surrounding prose and truncation are repaired, and
+        near-miss values coerced, before anything is given up on.
+        
+        Args:
+            content (str|dict): Raw message content, or an already decoded answer
+            fields (tuple): Fields the answer should contain
+            
+        Returns:
+            tuple: (dict of valid fields, list of fields missing or invalid)
+        """
+        if isinstance(content, dict):
+            ai_data, repaired = content, False
+        else:
             try:
-                yoga_styles = json.loads(yoga_styles)
-            except:
-                yoga_styles = []
-                
-        amenities = business.get('amenities', [])
-        if isinstance(amenities, str):
+                ai_data, repaired = extract_json_object(content)
+            except ValueError:
+                return {}, list(fields)
+        valid, failed = validate_enhancement(ai_data, fields)
+        if repaired or any(valid[field] != ai_data[field] for field in valid):
+            self.stats['repaired_responses'] += 1
+        return valid, failed
+
+    def get_cache_key(self, prompt, params=None):
+        """Cache key for an enhancement request with the current model and parameters"""
+        return make_cache_key(MODEL_NAME, SYSTEM_MESSAGE, prompt, params or self.request_params)
+
+    def business_cache_key(self, business):
+        """Cache key of a business's field-targeted enhancement request"""
+        _, prompt, params = self.enhancement_request(business)
+        return self.get_cache_key(prompt, params)
+
+    def is_cached(self, business):
+        """Check whether the response for this business is already in the cache"""
+        if not self.cache:
+            return False
+        return self.cache.contains(self.business_cache_key(business))
+
+    def estimate_request_cost(self, business):
+        """
+        Worst-case cost of one enhancement request, used to reserve budget
+        before the request is sent
+        
+        Args:
+            business (dict): Business data
+            
+        Returns:
+            float: Estimated maximum cost in USD (0 if the response is cached)
+        """
+        _, prompt, params = self.enhancement_request(business)
+        if self.cache and self.cache.contains(self.get_cache_key(prompt, params)):
+            return 0.0
+        prompt_tokens = self.token_counter.count_messages(self.build_messages(prompt))
+        return price_tokens(MODEL_NAME, prompt_tokens, params['max_tokens'])
+
+    def project_run_cost(self, businesses_to_enhance, on_cost=None):
+        """
+        Pre-flight cost projection from locally counted prompt tokens
+        
+        The static part of the prompt is counted once; only each business's
+        user prompt is tokenized, in batched calls over chunks of the input, so
+        this stays quick and small on very large datasets. Output is projected
+        per business, capped at the max_tokens of its field-targeted request.
+        
+        Args:
+            businesses_to_enhance (iterable): BusinessRecords that need enhancement
+            on_cost (callable): Called with (position, record, expected cost in USD)
+                for each business, in order (cost 0 when the answer is cached)
+            
+        Returns:
+            dict: request/token counts plus expected and worst-case cost in USD
+        """
+        cached = 0
+        uncached = 0
+        static_tokens = None
+        detail_tokens = 0
+        expected_output_tokens = 0
+        max_output_tokens = 0
+        position = 0
+        average_output = (self.cache.average_completion_tokens(MODEL_NAME) if self.cache else None) or DEFAULT_EXPECTED_OUTPUT_TOKENS
+        for chunk in iter_chunks(businesses_to_enhance, ANALYSIS_CHUNK_SIZE):
+            requests = [self.enhancement_request(b) for b in chunk]
+            is_cached = [bool(self.cache) and self.cache.contains(self.get_cache_key(prompt, params))
+                         for _, prompt, params in requests]
+            chunk_uncached = [request for request, hit in zip(requests, is_cached) if not hit]
+            cached += len(chunk) - len(chunk_uncached)
+            uncached += len(chunk_uncached)
+            if chunk_uncached and static_tokens is None:
+                sample_prompt = chunk_uncached[0][1]
+                static_tokens = (self.token_counter.count_messages(self.build_messages(sample_prompt)) -
+                                 self.token_counter.count(sample_prompt))
+                # Every request after the first should find the static prefix in the prompt cache
+                cacheable = static_tokens // PROMPT_CACHE_INCREMENT * PROMPT_CACHE_INCREMENT
+                if cacheable < PROMPT_CACHE_MIN_TOKENS:
+                    cacheable = 0
+            chunk_tokens = self.token_counter.count_many(prompt for _, prompt, _ in chunk_uncached)
+            detail_tokens += sum(chunk_tokens)
+            expected_outputs = [min(average_output, params['max_tokens']) for _, _, params in chunk_uncached]
+            expected_output_tokens += sum(expected_outputs)
+            max_output_tokens += sum(params['max_tokens'] for _, _, params in chunk_uncached)
+            
+            if on_cost:
+                # Each business's share of a request: its prompt plus its part of the static prefix
+                tokens = iter(zip(chunk_tokens, expected_outputs))
+                for business, hit in zip(chunk, is_cached):
+                    if hit:
+                        cost = 0.0
+                    else:
+                        prompt_tokens, output_tokens = next(tokens)
+                        cost = price_tokens(
+                            MODEL_NAME, static_tokens / self.pack_size + prompt_tokens, output_tokens,
+                            cacheable / self.pack_size
+                        )
+                    on_cost(position, business, cost)
+                    position += 1
+        
+        projection = {
+            'requests': 0, 'cached': cached, 'prompt_tokens': 0,
+            'cached_prompt_tokens': 0, 'expected_cost': 0.0, 'max_cost': 0.0
+        }
+        if not uncached:
+            return projection
+        
+        # Packed requests carry the static instructions once per pack
+        requests = -(-uncached // self.pack_size)
+        prompt_tokens = static_tokens * requests + detail_tokens
+        cached_tokens = cacheable * (requests - 1)
+        
+        projection.update({
+            'requests': requests,
+            'prompt_tokens': prompt_tokens,
+            'cached_prompt_tokens': cached_tokens,
+            'expected_cost': price_tokens(MODEL_NAME, prompt_tokens, int(expected_output_tokens), cached_tokens),
+            'max_cost': price_tokens(MODEL_NAME, prompt_tokens, max_output_tokens)
+        })
+        return projection
+
+    async def _create_completion(self, label, messages, max_tokens=None, format=None):
+        """
+        Send one chat completion, pacing and retrying through the rate limiter
+        
+        Args:
+            label (str): What is being enhanced (for log messages)
+            messages (list): Chat messages to send
+            max_tokens (int): Output token limit, if different from the default
+            format (dict): response_format, if different from the default
+            
+        Returns:
+            ChatCompletion: The parsed API response
+        """
+        params = dict(self.request_params)
+        if max_tokens:
+            params['max_tokens'] = max_tokens
+        if format:
+            params['response_format'] = format
+        estimated_tokens = self.token_counter.count_messages(messages) + params['max_tokens']
+        
+        for attempt in range(self.rate_limiter.max_retries + 1):
+            queued = time.perf_counter()
+            await self.rate_limiter.acquire(estimated_tokens)
+            started = time.perf_counter()
             try:
-                amenities = json.loads(amenities)
-            except:
-                amenities = []
+                if self.hedge:
+                    raw_response, model = await self._send_hedged(label, messages, params)
+                else:
+                    raw_response, model = await self._send(MODEL_NAME, messages, params), MODEL_NAME
+            except (openai.APIStatusError, openai.APIConnectionError) as e:
+                status = getattr(e, 'status_code', None)
+                headers = e.response.headers if getattr(e, 'response', None) is not None else None
+                # A rejected request doesn't count against the token limit
+                self.rate_limiter.record_usage(estimated_tokens, 0)
+                # An exhausted quota is not going to recover by waiting
+                retryable = (getattr(e, 'code', None) != 'insufficient_quota' and
+                             (status is None or status in RETRYABLE_STATUS_CODES) and
+                             attempt < self.rate_limiter.max_retries)
+                self.metrics.call(label, 'retried' if retryable else 'error', started - queued,
+                                  time.perf_counter() - started, attempt=attempt, status=status)
+                if not retryable:
+                    raise
                 
-        languages = business.get('languages_spoken', [])
-        if isinstance(languages, str):
-            try:
-                languages = json.loads(languages)
-            except:
-                languages = []
-        
-        opening_hours = business.get('opening_hours', '')
-        description = business.get('business_description', '')
-        phone = business.get('phone_number', '')
-        email = business.get('email_address', '')
-        instagram = business.get('instagram_url', '')
-        facebook = business.get('facebook_url', '')
-        
-        prompt = f"""
-You are analyzing a yoga business in Bali to extract and enhance information.
-
-BUSINESS DETAILS:
-- Name: {name}
-- Category: {category}
-- Location: {address}, {city}, Bali
-- Website: {website}
-- Current Description: {description}
-- Current Yoga Styles: {yoga_styles}
-- Current Amenities: {amenities}
-- Current Languages: {languages}
-- Current Opening Hours: {opening_hours}
-- Current Phone: {phone}
-- Current Email: {email}
-- Instagram: {instagram}
-- Facebook: {facebook}
-
-TASK: Enhance and expand this yoga business's information. Use the existing data as context but improve and add to it.
-
-Please return ONLY valid JSON in this exact format:
-{{
-    "enhanced_yoga_styles": ["list of yoga styles offered, e.g., Hatha, Vinyasa, Yin, etc."],
-    "enhanced_amenities": ["specific amenities offered, e.g., mats, showers, pool, etc."],
-    "enhanced_languages": ["languages spoken by instructors, e.g., English, Indonesian, etc."],
-    "enhanced_description": "professional 1-2 sentence business description",
-    "enhanced_opening_hours": [{{"day": "Monday", "hours": "7 AM to 7 PM"}}, ...] or null if unknown,
-    "enhanced_phone_number": "phone number in international format",
-    "enhanced_website": "website URL or null if unknown",
-    "enhanced_email": "email address or null if unknown",
-    "meditation_offered": true/false,
-    "teacher_training": true/false,
-    "drop_in_price_usd": 15 (approximate drop-in class price in USD or null),
-    "price_range": "budget/mid-range/luxury",
-    "confidence_score": 85
-}}
+                self.rate_limiter.update_from_headers(headers)
+                delay = self.rate_limiter.backoff_delay(attempt, parse_retry_after(headers))
+                if status == 429:
+                    self.rate_limiter.pause(delay)
+                elif status is not None:
+                    self.rate_limiter.server_errors += 1
+                self.stats['rate_limit_retries'] += 1
+                self.progress(f"   ⏳ {status or 'connection error'} for {label}, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+            
+            self.rate_limiter.update_from_headers(raw_response.headers)
+            response = raw_response.parse()
+            actual_tokens = response.usage.total_tokens if response.usage else estimated_tokens
+            self.rate_limiter.record_usage(estimated_tokens, actual_tokens)
+            latency = time.perf_counter() - started
+            self.record_latency(response, latency)
+            self.metrics.call(label, 'ok', started - queued, latency, usage_tokens(response.usage), attempt=attempt)
+            return response
 
-RULES:
-1. For yoga styles: Be specific (not just "yoga" but actual styles taught)
-2. For amenities: Include physical facilities and services
-3. For languages: Focus on languages used for instruction
-4. For description: Create a professional, accurate description
-5. Only include information you're confident about
-6. If no additional info can be inferred, return null or empty arrays
-7. Confidence score: 0-100 based on how certain you are about the enhancements
-8. For opening hours: Use the format shown above with day and hours
-9. For price: Estimate based on location and amenities if unknown
+    async def _send(self, model, messages, params):
+        """Send one chat completion request, returning the raw response"""
+        return await self.client.chat.completions.with_raw_response.create(
+            model=model,
+            messages=messages,
+            **params
+        )
 
-CONTEXT ABOUT BALI YOGA SCENE:
-- Ubud is known as Bali's yoga hub with many studios and retreats
-- Canggu and Seminyak are popular beach areas with yoga studios
-- Many studios offer teacher training programs
-- Common amenities include mats, props, showers, and cafes
-- Typical drop-in prices range from $8-20 USD
-- Many studios offer both group and private classes
-"""
+    def _admit_hedge(self, reservation, estimated_tokens):
+        """Reserve a hedge if the hedge budget, the run budget and the rate limits all have room now"""
+        if not self.hedge.fits(reservation) or not self.ledger.reserve(reservation):
+            return False
+        if not self.rate_limiter.try_acquire(estimated_tokens):
+            self.ledger.release(reservation)
+            return False
+        self.hedge.reserve(reservation)
+        return True
+
+    async def _send_hedged(self, label, messages, params):
+        """
+        Send one chat completion, hedging it if it runs slower than recent calls
+        
+        Once the call has run past the policy's latency percentile, a
+        duplicate goes out (to the fallback model, if one is set) if the
+        hedge budget and rate limits have room. Whichever answers first is
+        used and the other is cancelled (see _charge_cancelled for what
+        that costs).
+        
+        Args:
+            label (str): What is being enhanced (for log messages)
+            messages (list): Chat messages to send
+            params (dict): Request parameters
+            
+        Returns:
+            tuple: (raw response that answered first, model that answered it)
+            
+        Raises:
+            The first request's error, if neither request got an answer
+        """
+        hedge = self.hedge
+        hedge_model = hedge.model or MODEL_NAME
+        hedge_params = hedge.request_params(params)
+        started = time.perf_counter()
+        
+        def observe_primary(task):
+            # The first request's own latency, whichever request wins; one that failed isn't counted
+            if not task.cancelled() and task.exception() is None:
+                hedge.observe(time.perf_counter() - started)
+        
+        primary = asyncio.ensure_future(self._send(MODEL_NAME, messages, params))
+        primary.add_done_callback(observe_primary)
+        requests = {primary: (MODEL_NAME, params['max_tokens'])}  # Task -> (model, max_tokens)
+        reservation = 0.0
+        winner = None
+        try:
+            delay = hedge.delay()
+            if delay is not None:
+                await asyncio.wait({primary}, timeout=delay)
+            if delay is not None and not primary.done():
+                prompt_tokens = self.token_counter.count_messages(messages)
+                reservation = max(price_tokens(MODEL_NAME, prompt_tokens, params['max_tokens']),
+                                  price_tokens(hedge_model, prompt_tokens, hedge_params['max_tokens']))
+                if self._admit_hedge(reservation, prompt_tokens + hedge_params['max_tokens']):
+                    self.stats['hedged_calls'] += 1
+                    self.progress(f"   🪁 {label} still running after {delay:.2f}s, hedging with {hedge_model}")
+                    backup = asyncio.ensure_future(self._send(hedge_model, messages, hedge_params))
+                    requests[backup] = (hedge_model, hedge_params['max_tokens'])
+                else:
+                    self.stats['hedges_skipped'] += 1
+            pending = set(requests)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+        finally:
+            cancelled = [task for task in requests if not task.done()]
+            for task in cancelled:
+                task.cancel()
+            if primary in cancelled:
+                hedge.observe(time.perf_counter() - started, completed=False)
+            if len(requests) > 1:
+                # Only a request cancelled mid-flight is charged; one that failed cost nothing
+                cost = sum(self._charge_cancelled(requests[task], prompt_tokens, winner) for task in cancelled)
+                hedge.settle(reservation, cost)
+                self.ledger.release(reservation)
+                self.metrics.count('hedges_total', outcome='won' if winner is not None and winner is not primary else 'lost')
+        
+        if winner is None:
+            raise primary.exception()
+        if winner is not primary:
+            self.stats['hedge_wins'] += 1
+        return winner.result(), requests[winner][0]
+
+    def _charge_cancelled(self, request, prompt_tokens, winner):
+        """
+        Charge a request cancelled mid-flight, which reports no usage
+        
+        It is charged as if it had written the same answer as the request
+        that won, or its full max_tokens if nothing won.
+        
+        Args:
+            request (tuple): (model, max_tokens) of the cancelled request
+            prompt_tokens (int): Locally counted prompt tokens
+            winner (asyncio.Task): Request that answered first, or None
+            
+        Returns:
+            float: Cost charged in USD
+        """
+        model, max_tokens = request
+        usage = winner.result().parse().usage if winner is not None else None
+        if usage is None:
+            return self.ledger.charge(model, prompt_tokens, max_tokens)
+        return self.ledger.charge_usage(model, usage)
+
+    def response_model(self, response):
+        """Model that answered a response: the hedge's fallback model if it answered first"""
+        if self.hedge and self.hedge.model:
+            # The response names a dated snapshot ("gpt-4o-mini-2024-07-18") of the model asked
+            # for; of the two names it starts with, the longer one is the model
+            names = [name for name in (MODEL_NAME, self.hedge.model) if (response.model or '').startswith(name)]
+            if names:
+                return max(names, key=len)
+        return MODEL_NAME
+
+    def record_latency(self, response, seconds):
+        """Add a call's latency to the cached or uncached prefix totals"""
+        cached_tokens = usage_tokens(response.usage)[2]
+        latency = self.call_latency['cached' if cached_tokens else 'uncached']
+        latency[0] += 1
+        latency[1] += seconds
+        self.latencies.append(seconds)
+
+    def charge_response(self, messages, response):
+        """
+        Charge a finished call to the ledger from its reported usage
+        
+        Falls back to counting tokens locally if the response has no usage.
+        """
+        model = self.response_model(response)
+        if response.usage is not None:
+            return self.ledger.charge_usage(model, response.usage)
+        content = response.choices[0].message.content or ''
+        return self.ledger.charge(
+            model,
+            self.token_counter.count_messages(messages),
+            self.token_counter.count(content)
+        )
+
+    async def request_ai_enhancement(self, business):
+        """
+        Send the enhancement request for a single yoga business
+        
+        Fields that fail validation are asked for again on their own instead
+        of throwing the whole answer away.
+        
+        Args:
+            business (dict|BusinessRecord): Business to enhance
+            
+        Returns:
+            dict: Validated AI response or None if failed
+        """
+        business = BusinessRecord.of(business)
+        spent = 0.0
+        try:
+            fields, prompt, params = self.enhancement_request(business)
+            cache_key = self.get_cache_key(prompt, params)
+            cached = self.cache.get(cache_key) if self.cache else None
+            
+            if cached:
+                # The raw answer is validated again, so a cached one that no longer passes is asked for again
+                parse_started = time.perf_counter()
+                ai_data, failed = self.parse_ai_response(cached['content'], fields)
+                self.metrics.observe(STAGE_PARSE, time.perf_counter() - parse_started)
+                if not failed:
+                    # A cached response costs nothing
+                    self.stats['cache_hits'] += 1
+                    self.metrics.count('cache_lookups_total', result='hit')
+                    return ai_data
+            
+            if self.cache:
+                self.metrics.count('cache_lookups_total', result='miss')
+            messages = self.build_messages(prompt)
+            self.stats['field_targeted_requests'] += 1
+            self.stats['fields_requested'] += len(fields)
+            response = await self._create_completion(
+                business.name, messages, params['max_tokens'], params['response_format']
+            )
+            content = response.choices[0].message.content
+            spent += self.charge_response(messages, response)
+            
+            parse_started = time.perf_counter()
+            ai_data, failed = self.parse_ai_response(content, fields)
+            self.metrics.observe(STAGE_PARSE, time.perf_counter() - parse_started)
+            # Only cache raw answers that are complete on their own and from the
+            # run's model, so a partial, re-asked or fallback one gets another try next run
+            if self.cache and not failed and self.response_model(response) == MODEL_NAME:
+                self.cache.put(
+                    cache_key, MODEL_NAME, content,
+                    getattr(response.usage, 'prompt_tokens', 0),
+                    getattr(response.usage, 'completion_tokens', 0)
+                )
+            if failed:
+                ai_data, failed, cost = await self.reask_failed_fields(business, ai_data, failed)
+                spent += cost
+            if not ai_data:
+                self.progress(f"❌ No usable answer for {business.name}")
+                self.record_wasted_spend(spent)
+                self.failures[business.id] = ('no usable answer', True)
+                return None
+            return ai_data
+            
+        except Exception as e:
+            self.progress(f"❌ AI enhancement error for {business.name}: {e}")
+            self.record_wasted_spend(spent)
+            self.failures[business.id] = (str(e) or e.__class__.__name__, self.is_transient_failure(e))
+            return None
+
+    def is_transient_failure(self, error):
+        """
+        Whether a failed request could succeed if tried again later
+        
+        Timeouts, connection errors, rate limits, server errors and answers
+        that didn't parse are transient; bad requests, auth errors and an
+        exhausted quota are not.
+        """
+        if getattr(error, 'code', None) == 'insufficient_quota':
+            return False
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS_CODES
+        return isinstance(error, (openai.APIConnectionError, ValueError))
+
+    async def reask_failed_fields(self, business, ai_data, failed):
+        """
+        Ask again for only the fields that failed validation
+        
+        The request keeps the cached prompt prefix and uses a schema and
+        max_tokens sized to just those fields, so it costs a fraction of
+        repeating the whole call.
+        
+        Args:
+            business (BusinessRecord): Business being enhanced
+            ai_data (dict): Fields that were already valid
+            failed (list): Fields missing or invalid in the first answer
+            
+        Returns:
+            tuple: (valid fields, fields still failing, cost of the re-ask in USD)
+        """
+        prompt = self.create_enhancement_prompt(business, failed)
+        messages = self.build_messages(prompt)
+        max_tokens = min(self.max_output_tokens, FIELD_REASK_OUTPUT_TOKENS * len(failed))
+        reservation = price_tokens(MODEL_NAME, self.token_counter.count_messages(messages), max_tokens)
+        if not self.ledger.reserve(reservation):
+            return ai_data, failed, 0.0
+        
+        self.stats['field_reasks'] += 1
+        try:
+            response = await self._create_completion(
+                f"{business.name} ({len(failed)} fields)", messages, max_tokens,
+                response_format(MODEL_NAME, failed)
+            )
+        except Exception as e:
+            self.progress(f"⚠️  Re-asking {', '.join(failed)} for {business.name} failed: {e}")
+            return ai_data, failed, 0.0
+        finally:
+            self.ledger.release(reservation)
+        
+        cost = self.charge_response(messages, response)
+        retried, still_failed = self.parse_ai_response(response.choices[0].message.content, failed)
+        return {**ai_data, **retried}, still_failed, cost
+
+    def record_wasted_spend(self, cost):
+        """Count money spent on calls that produced nothing usable"""
+        if cost:
+            self.stats['unusable_responses'] += 1
+            self.stats['wasted_cost'] += cost
+
+    async def request_packed_enhancement(self, businesses):
+        """
+        Send one request covering several businesses
+        
+        Any business whose answer is missing or unusable in the packed
+        response falls back to its own single-business request; fields that
+        fail validation are re-asked for that business alone.
+        
+        Args:
+            businesses (list): BusinessRecords to enhance together
+            
+        Returns:
+            list: Validated AI response (or None if failed) for each business, in order
+        """
+        pack_label = f"pack of {len(businesses)} ({businesses[0].name}, ...)"
+        packed = {}
+        pack_cost = 0.0
+        pack_model = MODEL_NAME
+        try:
+            prompt = self.create_packed_prompt(businesses)
+            max_tokens = min(MAX_PACK_OUTPUT_TOKENS, PACK_OUTPUT_TOKENS_PER_BUSINESS * len(businesses))
+            messages = self.build_messages(prompt)
+            response = await self._create_completion(pack_label, messages, max_tokens, PACKED_RESPONSE_FORMAT)
+            content = response.choices[0].message.content
+            self.stats['packed_requests'] += 1
+            pack_cost = self.charge_response(messages, response)
+            pack_model = self.response_model(response)
+            
+            # Adapt the pack size: halve when the answer was cut off, creep back up otherwise
+            if response.choices[0].finish_reason == 'length':
+                self.pack_limit = max(1, len(businesses) // 2)
+                self.progress(f"   ✂️  Packed answer truncated, reducing pack size to {self.pack_limit}")
+            elif self.pack_limit < self.pack_size:
+                self.pack_limit += 1
+            
+            packed, repaired = extract_json_object(content)
+            if repaired:
+                self.stats['repaired_responses'] += 1
+        except Exception as e:
+            self.progress(f"❌ Packed request error for {pack_label}: {e}")
+        
+        results = [None] * len(businesses)
+        fallbacks = []
+        for index, business in enumerate(businesses):
+            answer = packed.get(str(business.id))
+            ai_data, failed = self.parse_ai_response(answer) if isinstance(answer, dict) else ({}, [])
+            if ai_data and not failed and self.cache and pack_model == MODEL_NAME:
+                # Store each business's raw answer, so later runs hit the cache packed or not
+                self.cache.put(
+                    self.business_cache_key(business),
+                    MODEL_NAME, json.dumps(answer, ensure_ascii=False)
+                )
+            if ai_data and failed:
+                ai_data, failed, _ = await self.reask_failed_fields(business, ai_data, failed)
+            if ai_data:
+                results[index] = ai_data
+            else:
+                fallbacks.append(index)
         
-        return prompt
+        if fallbacks:
+            self.stats['pack_fallbacks'] += len(fallbacks)
+            # The share of the packed call spent on these businesses bought nothing
+            self.record_wasted_spend(pack_cost * len(fallbacks) / len(businesses))
+            fallback_results = await asyncio.gather(
+                *(self.request_ai_enhancement(businesses[index]) for index in fallbacks)
+            )
+            for index, ai_data in zip(fallbacks, fallback_results):
+                results[index] = ai_data
+        
+        return results
+
+    def merge_ai_enhancement(self, business, ai_data):
+        """
+        Merge an AI response into a copy of the business data
+        
+        Args:
+            business (dict|BusinessRecord): Original business data
+            ai_data (dict): Parsed AI response
+            
+        Returns:
+            dict: Enhanced business data
+        """
+        record = BusinessRecord.of(business)
+        enhanced_business = record.raw.copy()
+        
+        # Update yoga styles
+        ai_yoga_styles = ai_data.get('enhanced_yoga_styles', [])
+        if ai_yoga_styles and len(ai_yoga_styles) > 0:
+            enhanced_business['yoga_styles'] = ai_yoga_styles
+            self.stats['yoga_styles_added'] += 1
+        
+        # Update amenities
+        ai_amenities = ai_data.get('enhanced_amenities', [])
+        if ai_amenities and len(ai_amenities) > 0:
+            enhanced_business['amenities'] = ai_amenities
+            self.stats['amenities_added'] += 1
+        
+        # Update languages
+        ai_languages = ai_data.get('enhanced_languages', [])
+        if ai_languages and len(ai_languages) > 0:
+            enhanced_business['languages_spoken'] = ai_languages
+            self.stats['languages_added'] += 1
+        
+        # Update description
+        ai_description = ai_data.get('enhanced_description', '')
+        if ai_description and len(ai_description) > len(str(record.description)):
+            enhanced_business['business_description'] = ai_description
+            self.stats['descriptions_enhanced'] += 1
+        
+        # Update opening hours
+        ai_opening_hours = ai_data.get('enhanced_opening_hours')
+        if ai_opening_hours and not record.has_opening_hours:
+            enhanced_business['opening_hours'] = json.dumps(ai_opening_hours)
+            self.stats['opening_hours_added'] += 1
+        
+        # Update phone number
+        ai_phone = ai_data.get('enhanced_phone_number')
+        if ai_phone and not record.phone:
+            enhanced_business['phone_number'] = ai_phone
+            self.stats['phone_numbers_added'] += 1
+        
+        # Update website
+        ai_website = ai_data.get('enhanced_website')
+        if ai_website and not record.website:
+            enhanced_business['website'] = ai_website
+            self.stats['websites_added'] += 1
+        
+        # Update email
+        ai_email = ai_data.get('enhanced_email')
+        if ai_email and not record.email:
+            enhanced_business['email_address'] = ai_email
+            self.stats['emails_added'] += 1
+        
+        # Update boolean fields
+        enhanced_business['meditation_offered'] = ai_data.get('meditation_offered', record.raw.get('meditation_offered', False))
+        enhanced_business['teacher_training'] = ai_data.get('teacher_training', record.raw.get('teacher_training', False))
+        
+        # Update pricing information
+        if ai_data.get('drop_in_price_usd') is not None:
+            enhanced_business['drop_in_price_usd'] = ai_data.get('drop_in_price_usd')
+        
+        if ai_data.get('price_range'):
+            enhanced_business['price_range'] = ai_data.get('price_range')
+        
+        # Add AI enhancement metadata
+        enhanced_business['ai_enhancement_confidence'] = ai_data.get('confidence_score', 0)
+        enhanced_business['ai_enhanced'] = True
+        enhanced_business['ai_enhancement_timestamp'] = datetime.now().isoformat()
+        enhanced_business['ai_input_fingerprint'] = record.fingerprint
+        self.stats['completeness_gain'] += BusinessRecord(enhanced_business).completeness_score - record.completeness_score
+        
+        return enhanced_business
 
-    def ai_enhance_single_business(self, business):
+    async def ai_enhance_single_business(self, business):
         """
         Use AI to enhance a single yoga business's data
         
         Args:
-            business (dict): Business data to enhance
+            business (dict|BusinessRecord): Business data to enhance
             
         Returns:
             dict: Enhanced business data or None if failed
         """
-        try:
-            prompt = self.create_enhancement_prompt(business)
-            
-            response = self.client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": "You are an expert at extracting and enhancing yoga business information in Bali. Always return valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=800
-            )
-            
-            # Estimate cost
-            input_tokens = len(prompt) // 4  # Rough estimate
-            output_tokens = len(response.choices[0].message.content) // 4
-            cost = (input_tokens * self.cost_per_1k_tokens[MODEL_NAME]['input'] / 1000 + 
-                   output_tokens * self.cost_per_1k_tokens[MODEL_NAME]['output'] / 1000)
-            self.current_cost += cost
-            
-            # Parse AI response
-            ai_data = json.loads(response.choices[0].message.content)
-            
-            # Merge with existing business data
-            enhanced_business = business.copy()
-            
-            # Update yoga styles
-            ai_yoga_styles = ai_data.get('enhanced_yoga_styles', [])
-            if ai_yoga_styles and len(ai_yoga_styles) > 0:
-                enhanced_business['yoga_styles'] = ai_yoga_styles
-                self.stats['yoga_styles_added'] += 1
-            
-            # Update amenities
-            ai_amenities = ai_data.get('enhanced_amenities', [])
-            if ai_amenities and len(ai_amenities) > 0:
-                enhanced_business['amenities'] = ai_amenities
-                self.stats['amenities_added'] += 1
-            
-            # Update languages
-            ai_languages = ai_data.get('enhanced_languages', [])
-            if ai_languages and len(ai_languages) > 0:
-                enhanced_business['languages_spoken'] = ai_languages
-                self.stats['languages_added'] += 1
-            
-            # Update description
-            ai_description = ai_data.get('enhanced_description', '')
-            if ai_description and len(ai_description) > len(str(business.get('business_description', ''))):
-                enhanced_business['business_description'] = ai_description
-                self.stats['descriptions_enhanced'] += 1
-            
-            # Update opening hours
-            ai_opening_hours = ai_data.get('enhanced_opening_hours')
-            if ai_opening_hours and (not business.get('opening_hours') or business.get('opening_hours') == '[]'):
-                enhanced_business['opening_hours'] = json.dumps(ai_opening_hours)
-                self.stats['opening_hours_added'] += 1
-            
-            # Update phone number
-            ai_phone = ai_data.get('enhanced_phone_number')
-            if ai_phone and not business.get('phone_number'):
-                enhanced_business['phone_number'] = ai_phone
-                self.stats['phone_numbers_added'] += 1
-            
-            # Update website
-            ai_website = ai_data.get('enhanced_website')
-            if ai_website and not business.get('website'):
-                enhanced_business['website'] = ai_website
-                self.stats['websites_added'] += 1
-            
-            # Update email
-            ai_email = ai_data.get('enhanced_email')
-            if ai_email and not business.get('email_address'):
-                enhanced_business['email_address'] = ai_email
-                self.stats['emails_added'] += 1
-            
-            # Update boolean fields
-            enhanced_business['meditation_offered'] = ai_data.get('meditation_offered', business.get('meditation_offered', False))
-            enhanced_business['teacher_training'] = ai_data.get('teacher_training', business.get('teacher_training', False))
-            
-            # Update pricing information
-            if ai_data.get('drop_in_price_usd') is not None:
-                enhanced_business['drop_in_price_usd'] = ai_data.get('drop_in_price_usd')
-            
-            if ai_data.get('price_range'):
-                enhanced_business['price_range'] = ai_data.get('price_range')
-            
-            # Add AI enhancement metadata
-            enhanced_business['ai_enhancement_confidence'] = ai_data.get('confidence_score', 0)
-            enhanced_business['ai_enhanced'] = True
-            enhanced_business['ai_enhancement_timestamp'] = datetime.now().isoformat()
-            
-            return enhanced_business
-            
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parsing error for {business.get('name', 'Unknown')}: {e}")
-            return None
-        except Exception as e:
-            print(f"❌ AI enhancement error for {business.get('name', 'Unknown')}: {e}")
+        business = BusinessRecord.of(business)
+        ai_data = await self.request_ai_enhancement(business)
+        if ai_data is None:
             return None
+        return self.merge_ai_enhancement(business, ai_data)
 
-    def analyze_data_completeness(self, businesses):
+    def analyze_data_completeness(self, businesses, price_multiplier=1.0):
         """
         Analyze the completeness of existing yoga business data
         
+        Works in one pass over any iterable, so a streamed dataset is never
+        held in memory: each chunk is scored in a vectorized pass and only the
+        businesses that need enhancement are normalized, for the cost
+        projection, and then dropped.
+        
         Args:
-            businesses (list): List of business data
+            businesses (iterable): Business dicts (or BusinessRecords)
+            price_multiplier (float): Price multiplier the run will pay (e.g. the
+                Batch API discount), for deciding what fits the budget
             
         Returns:
-            dict: Analysis results
+            dict: Analysis results, including a needs_enhancement flag per business
         """
         print("\n🔍 ANALYZING YOGA BUSINESS DATA COMPLETENESS...")
         print("=" * 60)
         
-        total_businesses = len(businesses)
-        needs_enhancement = []
-        completeness_scores = []
+        completeness = CompletenessAnalysis(ENHANCEMENT_THRESHOLD)
+        if self.extractor:
+            self.extractor.reset()  # Count this pass only; the stream is read as it is analyzed
+        incremental = dict.fromkeys((STATUS_NEW, STATUS_CHANGED, STATUS_EXPIRED, STATUS_UNCHANGED), 0)
+        positions = array('q')  # Input index of each business sent to the projection
+        duplicate_positions = array('q')  # Input index of each duplicate that copies another's result
         
-        # Analyze each business
-        for business in businesses:
-            score = self.calculate_completeness_score(business)
-            completeness_scores.append(score)
-            
-            if self.needs_enhancement(business):
-                needs_enhancement.append(business)
+        def businesses_needing_enhancement():
+            offset = 0
+            for chunk in iter_chunks(businesses, ANALYSIS_CHUNK_SIZE):
+                needs = completeness.add(chunk)
+                for index, (business, need) in enumerate(zip(chunk, needs), offset):
+                    if not need:
+                        continue
+                    record = BusinessRecord.of(business)
+                    # Unchanged businesses reuse their previous enhancement for free
+                    if self.previous:
+                        status, _ = self.previous.check(record)
+                        incremental[status] += 1
+                        if status == STATUS_UNCHANGED:
+                            continue
+                    if str(record.id) in self.duplicates:
+                        duplicate_positions.append(index)
+                        continue
+                    positions.append(index)
+                    yield record
+                offset += len(chunk)
+        
+        # Project costs from the real prompts while scoring, ranking candidates
+        # by value per dollar in case the budget can't cover them all
+        # A shard's fair part of a shared budget is its share of the businesses
+        budget = self.ledger.remaining / (self.shard[1] if self.shard else 1)
+        selector = BudgetSelector(budget / price_multiplier) if self.prioritize else None
+        projection = self.project_run_cost(businesses_needing_enhancement(), selector.offer if selector else None)
+        results = completeness.result()
+        
+        # Leave out the candidates the budget is better spent without, and the
+        # duplicates, which copy their canonical business's result instead
+        needs_flags = results['needs_enhancement']
+        for index in duplicate_positions:
+            needs_flags[index] = False
+        deferred = selector.dropped if selector else 0
+        if deferred:
+            selected = selector.selected()
+            for position, index in enumerate(positions):
+                if position not in selected:
+                    needs_flags[index] = False
+        total_businesses = completeness.count
+        needs_enhancement_count = completeness.needing_enhancement
         
         # Calculate statistics
-        avg_completeness = sum(completeness_scores) / len(completeness_scores) if completeness_scores else 0
-        businesses_with_websites = len([b for b in businesses if b.get('website')])
-        businesses_with_opening_hours = len([b for b in businesses if b.get('opening_hours') and b.get('opening_hours') != '[]'])
-        businesses_with_yoga_styles = len([b for b in businesses if b.get('yoga_styles') and b.get('yoga_styles') != '[]'])
-        businesses_with_descriptions = len([b for b in businesses if b.get('business_description')])
-        businesses_with_phone = len([b for b in businesses if b.get('phone_number')])
+        avg_completeness = results['average_completeness']
+        coverage = results['coverage']
+        businesses_with_websites = coverage['with_websites']
+        businesses_with_opening_hours = coverage['with_opening_hours']
+        businesses_with_yoga_styles = coverage['with_yoga_styles']
+        businesses_with_descriptions = coverage['with_descriptions']
+        businesses_with_phone = coverage['with_phone']
         
-        # Estimate costs
-        estimated_cost_min = len(needs_enhancement) * 0.01
-        estimated_cost_max = len(needs_enhancement) * 0.025
+        estimated_cost_min = projection['expected_cost']
+        estimated_cost_max = projection['max_cost']
         
         analysis = {
             'total_businesses': total_businesses,
             'average_completeness': avg_completeness,
-            'businesses_needing_enhancement': len(needs_enhancement),
+            'businesses_needing_enhancement': needs_enhancement_count,
+            'businesses_reused': incremental[STATUS_UNCHANGED],
+            'businesses_deferred': deferred,
+            'businesses_duplicate': len(duplicate_positions),
+            'businesses_rule_extracted': self.extractor.extracted if self.extractor else 0,
+            'businesses_rule_completed': self.extractor.lifted if self.extractor else 0,
+            'incremental': incremental if self.previous else None,
             'current_stats': {
                 'with_websites': businesses_with_websites,
                 'with_opening_hours': businesses_with_opening_hours,
@@ -466,87 +1380,880 @@ CONTEXT ABOUT BALI YOGA SCENE:
                 'with_phone': businesses_with_phone
             },
             'estimated_cost_range': (estimated_cost_min, estimated_cost_max),
-            'businesses_to_enhance': needs_enhancement
+            'cost_projection': projection,
+            'score_distribution': results['score_distribution'],
+            'city_breakdown': results['city_breakdown'],
+            'needs_enhancement': results['needs_enhancement']
         }
         
         # Print analysis
+        if not total_businesses:
+            print("❌ No businesses found in the data")
+            return analysis
         print(f"📊 Total yoga businesses: {total_businesses}")
         print(f"📈 Average completeness: {avg_completeness:.1f}%")
-        print(f"🎯 Businesses needing enhancement: {len(needs_enhancement)} ({len(needs_enhancement)/total_businesses*100:.1f}%)")
+        print(f"🎯 Businesses needing enhancement: {needs_enhancement_count} ({needs_enhancement_count/total_businesses*100:.1f}%)")
         print(f"\n📋 CURRENT DATA QUALITY:")
         print(f"   Businesses with websites: {businesses_with_websites} ({businesses_with_websites/total_businesses*100:.1f}%)")
         print(f"   Businesses with opening hours: {businesses_with_opening_hours} ({businesses_with_opening_hours/total_businesses*100:.1f}%)")
         print(f"   Businesses with yoga styles: {businesses_with_yoga_styles} ({businesses_with_yoga_styles/total_businesses*100:.1f}%)")
         print(f"   Businesses with descriptions: {businesses_with_descriptions} ({businesses_with_descriptions/total_businesses*100:.1f}%)")
         print(f"   Businesses with phone numbers: {businesses_with_phone} ({businesses_with_phone/total_businesses*100:.1f}%)")
-        print(f"\n💰 ESTIMATED COSTS:")
-        print(f"   Minimum: ${estimated_cost_min:.2f}")
-        print(f"   Maximum: ${estimated_cost_max:.2f}")
+        print(f"\n📊 SCORE DISTRIBUTION:")
+        for bucket, count in results['score_distribution'].items():
+            print(f"   {bucket:>6}: {count:>7} {'█' * round(count / total_businesses * 40)}")
+        print(f"\n🏙️  BY CITY (top {CITY_BREAKDOWN_ROWS}):")
+        cities = sorted(results['city_breakdown'].items(), key=lambda item: -item[1]['businesses'])
+        for city, row in cities[:CITY_BREAKDOWN_ROWS]:
+            print(f"   {city or 'Unknown':<20} {row['businesses']:>7} businesses, "
+                  f"avg {row['average_completeness']:.1f}%, {row['needing_enhancement']} need enhancement")
+        if analysis['businesses_rule_extracted']:
+            print(f"\n🧩 RULE-BASED EXTRACTION (no API calls):")
+            print(f"   Fields found in names, categories and descriptions for {analysis['businesses_rule_extracted']} businesses")
+            print(f"   Complete enough without the model: {analysis['businesses_rule_completed']}")
+        if duplicate_positions:
+            print(f"\n👯 DUPLICATE LISTINGS:")
+            print(f"   {len(duplicate_positions)} businesses are duplicates of another listing and will copy its enhancement")
+        if self.previous:
+            print(f"\n♻️  INCREMENTAL (vs previous output):")
+            print(f"   Unchanged, reusing previous enhancement: {incremental[STATUS_UNCHANGED]}")
+            print(f"   New: {incremental[STATUS_NEW]}, changed: {incremental[STATUS_CHANGED]}, "
+                  f"expired: {incremental[STATUS_EXPIRED]}")
+        print(f"\n💰 ESTIMATED COSTS ({MODEL_NAME}, {'tiktoken' if self.token_counter.exact else 'approximate'} token counts):")
+        print(f"   Requests: {projection['requests']} ({projection['cached']} answered from cache)")
+        print(f"   Prompt tokens: {projection['prompt_tokens']:,} ({projection['cached_prompt_tokens']:,} expected from the prompt cache)")
+        print(f"   Expected: ${estimated_cost_min:.2f}")
+        print(f"   Worst case (every answer hits max_tokens): ${estimated_cost_max:.2f}")
         print(f"   Your limit: ${self.max_cost:.2f}")
+        if deferred:
+            print(f"\n🎯 PRIORITY SCHEDULING (the budget doesn't cover every business):")
+            print(f"   Enhancing the {len(positions) - deferred} with the most expected completeness gain per dollar, "
+                  f"weighted by reviews, rating and verification")
+            print(f"   Expected: +{selector.selected_gain:,.0f} completeness points for ${selector.total_cost * price_multiplier:.2f}")
+            print(f"   Deferred to a later run: {deferred}")
         
         return analysis
 
-    def process_batch(self, batch_businesses, batch_number, total_batches):
+    async def _request_with_reservation(self, business, reservation, semaphore):
+        """Run one enhancement request and release its budget reservation and slot"""
+        try:
+            return await self.request_ai_enhancement(business)
+        finally:
+            self.ledger.release(reservation)
+            semaphore.release()
+
+    async def _request_pack_with_reservation(self, businesses, reservation, semaphore):
+        """Run one packed request and release its budget reservation and slot"""
+        try:
+            return await self.request_packed_enhancement(businesses)
+        finally:
+            self.ledger.release(reservation)
+            semaphore.release()
+
+    async def _dispatch_batch(self, batch_businesses, queue):
+        """
+        Admit businesses in input order and queue (business, request task, index) entries
+        
+        Every request, single or packed, holds one concurrency slot. For a
+        packed request the index picks the business's answer out of the
+        pack's results; for a single request it is None. A task of None means
+        the business was passed through without a request. A final None on
+        the queue marks the end of the batch.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        pack = []
+        pack_reservation = 0.0
+        
+        async def send_pack():
+            nonlocal pack, pack_reservation
+            if not pack:
+                return
+            task = asyncio.create_task(self._request_pack_with_reservation(pack, pack_reservation, semaphore))
+            for index, packed_business in enumerate(pack):
+                await queue.put((packed_business, task, index))
+            pack = []
+            pack_reservation = 0.0
+        
+        try:
+            for i, business in enumerate(batch_businesses, 1):
+                # In cache-only mode an uncached business is passed through untouched
+                if self.cache_only and not self.is_cached(business):
+                    await send_pack()
+                    await queue.put((business, None, None))
+                    continue
+                
+                # Cached businesses are answered locally, so there's nothing to pack
+                packable = self.pack_size > 1 and not self.is_cached(business)
+                if not packable:
+                    await send_pack()
+                
+                # Wait for a free slot before checking the budget, so the check
+                # sees the actual cost of every request that has finished so far
+                if not pack:
+                    waiting = time.perf_counter()
+                    await semaphore.acquire()
+                    self.metrics.observe(STAGE_SLOT_WAIT, time.perf_counter() - waiting)
+                
+                # Check cost limit, counting requests still in flight at their worst case
+                reservation = self.estimate_request_cost(business)
+                if not self.ledger.reserve(reservation):
+                    if not pack:
+                        semaphore.release()
+                    self.budget_exhausted = True
+                    print(f"💰 Cost limit reached (${self.max_cost:.2f}). Stopping.")
+                    break
+                
+                self.progress(f"[{i}/{len(batch_businesses)}] Enhancing: {business.name}")
+                if packable:
+                    pack.append(business)
+                    pack_reservation += reservation
+                    if len(pack) >= self.pack_limit:
+                        await send_pack()
+                else:
+                    await queue.put((business, asyncio.create_task(
+                        self._request_with_reservation(business, reservation, semaphore)
+                    ), None))
+            
+            await send_pack()
+        finally:
+            await queue.put(None)
+
+    async def process_batch(self, batch_businesses, batch_number, total_batches):
         """
         Process a batch of yoga businesses with AI enhancement
         
+        Requests are sent concurrently (up to self.concurrency at a time) but
+        admitted, merged and counted in input order, so the output order and
+        self.stats are the same as a serial run. Each result is merged and
+        journaled as soon as it and every business before it have finished.
+        
         Args:
-            batch_businesses (list): Businesses to process
+            batch_businesses (list): BusinessRecords to process
             batch_number (int): Current batch number
             total_batches (int): Total number of batches
             
         Returns:
-            list: Enhanced businesses
+            list: Enhanced businesses, one per business processed before any
+                cost limit was reached
         """
         print(f"\n🔄 Processing Batch {batch_number}/{total_batches} ({len(batch_businesses)} businesses)")
         print(f"💰 Current cost: ${self.current_cost:.2f} / ${self.max_cost:.2f}")
         
-        enhanced_batch = []
         batch_start_cost = self.current_cost
+        batch_start_time = time.monotonic()
+        queue = asyncio.Queue()
+        dispatcher = asyncio.create_task(self._dispatch_batch(batch_businesses, queue))
         
-        for i, business in enumerate(batch_businesses, 1):
-            business_name = business.get('name', 'Unknown')
-            print(f"[{i}/{len(batch_businesses)}] Enhancing: {business_name}")
-            
-            # Check cost limit
-            if self.current_cost >= self.max_cost:
-                print(f"💰 Cost limit reached (${self.max_cost:.2f}). Stopping.")
-                break
+        enhanced_batch = []
+        try:
+            while (item := await queue.get()) is not None:
+                business, task, index = item
+                business_name = business.name
+                if task is None:
+                    enhanced_batch.append(business.raw)
+                    self.stats['cache_misses'] += 1
+                    self.metrics.count('businesses_total', outcome='not_cached')
+                    continue
+                
+                ai_data = await task
+                if index is not None:
+                    ai_data = ai_data[index]
+                enhanced = None
+                if ai_data is not None:
+                    merge_started = time.perf_counter()
+                    enhanced = self.merge_ai_enhancement(business, ai_data)
+                    self.metrics.observe(STAGE_MERGE, time.perf_counter() - merge_started)
+                
+                if enhanced:
+                    enhanced_batch.append(enhanced)
+                    self.stats['successfully_enhanced'] += 1
+                    self.metrics.count('businesses_total', outcome='enhanced')
+                    self.progress(f"   ✅ Enhanced successfully: {business_name}")
+                else:
+                    enhanced_batch.append(business.raw)  # Keep original if enhancement failed
+                    self.stats['failed_enhancements'] += 1
+                    error, transient = self.failures.pop(business.id, ('enhancement failed', True))
+                    self.retry_queue.add(business, error, transient)
+                    self.metrics.count('businesses_total', outcome='failed')
+                    self.progress(f"   ❌ Enhancement failed, keeping original{' for now' if transient else ''}: {business_name}")
+                
+                self.stats['total_processed'] += 1
+                
+                if self.journal:
+                    self.journal.append(business.id, 'enhanced' if enhanced else 'failed', enhanced_batch[-1])
+        finally:
+            dispatcher.cancel()
+        
+        batch_cost = self.current_cost - batch_start_cost
+        batch_time = time.monotonic() - batch_start_time
+        print(f"💰 Batch cost: ${batch_cost:.2f} ({batch_time:.1f}s)")
+        
+        return enhanced_batch
+
+    async def _enhance_stream(self, businesses, needs_flags, completed, writer, total_batches):
+        """
+        Enhance a stream of businesses in batches, writing each one out in input order
+        
+        Businesses that don't need enhancement, were finished by the run
+        being resumed, or are unchanged since the previous output
+        (--incremental) are written straight through. Those that do are
+        gathered into batches, and the businesses in between wait in a window
+        until their batch is done, so only about one batch's span of the
+        dataset is held in memory. Once the cost limit is reached the rest are
+        written unchanged. Duplicate listings are written unchanged too, then
+        replaced at the end with a copy of their canonical business's result.
+        
+        Args:
+            businesses (iterable): Business dicts in input order
+            needs_flags (iterable): Whether each business needs enhancement
+            completed (dict): Journal entries (id -> {'status', 'record'}) of a resumed run;
+                only enhanced ones are reused
+            writer (DatasetWriter): Output dataset
+            total_batches (int): Number of batches expected, for progress messages
             
-            # AI enhancement
-            enhanced = self.ai_enhance_single_business(business)
+        Returns:
+            int: Businesses that needed enhancement but were left unprocessed
+        """
+        window = []  # (business, its index in batch or None)
+        batch = []
+        batch_number = 0
+        not_processed = 0
+        canonical_ids = set(self.duplicates.values())
+        canonical_output = {}  # str(id) -> enhanced canonical business
+        duplicate_input = {}  # str(id) -> duplicate business as read
+        
+        def emit(business):
+            business_id = str(business.get('id'))
+            if business_id in self.duplicates:
+                duplicate_input[business_id] = business
+            elif business_id in canonical_ids and business.get('ai_enhanced'):
+                canonical_output[business_id] = business
+            writer.write(business)
+        
+        async def flush():
+            nonlocal window, batch, batch_number, not_processed
+            enhanced_batch = []
+            if batch and not self.budget_exhausted:
+                batch_number += 1
+                enhanced_batch = await self.process_batch(batch, batch_number, total_batches)
+                # Check if cost limit reached
+                if self.ledger.exhausted:
+                    self.budget_exhausted = True
+            not_processed += len(batch) - len(enhanced_batch)
+            for business, index in window:
+                if index is not None and index < len(enhanced_batch):
+                    business = enhanced_batch[index]
+                emit(business)
+            window = []
+            batch = []
+        
+        for business, needs in zip(businesses, needs_flags):
+            business_id = business.get('id')
+            # Businesses the resumed run failed on go through the batches (and retries) again
+            if needs and completed.get(business_id, {}).get('status') == 'enhanced':
+                business, needs = completed[business_id]['record'], False
+            elif needs and (reused := self.reuse_previous_enhancement(business)) is not None:
+                business, needs = reused, False
             
-            if enhanced:
-                enhanced_batch.append(enhanced)
-                self.stats['successfully_enhanced'] += 1
-                print(f"   ✅ Enhanced successfully")
+            if needs:
+                window.append((business, len(batch)))
+                batch.append(BusinessRecord(business))
+                if len(batch) >= self.batch_size:
+                    await flush()
+            elif batch:
+                window.append((business, None))
             else:
-                enhanced_batch.append(business)  # Keep original if enhancement failed
-                self.stats['failed_enhancements'] += 1
-                print(f"   ❌ Enhancement failed, keeping original")
-            
-            self.stats['total_processed'] += 1
+                emit(business)
+        
+        await flush()
+        replacements = await self.retry_failed_enhancements()
+        canonical_output.update((business_id, business) for business_id, business in replacements.items()
+                                if business_id in canonical_ids)
+        replacements.update(self.copy_duplicate_enhancements(duplicate_input, canonical_output))
+        writer.replace(replacements)
+        return not_processed
+
+    def copy_duplicate_enhancements(self, duplicates, canonical_output):
+        """
+        Apply each canonical business's enhancement to its duplicates
+        
+        The canonical business's enhancement is copied with its timestamp, so
+        a duplicate keeps any details of its own (phone, website, ...) and
+        only gains what it lacks.
+        
+        Args:
+            duplicates (dict): str(id) -> duplicate business as read
+            canonical_output (dict): str(id) -> enhanced canonical business
             
-            # Small delay to avoid rate limits
-            time.sleep(0.5)
+        Returns:
+            dict: str(id) -> enhanced duplicate, for each whose canonical business was enhanced
+        """
+        copies = {}
+        for business_id, business in duplicates.items():
+            canonical = canonical_output.get(self.duplicates[business_id])
+            if canonical is None:
+                continue
+            enhanced = copy_enhancement(business, canonical)
+            copies[business_id] = enhanced
+            self.stats['completeness_gain'] += (BusinessRecord(enhanced).completeness_score -
+                                                BusinessRecord(business).completeness_score)
+            self.stats['duplicates_copied'] += 1
+            self.metrics.count('businesses_total', outcome='copied_from_duplicate')
+            if self.journal:
+                self.journal.append(business.get('id'), 'enhanced', enhanced)
+        if copies and self.stats['successfully_enhanced']:
+            # Each copy saved one enhancement at the run's average cost
+            average_cost = self.current_cost / self.stats['successfully_enhanced']
+            self.stats['dedup_saved_cost'] += len(copies) * average_cost
+        return copies
+
+    async def retry_enhancement(self, record):
+        """
+        One more attempt at a business that failed, within the budget
         
-        batch_cost = self.current_cost - batch_start_cost
-        print(f"💰 Batch cost: ${batch_cost:.2f}")
+        Returns:
+            tuple: (enhanced business or None, error or None, whether the failure is transient)
+        """
+        reservation = self.estimate_request_cost(record)
+        if not self.ledger.reserve(reservation):
+            self.budget_exhausted = True
+            return None, 'cost limit reached', False
+        try:
+            ai_data = await self.request_ai_enhancement(record)
+        finally:
+            self.ledger.release(reservation)
+        if ai_data is None:
+            error, transient = self.failures.pop(record.id, ('enhancement failed', True))
+            return None, error, transient
+        return self.merge_ai_enhancement(record, ai_data), None, False
+
+    async def retry_failed_enhancements(self):
+        """
+        Drain the retry queue once the main pass is done
         
-        return enhanced_batch
+        Returns:
+            dict: str(business id) -> enhanced business, for each retry that succeeded
+        """
+        if not self.retry_queue:
+            return {}
+        if self.budget_exhausted:
+            self.retry_queue.give_up('cost limit reached')
+            return {}
+        
+        print(f"\n🔁 Retrying {len(self.retry_queue)} failed businesses (up to {self.retry_queue.max_attempts} attempts each)")
+        replacements = {}
+        for record, enhanced in await self.retry_queue.drain(self.retry_enhancement, self.concurrency):
+            replacements[str(record.id)] = enhanced
+            self.stats['retried_successfully'] += 1
+            self.stats['successfully_enhanced'] += 1
+            self.stats['failed_enhancements'] -= 1
+            self.metrics.count('businesses_total', outcome='enhanced_on_retry')
+            self.progress(f"   ✅ Enhanced on retry: {record.name}")
+            if self.journal:
+                self.journal.append(record.id, 'enhanced', enhanced)
+        return replacements
+
+    def write_dead_letter(self, output_path, path=None):
+        """
+        Save businesses that ran out of attempts for a later --retry-dead-letter run
+        
+        Args:
+            output_path (Path): Output dataset the businesses belong in
+            path (Path): Dead-letter file (default: next to the output)
+        """
+        path = path or dead_letter_path(output_path)
+        count = write_dead_letter(path, self.retry_queue.dead, output_path)
+        self.stats['dead_lettered'] = count
+        if count:
+            print(f"☠️  {count} businesses still failing, saved to {path}")
+            print(f"   Retry them alone with: --retry-dead-letter {path}")
+
+    def journal_checkpoint(self):
+        """Run state saved with each journal flush so a resumed run carries on from it"""
+        return {'cost': self.current_cost, 'stats': dict(self.stats)}
 
-    def enhance_yoga_businesses(self, input_file=None, output_file=None):
+    def enhance_yoga_businesses(self, input_file=None, output_file=None, resume_journal=None):
         """
         Main function to enhance yoga businesses data
         
+        The input is streamed twice, once to analyze it and once to enhance
+        it, and the output is written as it goes, so memory use stays flat
+        however large the dataset is. Businesses keep their input order.
+        
         Args:
             input_file (str): Path to input JSON file
             output_file (str): Path to output JSON file
+            resume_journal (str): Journal from an interrupted run to resume from
         """
         print("\n🧘‍♀️ BALI YOGA BUSINESSES AI ENHANCEMENT 🧘‍♂️")
         print("=" * 60)
         
-        # Set default file paths if not provided
+        input_path, output_path = self.resolve_paths(input_file, output_file)
+        if not input_path.exists():
+            print(f"❌ Error: {input_path} not found!")
+            return
+        
+        # Analyze data completeness and confirm with user
+        try:
+            if self.dedup:
+                self.find_duplicates(input_path)
+            analysis = self.analyze_data_completeness(self.stream_businesses(input_path))
+        except ValueError as e:
+            print(f"❌ Error loading data: {e}")
+            return
+        if not self.confirm_enhancement(analysis):
+            return
+        
+        # Pick up where an interrupted run left off
+        completed = {}
+        if resume_journal:
+            journal_path = Path(resume_journal)
+            if journal_path.exists():
+                completed, checkpoint = load_journal(journal_path)
+                failed = sum(1 for entry in completed.values() if entry['status'] != 'enhanced')
+                if checkpoint:
+                    self.ledger.spent = checkpoint['cost']
+                    self.stats.update(checkpoint['stats'])
+                    # Failed businesses are processed again, and counted again when they are
+                    self.stats['failed_enhancements'] -= failed
+                    self.stats['total_processed'] -= failed
+                print(f"♻️  Resuming from {journal_path}: {len(completed) - failed} businesses already done, "
+                      f"{failed} failed ones to try again, ${self.current_cost:.2f} spent")
+        else:
+            journal_path = output_path.with_suffix('.journal.jsonl')
+        
+        self.stats['reused_unchanged'] = analysis['businesses_reused']
+        self.stats['deferred_by_priority'] = analysis['businesses_deferred']
+        self.stats['rule_extracted'] = analysis['businesses_rule_extracted']
+        self.stats['rule_completed'] = analysis['businesses_rule_completed']
+        pending_count = max(0, analysis['businesses_needing_enhancement'] - analysis['businesses_reused'] -
+                            analysis['businesses_deferred'] - analysis['businesses_duplicate'] -
+                            sum(1 for entry in completed.values() if entry['status'] == 'enhanced'))
+        total_batches = (pending_count + self.batch_size - 1) // self.batch_size
+        
+        writer = self.open_output(output_path)
+        if writer is None:
+            return
+        
+        # Stream businesses through the enhancement batches, journaling each result
+        self.journal = RunJournal(journal_path, self.journal_checkpoint)
+        print(f"📝 Journaling progress to {journal_path} (resume with --resume {journal_path})")
+        try:
+            not_processed = asyncio.run(self._enhance_stream(
+                self.stream_businesses(input_path), analysis['needs_enhancement'],
+                completed, writer, total_batches
+            ))
+        except BaseException:
+            writer.abort()
+            raise
+        finally:
+            self.journal.close()
+            self.journal = None
+        
+        if not_processed:
+            print(f"💰 Cost limit reached. {not_processed} businesses not processed.")
+        self.write_dead_letter(output_path)
+        self.finish_output(writer)
+        self.print_final_stats()
+
+    def _select_batch_requests(self, businesses_to_enhance):
+        """
+        Yield batch request bodies for uncached businesses that fit in the budget
+        
+        Args:
+            businesses_to_enhance (iterable): BusinessRecords that need enhancement
+            
+        Yields:
+            tuple: (business id, chat completion request body)
+        """
+        projected_cost = self.current_cost
+        for business in businesses_to_enhance:
+            if self.is_cached(business):
+                continue
+            cost = self.estimate_request_cost(business) * BATCH_PRICE_MULTIPLIER
+            if projected_cost + cost > self.max_cost:
+                print(f"💰 Cost limit reached (${self.max_cost:.2f}). Remaining businesses not submitted.")
+                return
+            projected_cost += cost
+            
+            fields, prompt, params = self.enhancement_request(business)
+            self.stats['field_targeted_requests'] += 1
+            self.stats['fields_requested'] += len(fields)
+            yield business.id, dict(model=MODEL_NAME, messages=self.build_messages(prompt), **params)
+
+    async def _collect_batch(self, job, poll_interval):
+        """
+        Wait for a submitted batch and gather its results
+        
+        Returns:
+            dict: business id -> (response body or None, error message or None)
+        """
+        batch = await job.wait(self.client, poll_interval)
+        if batch.status != 'completed':
+            print(f"⚠️  Batch ended with status '{batch.status}'; collecting whatever finished")
+        
+        results = {}
+        async for custom_id, body, error in job.iter_results(self.client):
+            results[custom_id] = (body, error)
+        return results
+
+    def enhance_yoga_businesses_batch(self, input_file=None, output_file=None, batch_state=None, poll_interval=30.0):
+        """
+        Enhance yoga businesses through the offline Batch API
+        
+        A new run submits a batch and records it in a state file. Running again
+        with that state file (e.g. after a restart) skips straight to polling
+        and collecting the results. Which businesses are submitted (leaving
+        out duplicates and those deferred by priority) is saved with the
+        state, so collecting applies the same plan and copies the canonical
+        businesses' results to their duplicates.
+        
+        Args:
+            input_file (str): Path to input JSON file
+            output_file (str): Path to output JSON file
+            batch_state (str): State file of a submitted batch, or where to create one
+            poll_interval (float): Seconds between status polls
+        """
+        print("\n🧘‍♀️ BALI YOGA BUSINESSES AI ENHANCEMENT (BATCH MODE) 🧘‍♂️")
+        print("=" * 60)
+        
+        if batch_state and Path(batch_state).exists():
+            job = BatchJob.load(batch_state)
+            input_path = Path(job.state['input_path'])
+            output_path = Path(job.state['output_path'])
+            print(f"♻️  Picking up batch {job.batch_id} from {job.state_path}")
+            if not input_path.exists():
+                print(f"❌ Error: {input_path} not found!")
+                return
+            # The businesses submitted, after dedup and prioritization, as planned when the batch was
+            plan = job.state['plan']
+            needs_flags = bytearray(plan['businesses'])
+            for index in plan['needs_enhancement']:
+                needs_flags[index] = True
+            self.duplicates = plan['duplicates']
+            self.stats.update(plan['stats'])
+        else:
+            input_path, output_path = self.resolve_paths(input_file, output_file)
+            if not input_path.exists():
+                print(f"❌ Error: {input_path} not found!")
+                return
+            
+            try:
+                if self.dedup:
+                    self.find_duplicates(input_path)
+                analysis = self.analyze_data_completeness(self.stream_businesses(input_path), BATCH_PRICE_MULTIPLIER)
+            except ValueError as e:
+                print(f"❌ Error loading data: {e}")
+                return
+            if not self.confirm_enhancement(analysis):
+                return
+            needs_flags = analysis['needs_enhancement']
+            self.stats['deferred_by_priority'] = analysis['businesses_deferred']
+            self.stats['rule_extracted'] = analysis['businesses_rule_extracted']
+            self.stats['rule_completed'] = analysis['businesses_rule_completed']
+            
+            state_path = Path(batch_state) if batch_state else output_path.with_suffix('.batch.json')
+            job = BatchJob(state_path, {
+                'input_path': str(input_path),
+                'output_path': str(output_path),
+                'model': MODEL_NAME,
+                'plan': {
+                    'businesses': len(needs_flags),
+                    'needs_enhancement': [index for index, needs in enumerate(needs_flags) if needs],
+                    'duplicates': self.duplicates,
+                    'stats': {key: self.stats[key] for key in
+                              ('deferred_by_priority', 'rule_extracted', 'rule_completed')}
+                }
+            })
+            businesses_to_enhance = (
+                BusinessRecord(business)
+                for business, needs in zip(self.stream_businesses(input_path), needs_flags)
+                if needs and self.reuse_previous_enhancement(business) is None
+            )
+            request_count = job.write_requests(
+                output_path.with_suffix('.batch_requests.jsonl'),
+                self._select_batch_requests(businesses_to_enhance)
+            )
+            job.save()
+            
+            if request_count:
+                asyncio.run(job.submit(self.client))
+                print(f"📤 Submitted batch {job.batch_id} with {request_count} requests")
+                print(f"   If interrupted, collect it with: --mode batch --batch-state {job.state_path}")
+            else:
+                print("✅ Every business is already cached or unchanged. Nothing to submit.")
+        
+        results = asyncio.run(self._collect_batch(job, poll_interval)) if job.batch_id else {}
+        batch_model = job.state.get('model', MODEL_NAME)
+        
+        # Merge in input order through the same logic as the synchronous path
+        not_processed = 0
+        canonical_ids = set(self.duplicates.values())
+        canonical_output = {}  # str(id) -> enhanced canonical business
+        duplicate_input = {}  # str(id) -> duplicate business as read
+        writer = self.open_output(output_path)
+        if writer is None:
+            print(f"   Collect the batch again once it is fixed: --mode batch --batch-state {job.state_path}")
+            return
+        try:
+            for business, needs in zip(self.stream_businesses(input_path), needs_flags):
+                if not needs:
+                    if str(business.get('id')) in self.duplicates:
+                        duplicate_input[str(business.get('id'))] = business
+                    writer.write(business)
+                    continue
+                
+                record = BusinessRecord(business)
+                reused = self.reuse_previous_enhancement(record)
+                if reused is not None:
+                    writer.write(reused)
+                    if str(record.id) in canonical_ids:
+                        canonical_output[str(record.id)] = reused
+                    self.stats['reused_unchanged'] += 1
+                    continue
+                
+                if record.id in results:
+                    body, error = results.pop(record.id)
+                elif self.is_cached(record):
+                    body, error = None, None
+                else:
+                    not_processed += 1
+                    writer.write(business)
+                    continue
+                
+                enhanced = None
+                cost = 0.0
+                try:
+                    if error:
+                        raise ValueError(error)
+                    if body is None:
+                        cached = self.cache.get(self.business_cache_key(record))
+                        content = cached['content']
+                        self.stats['cache_hits'] += 1
+                    else:
+                        content = body['choices'][0]['message']['content']
+                        usage = body.get('usage') or {}
+                        cost = self.ledger.charge_usage(batch_model, usage, multiplier=BATCH_PRICE_MULTIPLIER)
+                    # Fields that fail validation are left out; re-asking would need another batch
+                    ai_data, failed = self.parse_ai_response(content, self.requested_fields(record))
+                    if not ai_data:
+                        raise ValueError("no usable fields in the answer")
+                    if self.cache and body is not None and not failed:
+                        self.cache.put(
+                            self.business_cache_key(record), MODEL_NAME, content,
+                            usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0)
+                        )
+                    enhanced = self.merge_ai_enhancement(record, ai_data)
+                except Exception as e:
+                    self.progress(f"❌ Batch result error for {record.name}: {e}")
+                    self.record_wasted_spend(cost)
+                    self.retry_queue.add(record, str(e), transient=False)
+                
+                if enhanced:
+                    writer.write(enhanced)
+                    if str(record.id) in canonical_ids:
+                        canonical_output[str(record.id)] = enhanced
+                    self.stats['successfully_enhanced'] += 1
+                    self.metrics.count('businesses_total', outcome='enhanced')
+                else:
+                    writer.write(business)  # Keep original if enhancement failed
+                    self.stats['failed_enhancements'] += 1
+                    self.metrics.count('businesses_total', outcome='failed')
+                self.stats['total_processed'] += 1
+            writer.replace(self.copy_duplicate_enhancements(duplicate_input, canonical_output))
+        except BaseException:
+            writer.abort()
+            raise
+        
+        if not_processed:
+            print(f"💰 {not_processed} businesses were not submitted and are left unchanged.")
+        
+        self.write_dead_letter(output_path)
+        self.finish_output(writer)
+        job.state['collected_at'] = datetime.now().isoformat()
+        job.save()
+        self.print_final_stats()
+
+    def retry_dead_letter(self, dead_letter_file, output_file=None):
+        """
+        Retry only the businesses in a dead-letter file
+        
+        Each business gets a fresh set of attempts. Those that succeed replace
+        their original in the output dataset they were dead-lettered from;
+        those that still fail are written back to the dead-letter file. The
+        retry's stats are added to the enhancement_stats already in the output.
+        
+        Args:
+            dead_letter_file (str): Dead-letter JSONL file from an earlier run
+            output_file (str): Dataset to update (default: the one recorded in the file)
+        """
+        print("\n🧘‍♀️ BALI YOGA BUSINESSES AI ENHANCEMENT (DEAD-LETTER RETRY) 🧘‍♂️")
+        print("=" * 60)
+        
+        path = Path(dead_letter_file)
+        if not path.exists():
+            print(f"❌ Error: {path} not found!")
+            return
+        entries = load_dead_letter(path)
+        if not entries:
+            print("✅ The dead-letter file is empty. Nothing to retry.")
+            return
+        output_path = Path(output_file or entries[0]['output'])
+        if not output_path.exists():
+            print(f"❌ Error: {output_path} not found!")
+            return
+        
+        # The stats of the run that dead-lettered them, which this retry adds to
+        previous = (read_metadata(output_path) or {}).get('enhancement_stats')
+        
+        for entry in entries:
+            self.retry_queue.add(BusinessRecord(entry['business']), entry.get('error'), attempts=0)
+        print(f"🔁 Retrying {len(entries)} businesses from {path} into {output_path}")
+        succeeded = asyncio.run(self.retry_queue.drain(self.retry_enhancement, self.concurrency))
+        
+        replacements = {}
+        for record, enhanced in succeeded:
+            replacements[str(record.id)] = enhanced
+            self.progress(f"   ✅ Enhanced on retry: {record.name}")
+        self.stats['successfully_enhanced'] = self.stats['retried_successfully'] = len(succeeded)
+        if previous:
+            # Already counted as processed and failed; those enhanced now stop counting as failed
+            self.stats['failed_enhancements'] = -len(succeeded)
+        else:
+            self.stats['total_processed'] = len(entries)
+            self.stats['failed_enhancements'] = len(entries) - len(succeeded)
+        
+        writer = dataset_writer(output_path)
+        try:
+            for business in iter_businesses(output_path):
+                writer.write(replacements.get(str(business.get('id')), business))
+        except BaseException:
+            writer.abort()
+            raise
+        
+        self.write_dead_letter(output_path, path)
+        if previous:
+            still_failing = self.stats['dead_lettered']
+            self.stats = merge_stats([previous, self.stats])
+            self.stats['dead_lettered'] = still_failing
+        self.finish_output(writer)
+        self.print_final_stats()
+
+    def enhance_sharded(self, input_file=None, output_file=None, workers=2, argv=()):
+        """
+        Split the run across worker processes sharing one budget, then merge their outputs
+        
+        Businesses are sharded by id hash. Each worker gets an equal share of
+        the rate limits, and all of them reserve spend in one SQLite ledger,
+        so together they stay within max_cost.
+        
+        Args:
+            input_file (str): Path to input JSON file
+            output_file (str): Path to the merged output JSON file
+            workers (int): Number of worker processes
+            argv (list): Other command-line options to pass on to every worker
+        """
+        print(f"\n🧘‍♀️ BALI YOGA BUSINESSES AI ENHANCEMENT ({workers} WORKERS) 🧘‍♂️")
+        print("=" * 60)
+        
+        input_path, output_path = self.resolve_paths(input_file, output_file)
+        if not input_path.exists():
+            print(f"❌ Error: {input_path} not found!")
+            return
+        try:
+            analysis = self.analyze_data_completeness(self.stream_businesses(input_path))
+        except ValueError as e:
+            print(f"❌ Error loading data: {e}")
+            return
+        if not self.confirm_enhancement(analysis):
+            return
+        
+        # A fresh ledger per run; reservations from a crashed earlier run would never be released
+        ledger_path = shared_ledger_path(output_path)
+        for stale in (ledger_path, Path(f"{ledger_path}-wal"), Path(f"{ledger_path}-shm")):
+            stale.unlink(missing_ok=True)
+        ledger = SharedCostLedger(ledger_path, self.max_cost)
+        
+        outputs = [shard_path(output_path, index, workers) for index in range(workers)]
+        rpm = max(1, int(self.rate_limiter.requests.limit) // workers)
+        tpm = max(1, int(self.rate_limiter.tokens.limit) // workers)
+        commands = [
+            [*worker_args(argv, index, workers),
+             '--input', str(input_path), '--output', str(outputs[index]),
+             '--shard', f"{index}/{workers}", '--shared-ledger', str(ledger_path),
+             '--rpm', str(rpm), '--tpm', str(tpm), '--yes']
+            for index in range(workers)
+        ]
+        print(f"\n🧩 Starting {workers} workers sharing a ${self.max_cost:.2f} budget ({rpm} RPM, {tpm} TPM each)")
+        started = time.monotonic()
+        codes = run_workers(Path(__file__), commands)
+        total_cost = ledger.total_spent
+        ledger.close()
+        
+        failed = [index for index, code in enumerate(codes) if code or not outputs[index].exists()]
+        if failed:
+            print(f"\n❌ {len(failed)} workers failed: shards {', '.join(f'{index}/{workers}' for index in failed)}")
+            print(f"   Rerun a shard with: --shard I/{workers} --shared-ledger {ledger_path} "
+                  f"--output {shard_path(output_path, 'I', workers)} --resume <its journal>")
+            print(f"   Then merge with: --merge-shards {' '.join(str(path) for path in outputs)} --output {output_path}")
+            return
+        
+        # Together the workers must stay within the limits this run was given. A full
+        # bucket lets a worker send a minute of its share at once, then its share per minute.
+        for index, path in enumerate(outputs):
+            shard = (read_metadata(path) or {}).get('shard', {})
+            minutes = shard.get('elapsed_seconds', 0) / 60
+            if shard.get('requests', 0) > rpm * (1 + minutes) or shard.get('tokens', 0) > tpm * (1 + minutes):
+                print(f"⚠️  Worker {index}/{workers} sent {shard['requests']} requests and {shard['tokens']:,} tokens "
+                      f"in {shard['elapsed_seconds']:.0f}s ({shard['achieved_rpm']:.0f} RPM, "
+                      f"{shard['achieved_tpm']:.0f} TPM), more than its share of {rpm} RPM, {tpm} TPM allows")
+        
+        self.merge_shard_outputs(outputs, input_path, output_path)
+        for path in outputs:
+            path.unlink()
+            dead_letter_path(path).unlink(missing_ok=True)
+        for path in (ledger_path, Path(f"{ledger_path}-wal"), Path(f"{ledger_path}-shm")):
+            path.unlink(missing_ok=True)
+        print(f"💰 Total cost across workers: ${total_cost:.4f} (limit ${self.max_cost:.2f}) in {time.monotonic() - started:.1f}s")
+
+    def merge_shard_outputs(self, shard_files, input_file=None, output_file=None):
+        """
+        Merge the outputs of sharded workers into one dataset in input order
+        
+        Args:
+            shard_files (list): Shard output files
+            input_file (str): Input JSON file the shards were run on
+            output_file (str): Path to the merged output JSON file
+            
+        Returns:
+            bool: True if the shards were merged
+        """
+        input_path, output_path = self.resolve_paths(input_file, output_file)
+        try:
+            metadata = merge_shards(input_path, shard_files, output_path)
+        except (ValueError, OSError) as e:
+            print(f"❌ Error merging shards: {e}")
+            return False
+        dead_lettered = merge_dead_letters(shard_files, output_path)
+        
+        stats = metadata['enhancement_stats']
+        print(f"\n✅ Merged {metadata['shards']} shards ({metadata['total_businesses']} businesses) into {output_path}")
+        print(f"   Total businesses processed: {stats.get('total_processed', 0)}")
+        print(f"   Successfully enhanced: {stats.get('successfully_enhanced', 0)}")
+        print(f"   Failed enhancements: {stats.get('failed_enhancements', 0)}")
+        if dead_lettered:
+            print(f"☠️  {dead_lettered} businesses still failing, saved to {dead_letter_path(output_path)}")
+        if self.search_index:
+            self.write_search_index(output_path)
+        return True
+
+    def resolve_paths(self, input_file=None, output_file=None):
+        """
+        Apply the default input and timestamped output paths
+        
+        Returns:
+            tuple: (input Path, output Path)
+        """
         if input_file:
             input_path = Path(input_file)
         else:
@@ -558,79 +2265,126 @@ CONTEXT ABOUT BALI YOGA SCENE:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_path = self.base_folder / f"yoga_businesses_enhanced_{timestamp}.json"
         
-        # Load data
-        businesses = self.load_existing_data(input_path)
-        if not businesses:
-            return
-        
-        # Analyze data completeness
-        analysis = self.analyze_data_completeness(businesses)
-        businesses_to_enhance = analysis['businesses_to_enhance']
+        return input_path, output_path
+
+    def confirm_enhancement(self, analysis):
+        """
+        Ask the user to confirm the run
         
-        if not businesses_to_enhance:
+        Args:
+            analysis (dict): Result of analyze_data_completeness
+            
+        Returns:
+            bool: True if there is work to do and the user agreed
+        """
+        if not analysis['businesses_needing_enhancement']:
             print("\n✅ All businesses have sufficient data quality. No enhancement needed!")
-            return
+            return False
+        
+        to_enhance = (analysis['businesses_needing_enhancement'] - analysis['businesses_reused'] -
+                      analysis['businesses_deferred'] - analysis['businesses_duplicate'])
+        if not to_enhance:
+            print("\n✅ Nothing changed since the previous run. Writing output from previous enhancements.")
+            return True
         
-        # Confirm with user
-        print(f"\n🚀 Ready to enhance {len(businesses_to_enhance)} businesses")
-        proceed = input(f"Proceed with enhancement? Estimated cost: ${analysis['estimated_cost_range'][0]:.2f}-${analysis['estimated_cost_range'][1]:.2f} [y/N]: ")
+        print(f"\n🚀 Ready to enhance {to_enhance} businesses")
+        if self.assume_yes:
+            return True
+        proceed = input(f"Proceed with enhancement? Estimated cost: ${analysis['estimated_cost_range'][0]:.2f} (worst case ${analysis['estimated_cost_range'][1]:.2f}) [y/N]: ")
         
         if proceed.lower() != 'y':
             print("Enhancement cancelled by user.")
-            return
+            return False
+        return True
+
+    def open_output(self, output_path):
+        """
+        Open where the enhanced dataset goes: the database with --db-url, else the file
         
-        # Process in batches
-        enhanced_businesses = []
-        businesses_not_enhanced = []
-        
-        # Identify businesses that don't need enhancement
-        for business in businesses:
-            if not self.needs_enhancement(business):
-                businesses_not_enhanced.append(business)
-        
-        # Process businesses that need enhancement in batches
-        total_batches = (len(businesses_to_enhance) + self.batch_size - 1) // self.batch_size
-        
-        for batch_num in range(total_batches):
-            start_idx = batch_num * self.batch_size
-            end_idx = min(start_idx + self.batch_size, len(businesses_to_enhance))
-            batch = businesses_to_enhance[start_idx:end_idx]
-            
-            enhanced_batch = self.process_batch(batch, batch_num + 1, total_batches)
-            enhanced_businesses.extend(enhanced_batch)
-            
-            # Check if cost limit reached
-            if self.current_cost >= self.max_cost:
-                remaining = businesses_to_enhance[end_idx:]
-                businesses_not_enhanced.extend(remaining)
-                print(f"💰 Cost limit reached. {len(remaining)} businesses not processed.")
-                break
-        
-        # Combine enhanced and non-enhanced businesses
-        all_businesses = enhanced_businesses + businesses_not_enhanced
-        
-        # Create output JSON
-        output_data = {
-            "metadata": {
-                "total_businesses": len(all_businesses),
-                "generation_date": datetime.now().strftime("%Y-%m-%d"),
-                "source": "Bali Yoga Studios & Retreats AI Enhancement",
-                "description": "AI-enhanced dataset of yoga studios and retreat centers in Bali",
-                "columns": len(all_businesses[0].keys()) if all_businesses else 0,
-                "enhancement_stats": self.stats
-            },
-            "businesses": all_businesses
+        Args:
+            output_path (Path): Output JSON file, or a snapshot if it ends in .snapshot
+            
+        Returns:
+            DatasetWriter|SnapshotWriter|PostgresSink: The output, or None if the database couldn't be opened
+        """
+        if not self.db_url:
+            return dataset_writer(output_path)
+        try:
+            sink = PostgresSink(self.db_url, self.db_table)
+        except Exception as e:
+            print(f"❌ Error opening {self.db_table} at {redact_dsn(self.db_url)}: {e}")
+            return None
+        print(f"🐘 Upserting businesses into {sink.path} ({len(sink.column_types)} columns)")
+        return sink
+
+    def finish_output(self, writer):
+        """
+        Write the metadata envelope after the streamed businesses and close the output
+        
+        Args:
+            writer (DatasetWriter): Output dataset with every business written
+        """
+        metadata = {
+            "total_businesses": writer.count,
+            "generation_date": datetime.now().strftime("%Y-%m-%d"),
+            "source": "Bali Yoga Studios & Retreats AI Enhancement",
+            "description": "AI-enhanced dataset of yoga studios and retreat centers in Bali",
+            "columns": writer.columns,
+            "enhancement_stats": self.stats
         }
+        if self.shard:
+            throughput = self.rate_limiter.report()
+            metadata["shard"] = {"index": self.shard[0], "count": self.shard[1]}
+            metadata["shard"].update((key, throughput[key]) for key in (
+                'requests', 'tokens', 'elapsed_seconds', 'achieved_rpm', 'achieved_tpm'
+            ))
         
         # Save output
         try:
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, indent=2, ensure_ascii=False)
-            print(f"\n✅ Enhanced data saved to {output_path}")
+            writer.close(metadata)
+            print(f"\n✅ Enhanced data saved to {writer.path}")
         except Exception as e:
             print(f"❌ Error saving output: {e}")
+        else:
+            # Shard outputs are indexed once merged; a database has its own indexes
+            if self.search_index and not self.db_url and not self.shard:
+                self.write_search_index(writer.path)
+        
+        if self.cache:
+            evicted = self.cache.evict()
+            if evicted:
+                print(f"🧹 Evicted {evicted} stale cache entries")
+
+    def write_search_index(self, output_path):
+        """
+        Bring the search and facet index next to an output file up to date
         
-        # Print final stats
+        Only businesses whose indexed fields changed since the sidecar was
+        last written are indexed again.
+        
+        Args:
+            output_path (Path): Output file, JSON or snapshot
+        """
+        path = search_index_path(output_path)
+        index = SearchIndex.load(
+            path, (label for label, _ in YOGA_STYLE_VOCABULARY), (label for label, _ in AMENITY_VOCABULARY),
+            LANGUAGE_VOCABULARY
+        )
+        try:
+            for business in iter_businesses(output_path):
+                index.add(business)
+            index.finish()
+            index.save(path)
+        except (OSError, ValueError) as e:
+            print(f"❌ Error writing search index: {e}")
+            return
+        print(f"🔎 Search index saved to {path}: {index.added} added, {index.updated} updated, "
+              f"{index.unchanged} unchanged, {index.removed} removed")
+        if index.unreadable_hours:
+            print(f"⚠️  {index.unreadable_hours} businesses have opening hours the index couldn't read")
+
+    def print_final_stats(self):
+        """Print the enhancement statistics for the run"""
         print("\n📊 ENHANCEMENT STATISTICS:")
         print(f"   Total businesses processed: {self.stats['total_processed']}")
         print(f"   Successfully enhanced: {self.stats['successfully_enhanced']}")
@@ -643,27 +2397,206 @@ CONTEXT ABOUT BALI YOGA SCENE:
         print(f"   Opening hours added: {self.stats['opening_hours_added']}")
         print(f"   Phone numbers added: {self.stats['phone_numbers_added']}")
         print(f"   Emails added: {self.stats['emails_added']}")
-        print(f"💰 Total cost: ${self.current_cost:.2f}")
+        print(f"   Rate-limit retries: {self.stats['rate_limit_retries']}")
+        print(f"   Cache hits: {self.stats['cache_hits']}")
+        if self.stats['field_targeted_requests']:
+            print(f"   Fields asked for: {self.stats['fields_requested'] / self.stats['field_targeted_requests']:.1f} "
+                  f"of {len(ENHANCEMENT_FIELDS)} per request on average")
+        print(f"   Answers repaired locally: {self.stats['repaired_responses']} (field re-asks: {self.stats['field_reasks']})")
+        print(f"   Wasted spend: ${self.stats['wasted_cost']:.4f} on {self.stats['unusable_responses']} calls with no usable answer")
+        print(f"   Enhanced on retry: {self.stats['retried_successfully']} (dead-lettered: {self.stats['dead_lettered']})")
+        if self.stats['deferred_by_priority']:
+            print(f"   Deferred by priority scheduling: {self.stats['deferred_by_priority']}")
+        if self.stats['rule_extracted']:
+            print(f"   Filled by text rules: {self.stats['rule_extracted']} "
+                  f"({self.stats['rule_completed']} complete enough to skip the model)")
+        if self.stats['duplicates_copied']:
+            print(f"   Duplicates copied from their canonical listing: {self.stats['duplicates_copied']} "
+                  f"(saved ~${self.stats['dedup_saved_cost']:.4f})")
+        if self.hedge:
+            hedging = self.hedge.report(self.latencies)
+            print(f"   Hedged calls: {self.stats['hedged_calls']} ({self.stats['hedge_wins']} answered first by the hedge, "
+                  f"{self.stats['hedges_skipped']} not hedged for budget or rate limits), "
+                  f"extra spend ${hedging['spent']:.4f} of ${hedging['budget']:.2f}")
+            if hedging['p99_hedged'] is not None:
+                print(f"   p99 latency: {hedging['p99_hedged']:.2f}s with hedging, at least "
+                      f"{hedging['p99_unhedged']:.2f}s without (cancelled first requests are timed until cancelled)")
+        if self.pack_size > 1:
+            print(f"   Packed requests: {self.stats['packed_requests']} (single-call fallbacks: {self.stats['pack_fallbacks']})")
+        if self.cache_only:
+            print(f"   Not in cache (skipped): {self.stats['cache_misses']}")
+        if self.previous:
+            print(f"   Unchanged, reused from previous output: {self.stats['reused_unchanged']}")
+        
+        throughput = self.rate_limiter.report()
+        print(f"\n⚡ THROUGHPUT:")
+        print(f"   Achieved RPM: {throughput['achieved_rpm']:.0f} (limit {throughput['rpm_limit']:.0f})")
+        print(f"   Achieved TPM: {throughput['achieved_tpm']:.0f} (limit {throughput['tpm_limit']:.0f})")
+        print(f"   429 responses: {throughput['rate_limited_responses']}, server errors: {throughput['server_errors']}")
+        
+        ledger = self.ledger.report()
+        print(f"\n🧾 TOKEN USAGE ({ledger['calls']} calls):")
+        print(f"   Prompt tokens: {ledger['prompt_tokens']:,} ({ledger['cached_prompt_tokens']:,} cached)")
+        print(f"   Completion tokens: {ledger['completion_tokens']:,}")
+        if ledger['prompt_tokens']:
+            pricing = get_pricing(MODEL_NAME)
+            saved = ledger['cached_prompt_tokens'] * (pricing['input'] - pricing['cached_input']) / 1_000_000
+            print(f"   Prompt cache: {ledger['cached_prompt_tokens'] / ledger['prompt_tokens']:.0%} of prompt tokens, "
+                  f"{ledger['cached_calls']} calls hit, saved ${saved:.4f}")
+        cached_calls, cached_seconds = self.call_latency['cached']
+        uncached_calls, uncached_seconds = self.call_latency['uncached']
+        if cached_calls and uncached_calls:
+            print(f"   Average latency: {cached_seconds / cached_calls:.2f}s with cached prefix, "
+                  f"{uncached_seconds / uncached_calls:.2f}s without")
+        print(f"💰 Total cost: ${self.current_cost:.4f}")
+        if self.current_cost:
+            print(f"📈 Completeness gain: +{self.stats['completeness_gain']:,} points "
+                  f"({self.stats['completeness_gain'] / self.current_cost:,.0f} points per $)")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Enhance Bali yoga business data using AI")
-    parser.add_argument("--input", "-i", help="Path to input JSON file")
-    parser.add_argument("--output", "-o", help="Path to output JSON file")
+    parser.add_argument("--input", "-i", help="Path to input JSON or snapshot file (see yoga_snapshot.py)")
+    parser.add_argument("--output", "-o", help="Path to output JSON file, or a snapshot if it ends in .snapshot")
     parser.add_argument("--max-cost", "-c", type=float, default=30.0, help="Maximum cost in USD (default: 30.0)")
     parser.add_argument("--batch-size", "-b", type=int, default=50, help="Batch size (default: 50)")
+    parser.add_argument("--concurrency", "-n", type=int, default=8, help="Maximum API requests in flight (default: 8)")
+    parser.add_argument("--rpm", type=int, default=DEFAULT_REQUESTS_PER_MINUTE, help=f"Requests per minute limit (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument("--tpm", type=int, default=DEFAULT_TOKENS_PER_MINUTE, help=f"Tokens per minute limit (default: {DEFAULT_TOKENS_PER_MINUTE})")
+    parser.add_argument("--max-retries", type=int, default=5, help="Retries per request on 429/5xx errors (default: 5)")
+    parser.add_argument("--no-cache", action="store_true", help="Don't read or write the response cache")
+    parser.add_argument("--cache-only", action="store_true", help="Only use cached responses, never call the API")
+    parser.add_argument("--cache-file", help=f"Response cache database (default: {DEFAULT_CACHE_FILE})")
+    parser.add_argument("--resume", metavar="JOURNAL", help="Resume an interrupted run from its journal file")
+    parser.add_argument("--mode", choices=["sync", "batch"], default="sync", help="sync: live requests; batch: offline Batch API at ~half price (default: sync)")
+    parser.add_argument("--batch-state", help="Batch mode state file; pass an existing one to collect a submitted batch")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between batch status polls (default: 30)")
+    parser.add_argument("--base-url", help="Alternative API base URL, e.g. a local mock server")
+    parser.add_argument("--pack-size", type=int, default=1, help="Businesses per request, sharing one copy of the instructions (default: 1, no packing)")
+    parser.add_argument("--incremental", metavar="PREVIOUS_OUTPUT", help="Only enhance businesses that are new, changed or expired since this earlier output")
+    parser.add_argument("--ttl-days", type=float, default=DEFAULT_INCREMENTAL_TTL_DAYS, help=f"With --incremental, redo enhancements older than this (default: {DEFAULT_INCREMENTAL_TTL_DAYS})")
+    parser.add_argument("--file-order", action="store_true", help="When the budget can't cover every business, go in file order instead of by value per dollar")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help=f"Attempts per business before it goes to the dead-letter file (default: {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument("--retry-dead-letter", metavar="DEAD_LETTER", help="Only retry the businesses in a dead-letter file, updating the output they came from")
+    parser.add_argument("--yes", "-y", action="store_true", help="Don't ask for confirmation before spending")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Leave out per-business progress lines")
+    parser.add_argument("--metrics-port", type=int, help="Serve live Prometheus metrics on this port at /metrics")
+    parser.add_argument("--metrics-file", help="Append a JSON metrics snapshot to this file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=DEFAULT_SNAPSHOT_INTERVAL, help=f"Seconds between JSON metrics snapshots (default: {DEFAULT_SNAPSHOT_INTERVAL:g})")
+    parser.add_argument("--trace-file", help="Append one JSON line per API call (timings, tokens, outcome) to this file")
+    parser.add_argument("--workers", type=int, default=1, help="Split the run across this many worker processes sharing one budget (default: 1)")
+    parser.add_argument("--shard", type=parse_shard, metavar="INDEX/COUNT", help="Only enhance one shard of the businesses, e.g. 0/4 (for runs spread over machines)")
+    parser.add_argument("--shared-ledger", metavar="LEDGER", help="SQLite budget ledger shared with the other workers of a sharded run")
+    parser.add_argument("--merge-shards", nargs="+", metavar="SHARD_OUTPUT", help="Merge the outputs of sharded workers into --output, in --input order")
+    parser.add_argument("--db-url", nargs="?", const=True, metavar="DSN", help=f"Upsert the output straight into Postgres/Supabase instead of a JSON file (default DSN: ${' or $'.join(DATABASE_URL_VARIABLES)})")
+    parser.add_argument("--db-table", default=DEFAULT_TABLE, help=f"Table for --db-url (default: {DEFAULT_TABLE})")
+    parser.add_argument("--no-rules", action="store_true", help="Don't fill styles, amenities and flags from text rules before calling the model")
+    parser.add_argument("--no-dedup", action="store_true", help="Enhance duplicate listings separately instead of copying one result to all")
+    parser.add_argument("--hedge", action="store_true", help="Send a second request for calls slower than recent ones and use whichever answers first")
+    parser.add_argument("--hedge-percentile", type=float, default=DEFAULT_HEDGE_PERCENTILE, help=f"With --hedge, latency percentile of recent calls after which a call is hedged (default: {DEFAULT_HEDGE_PERCENTILE})")
+    parser.add_argument("--hedge-model", help="With --hedge, send hedges to this (cheaper) model instead of the run's model")
+    parser.add_argument("--hedge-budget", type=float, default=DEFAULT_HEDGE_BUDGET_SHARE, help=f"With --hedge, share of --max-cost hedges may add (default: {DEFAULT_HEDGE_BUDGET_SHARE})")
+    parser.add_argument("--no-search-index", action="store_true", help="Don't write the search and facet index sidecar (OUTPUT.search.json) next to the output")
+    parser.add_argument("--index-only", action="store_true", help="Only bring the search index sidecar of --output up to date")
     parser.add_argument("--analyze-only", "-a", action="store_true", help="Only analyze data, don't enhance")
     
     args = parser.parse_args()
     
-    enhancer = YogaBusinessAIEnhancer(max_cost=args.max_cost, batch_size=args.batch_size)
+    if args.db_url is True:
+        args.db_url = next((os.environ[name] for name in DATABASE_URL_VARIABLES if os.environ.get(name)), None)
+        if not args.db_url:
+            print(f"❌ Error: --db-url needs a connection string or ${' or $'.join(DATABASE_URL_VARIABLES)} set")
+            return
+    
+    hedge = None
+    if args.hedge:
+        try:
+            hedge = HedgePolicy(args.hedge_percentile, args.hedge_budget * args.max_cost, args.hedge_model)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            return
+    
+    metrics = None
+    if args.metrics_port is not None or args.metrics_file or args.trace_file:
+        metrics = RunMetrics(trace_path=args.trace_file)
+        if args.metrics_port is not None:
+            port = metrics.serve(args.metrics_port)
+            print(f"📈 Serving metrics at http://127.0.0.1:{port}/metrics")
+        if args.metrics_file:
+            metrics.write_snapshots(args.metrics_file, args.metrics_interval)
+    
+    enhancer = YogaBusinessAIEnhancer(
+        max_cost=args.max_cost,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_retries=args.max_retries,
+        use_cache=not args.no_cache,
+        cache_only=args.cache_only,
+        cache_file=args.cache_file,
+        base_url=args.base_url,
+        pack_size=args.pack_size,
+        max_attempts=args.max_attempts,
+        prioritize=not args.file_order,
+        assume_yes=args.yes,
+        quiet=args.quiet,
+        metrics=metrics,
+        shard=args.shard,
+        shared_ledger=args.shared_ledger,
+        dedup=not args.no_dedup,
+        db_url=args.db_url,
+        db_table=args.db_table,
+        rule_extraction=not args.no_rules,
+        hedge=hedge,
+        search_index=not args.no_search_index
+    )
     
-    if args.analyze_only:
-        businesses = enhancer.load_existing_data(args.input if args.input else None)
-        if businesses:
-            enhancer.analyze_data_completeness(businesses)
-    else:
-        enhancer.enhance_yoga_businesses(args.input, args.output)
+    try:
+        if args.incremental and not enhancer.load_previous_output(args.incremental, args.ttl_days):
+            return
+        
+        if args.merge_shards:
+            enhancer.merge_shard_outputs(args.merge_shards, args.input, args.output)
+        elif args.workers > 1:
+            if (args.mode == "batch" or args.shard or args.resume or args.retry_dead_letter or args.analyze_only or
+                    args.index_only):
+                print("❌ Error: --workers only works for a fresh sync run")
+                return
+            if args.db_url:
+                print("❌ Error: --workers merges JSON shard outputs; use --db-url with --shard on each worker instead")
+                return
+            worker_argv = strip_options(
+                sys.argv[1:],
+                with_value=("--workers", "--input", "-i", "--output", "-o", "--rpm", "--tpm"),
+                flags=("--yes", "-y")
+            )
+            enhancer.enhance_sharded(args.input, args.output, args.workers, worker_argv)
+        elif args.retry_dead_letter:
+            enhancer.retry_dead_letter(args.retry_dead_letter, args.output)
+        elif args.index_only:
+            if not args.output or not Path(args.output).exists():
+                print("❌ Error: --index-only needs --output set to an existing output file")
+                return
+            enhancer.write_search_index(Path(args.output))
+        elif args.analyze_only:
+            input_path, _ = enhancer.resolve_paths(args.input)
+            if not input_path.exists():
+                print(f"❌ Error: {input_path} not found!")
+            else:
+                if enhancer.dedup:
+                    enhancer.find_duplicates(input_path)
+                enhancer.analyze_data_completeness(enhancer.stream_businesses(input_path))
+        elif args.mode == "batch":
+            enhancer.enhance_yoga_businesses_batch(
+                args.input, args.output,
+                batch_state=args.batch_state,
+                poll_interval=args.poll_interval
+            )
+        else:
+            enhancer.enhance_yoga_businesses(args.input, args.output, resume_journal=args.resume)
+    finally:
+        enhancer.metrics.close()
 
 
 if __name__ == "__main__":
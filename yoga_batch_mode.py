@@ -0,0 +1,154 @@
+"""
+OFFLINE BATCH API SUBMISSION
+============================
+Bulk enhancement through the OpenAI Batch API, used by yoga_ai_enhancer.py
+when run with --mode batch. Batch requests cost about half the synchronous
+price and have far higher throughput limits:
+1. Every prompt is written to a JSONL request file and uploaded
+2. A batch is created and its id saved to a state file straight away
+3. The batch is polled until it finishes (a restarted process picks up the state file)
+4. Results are downloaded and streamed back through the normal merge logic
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+
+# Batch API requests are billed at half the synchronous rate
+BATCH_PRICE_MULTIPLIER = 0.5
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINISHED_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+class BatchJob:
+    def __init__(self, state_path, state=None):
+        """
+        Args:
+            state_path (str|Path): JSON file the job state is persisted to
+            state (dict): Existing state (from load) or None for a new job
+        """
+        self.state_path = Path(state_path)
+        self.state = state or {}
+
+    @classmethod
+    def load(cls, state_path):
+        with open(state_path, 'r', encoding='utf-8') as file:
+            return cls(state_path, json.load(file))
+
+    def save(self):
+        """Write the state atomically so a crash never leaves a half-written file"""
+        temp_path = self.state_path.with_suffix(self.state_path.suffix + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.state, file, indent=2)
+        temp_path.replace(self.state_path)
+
+    @property
+    def batch_id(self):
+        return self.state.get('batch_id')
+
+    def write_requests(self, requests_path, requests):
+        """
+        Write the JSONL request file
+
+        Args:
+            requests_path (str|Path): Where to write the file
+            requests (iterable): (custom_id, request body dict) pairs
+
+        Returns:
+            int: Number of requests written
+        """
+        count = 0
+        with open(requests_path, 'w', encoding='utf-8') as file:
+            for custom_id, body in requests:
+                file.write(json.dumps({
+                    'custom_id': custom_id,
+                    'method': 'POST',
+                    'url': BATCH_ENDPOINT,
+                    'body': body
+                }, ensure_ascii=False) + '\n')
+                count += 1
+        self.state['requests_file'] = str(requests_path)
+        self.state['request_count'] = count
+        return count
+
+    async def submit(self, client):
+        """
+        Upload the request file and create the batch
+
+        Args:
+            client (openai.AsyncOpenAI): API client
+        """
+        with open(self.state['requests_file'], 'rb') as file:
+            uploaded = await client.files.create(file=file, purpose='batch')
+        self.state['input_file_id'] = uploaded.id
+        self.save()
+
+        batch = await client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window='24h'
+        )
+        self.state.update({
+            'batch_id': batch.id,
+            'status': batch.status,
+            'submitted_at': datetime.now().isoformat()
+        })
+        self.save()
+
+    async def wait(self, client, poll_interval=30.0):
+        """
+        Poll until the batch finishes
+
+        Args:
+            client (openai.AsyncOpenAI): API client
+            poll_interval (float): Seconds between polls
+
+        Returns:
+            Batch: The finished batch object
+        """
+        while True:
+            batch = await client.batches.retrieve(self.batch_id)
+            if batch.status != self.state.get('status'):
+                counts = batch.request_counts
+                progress = f" ({counts.completed}/{counts.total})" if counts and counts.total else ""
+                print(f"⏳ Batch {self.batch_id}: {batch.status}{progress}")
+            self.state.update({
+                'status': batch.status,
+                'output_file_id': batch.output_file_id,
+                'error_file_id': batch.error_file_id
+            })
+            self.save()
+
+            if batch.status in FINISHED_STATUSES:
+                return batch
+            await asyncio.sleep(poll_interval)
+
+    async def iter_results(self, client):
+        """
+        Download the output and error files
+
+        Args:
+            client (openai.AsyncOpenAI): API client
+
+        Yields:
+            tuple: (custom_id, response body dict or None, error message or None)
+        """
+        for key in ('output_file_id', 'error_file_id'):
+            file_id = self.state.get(key)
+            if not file_id:
+                continue
+            content = await client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get('response') or {}
+                if response.get('status_code') == 200 and not entry.get('error'):
+                    yield entry['custom_id'], response.get('body'), None
+                else:
+                    error = entry.get('error') or response.get('body', {}).get('error')
+                    yield entry['custom_id'], None, str(error)
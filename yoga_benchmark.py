@@ -0,0 +1,350 @@
+"""
+END-TO-END ENHANCER BENCHMARK
+=============================
+Runs yoga_ai_enhancer.py against the local mock OpenAI server on synthetic
+datasets, so throughput changes show up before they cost real money:
+1. Datasets of any size are generated from the fields and values of yoga_businesses_enriched_full.json
+2. The mock adds configurable latency, 429/5xx errors and malformed answers
+3. Each run reports records/sec, p50/p95/p99 call latency, tokens per record and peak RSS
+   (with --hedge-percentile, the dataset is run again without hedging for the p99 it would have had)
+4. Results are appended to a JSONL file with the git commit, so runs compare across commits
+
+Each enhancer run happens in a fresh process, so its peak RSS is its own.
+
+    python yoga_benchmark.py --records 1000 10000 100000
+    python yoga_benchmark.py --records 10000 --latency-ms 400 --error-rate 0.02 --malformed-rate 0.05
+    python yoga_benchmark.py --records 10000 --latency-distribution exponential --hedge-percentile 95
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from yoga_hedging import HedgePolicy, percentile
+from yoga_json_stream import DatasetWriter, iter_json_array
+from yoga_mock_openai_server import MockOpenAIServer, LATENCY_DISTRIBUTIONS
+
+BASE_FOLDER = Path(__file__).parent
+SOURCE_DATASET = BASE_FOLDER / "yoga_businesses_enriched_full.json"
+DEFAULT_RESULTS_FILE = BASE_FOLDER / "yoga_benchmark_results.jsonl"
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+def synthetic_dataset(path, count, seed=42, source=SOURCE_DATASET):
+    """
+    Write a synthetic dataset shaped like the real one
+
+    Every field of each synthetic business is drawn from the same field of a
+    random real business, so field types, fill rates and value lengths match
+    the source while completeness varies from record to record.
+
+    Args:
+        path (str|Path): Output JSON file
+        count (int): Number of businesses
+        seed (int): Random seed
+        source (str|Path): Real dataset to sample from
+
+    Returns:
+        Path: The written file
+    """
+    rng = random.Random(seed)
+    templates = list(iter_json_array(source, 'businesses'))
+    if not templates:
+        raise ValueError(f"No businesses in {source} to sample from")
+    fields = list(templates[0])
+
+    writer = DatasetWriter(path)
+    try:
+        for index in range(count):
+            business = {field: rng.choice(templates).get(field) for field in fields}
+            business['id'] = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            business['name'] = f"{rng.choice(templates)['name']} #{index + 1}"
+            if isinstance(business.get('review_count'), int):
+                business['review_count'] = max(0, int(business['review_count'] * rng.uniform(0.5, 1.5)))
+            writer.write(business)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close({
+        'source': str(Path(source).name),
+        'synthetic': True,
+        'seed': seed,
+        'total_businesses': count,
+        'created_at': datetime.now().isoformat()
+    })
+    return Path(path)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_revision():
+    """Current commit and whether the tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_FOLDER,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=BASE_FOLDER,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def _run_enhancer(input_path, output_path, base_url, options, results):
+    """Child process: enhance one dataset against the mock and report metrics"""
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+    from yoga_ai_enhancer import YogaBusinessAIEnhancer
+
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        enhancer = YogaBusinessAIEnhancer(
+            max_cost=1e9,
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            requests_per_minute=options['rpm'],
+            tokens_per_minute=options['tpm'],
+            use_cache=False,
+            base_url=base_url,
+            pack_size=options['pack_size'],
+            assume_yes=True,
+            # Cost isn't what is measured, so hedges are never held back by budget
+            hedge=HedgePolicy(options['hedge_percentile'], float('inf')) if options.get('hedge_percentile') else None
+        )
+        started = time.perf_counter()
+        enhancer.enhance_yoga_businesses(input_path, output_path)
+        elapsed = time.perf_counter() - started
+
+    stats = enhancer.stats
+    ledger = enhancer.ledger
+    latencies = sorted(enhancer.latencies)
+    enhanced = stats['successfully_enhanced']
+    tokens = ledger.prompt_tokens + ledger.completion_tokens
+    hedging = {'hedged_calls': stats['hedged_calls'], 'hedge_wins': stats['hedge_wins']} if enhancer.hedge else {}
+    results.put({
+        'seconds': round(elapsed, 2),
+        'records_per_sec': round(stats['total_processed'] / elapsed, 1) if elapsed else None,
+        'processed': stats['total_processed'],
+        'enhanced': enhanced,
+        'failed': stats['failed_enhancements'],
+        'api_calls': len(latencies),
+        'latency_p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'latency_p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'latency_p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        'tokens_per_record': round(tokens / enhanced, 1) if enhanced else None,
+        'cached_prompt_share': round(ledger.cached_prompt_tokens / ledger.prompt_tokens, 3) if ledger.prompt_tokens else None,
+        'cost_per_1k_records': round(ledger.spent / enhanced * 1000, 4) if enhanced else None,
+        'rate_limit_retries': stats['rate_limit_retries'],
+        'repaired_responses': stats['repaired_responses'],
+        'retried_successfully': stats['retried_successfully'],
+        'dead_lettered': stats['dead_lettered'],
+        'peak_rss_mb': peak_rss_mb(),
+        **hedging
+    })
+
+
+def _enhance_in_process(input_path, output_path, options, server):
+    """Enhance a dataset in a fresh process and return its metrics"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_enhancer, args=(
+        str(input_path), str(output_path), server.base_url, options, results
+    ))
+    process.start()
+    # Read before joining: a child with data still queued won't exit
+    metrics = None
+    while metrics is None and (process.is_alive() or not results.empty()):
+        try:
+            metrics = results.get(timeout=1)
+        except queue.Empty:
+            pass
+    process.join()
+    if process.exitcode != 0 or metrics is None:
+        raise RuntimeError(f"Enhancer run for {input_path.name} exited with code {process.exitcode}")
+    return metrics
+
+
+def run_size(count, options, work_dir, server):
+    """Generate one dataset and enhance it in a fresh process"""
+    input_path = work_dir / f"synthetic_{count}.json"
+    print(f"🧪 Generating {count:,} synthetic businesses...")
+    synthetic_dataset(input_path, count, seed=options['seed'])
+
+    print(f"🚀 Enhancing {count:,} businesses against {server.base_url}...")
+    metrics = _enhance_in_process(input_path, work_dir / f"enhanced_{count}.json", options, server)
+    if options.get('hedge_percentile'):
+        # A hedged call's first request is cancelled, so only a run without hedging shows its tail
+        print(f"🚀 Enhancing {count:,} businesses again without hedging...")
+        unhedged_options = {key: value for key, value in options.items() if key != 'hedge_percentile'}
+        unhedged = _enhance_in_process(input_path, work_dir / f"enhanced_{count}_unhedged.json", unhedged_options, server)
+        metrics['latency_p99_unhedged_ms'] = unhedged['latency_p99_ms']
+    return metrics
+
+
+def config_key(record):
+    """What must match for two results to be comparable"""
+    return json.dumps({'records': record['records'], 'config': record['config']}, sort_keys=True)
+
+
+def previous_result(results_file, record):
+    """Latest earlier result with the same size and configuration from another commit"""
+    results_file = Path(results_file)
+    if not results_file.exists():
+        return None
+    key = config_key(record)
+    previous = None
+    with open(results_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                earlier = json.loads(line)
+            except ValueError:
+                continue
+            if config_key(earlier) == key and earlier.get('commit') != record['commit']:
+                previous = earlier
+    return previous
+
+
+def print_result(record, previous=None):
+    metrics = record['metrics']
+    rows = [
+        ('Records/sec', 'records_per_sec', True),
+        ('p50 latency (ms)', 'latency_p50_ms', False),
+        ('p95 latency (ms)', 'latency_p95_ms', False),
+        ('p99 latency (ms)', 'latency_p99_ms', False),
+        ('p99 unhedged (ms)', 'latency_p99_unhedged_ms', False),
+        ('Tokens/record', 'tokens_per_record', False),
+        ('Peak RSS (MB)', 'peak_rss_mb', False)
+    ]
+    print(f"\n📊 {record['records']:,} records: {metrics['enhanced']:,} enhanced, {metrics['failed']:,} failed, "
+          f"{metrics['api_calls']:,} API calls in {metrics['seconds']:.1f}s")
+    if previous:
+        print(f"   Compared with {previous['commit']} ({previous['timestamp'][:10]})")
+    for label, key, higher_is_better in rows:
+        if key not in metrics:
+            continue
+        value = metrics.get(key)
+        line = f"   {label:<18} {value if value is not None else 'n/a':>10}"
+        before = (previous or {}).get('metrics', {}).get(key)
+        if value is not None and before:
+            change = (value - before) / before * 100
+            better = change > 0 if higher_is_better else change < 0
+            marker = '🟢' if better else '🔴' if abs(change) >= 5 else '⚪'
+            line += f"  {marker} {change:+.1f}% (was {before})"
+        print(line)
+
+
+def run_benchmark(sizes, options, mock_options, results_file=DEFAULT_RESULTS_FILE, keep_files=False):
+    """
+    Benchmark the enhancer end to end at each dataset size
+
+    Args:
+        sizes (list): Dataset sizes in records
+        options (dict): Enhancer settings and the dataset seed
+        mock_options (dict): Mock server latency and fault injection settings
+        results_file (str|Path): JSONL file results are appended to
+        keep_files (bool): Keep the generated datasets and outputs
+
+    Returns:
+        list: One result record per size
+    """
+    commit, dirty = git_revision()
+    server = MockOpenAIServer(seed=options['seed'], **mock_options)
+    server.start_in_thread()
+    work_dir = Path(tempfile.mkdtemp(prefix='yoga_benchmark_'))
+    records = []
+    try:
+        for count in sizes:
+            metrics = run_size(count, options, work_dir, server)
+            record = {
+                'timestamp': datetime.now().isoformat(),
+                'commit': commit,
+                'dirty': dirty,
+                'python': platform.python_version(),
+                'records': count,
+                'config': {**options, 'mock': mock_options},
+                'metrics': metrics
+            }
+            print_result(record, previous_result(results_file, record))
+            with open(results_file, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record) + '\n')
+            records.append(record)
+    finally:
+        server.shutdown()
+        if keep_files:
+            print(f"\n📁 Datasets and outputs kept in {work_dir}")
+        else:
+            for path in work_dir.iterdir():
+                path.unlink()
+            work_dir.rmdir()
+
+    print(f"\n💾 Results appended to {results_file}")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI enhancer end to end against a local mock OpenAI server")
+    parser.add_argument("--records", "-n", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Dataset sizes to run (default: 1000 10000 100000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for datasets and the mock (default: 42)")
+    parser.add_argument("--concurrency", type=int, default=64, help="Enhancer requests in flight (default: 64)")
+    parser.add_argument("--batch-size", type=int, default=500, help="Enhancer batch size (default: 500)")
+    parser.add_argument("--pack-size", type=int, default=1, help="Businesses per request (default: 1)")
+    parser.add_argument("--rpm", type=int, default=1_000_000, help="Requests per minute the enhancer paces to (default: 1000000)")
+    parser.add_argument("--tpm", type=int, default=1_000_000_000, help="Tokens per minute the enhancer paces to (default: 1000000000)")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Median mock latency (default: 200)")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="Shape of the mock latency (default: lognormal)")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="Lognormal sigma, or +/- fraction for uniform (default: 0.5)")
+    parser.add_argument("--ms-per-output-token", type=float, default=0.0, help="Mock generation time per completion token (default: 0)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of requests answered with 429 (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 500/503 (default: 0)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of answers that aren't clean JSON (default: 0)")
+    parser.add_argument("--hedge-percentile", type=float, help="Hedge calls slower than this percentile of recent ones (default: no hedging)")
+    parser.add_argument("--results", default=str(DEFAULT_RESULTS_FILE), help=f"Results file to append to (default: {DEFAULT_RESULTS_FILE.name})")
+    parser.add_argument("--keep-files", action="store_true", help="Keep generated datasets and outputs")
+    args = parser.parse_args()
+
+    options = {
+        'seed': args.seed,
+        'concurrency': args.concurrency,
+        'batch_size': args.batch_size,
+        'pack_size': args.pack_size,
+        'rpm': args.rpm,
+        'tpm': args.tpm
+    }
+    if args.hedge_percentile:
+        options['hedge_percentile'] = args.hedge_percentile
+    mock_options = {
+        'latency_ms': args.latency_ms,
+        'latency_distribution': args.latency_distribution,
+        'latency_spread': args.latency_spread,
+        'ms_per_output_token': args.ms_per_output_token,
+        'rate_limit_rate': args.rate_limit_rate,
+        'server_error_rate': args.error_rate,
+        'malformed_rate': args.malformed_rate
+    }
+    run_benchmark(args.records, options, mock_options, args.results, args.keep_files)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+NORMALIZED YOGA BUSINESS RECORD
+===============================
+Parse-once view of a raw business dict, used by yoga_ai_enhancer.py so each
+business is decoded and scored a single time instead of at every step:
+1. JSON-in-a-string list fields (yoga styles, amenities, languages) are decoded once
+2. The fields scoring, prompts and merging read are held in __slots__ attributes
+3. The completeness score and the prompt's details block (non-empty fields only) are computed lazily and cached
+4. A fingerprint of the prompt inputs tells whether a business changed since it was enhanced
+
+The record keeps a reference to the source dict (not a copy), so every column
+is still written to the output unchanged.
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import hashlib
+import json
+import sys
+
+
+def decode_list(value):
+    """
+    Decode a list field that may be stored as a JSON string
+
+    Args:
+        value: List, JSON string, None or missing-field default
+
+    Returns:
+        The decoded list, the value unchanged if it isn't a string, or [] if
+        the string isn't valid JSON
+    """
+    if not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except ValueError:
+        return []
+
+
+def _intern(value):
+    """Share repeated strings (cities, categories) between records"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class BusinessRecord:
+    __slots__ = (
+        'raw', 'id', 'name', 'category', 'address', 'city', 'website',
+        'phone', 'email', 'instagram', 'facebook', 'description',
+        'opening_hours', 'review_score', 'yoga_styles', 'amenities',
+        'languages', '_score', '_details'
+    )
+
+    def __init__(self, business):
+        """
+        Normalize a raw business dict
+
+        Field values are kept exactly as business.get() returns them (None
+        included), so prompts built from a record match those built from
+        the dict.
+
+        Args:
+            business (dict): Business data as loaded from JSON
+        """
+        self.raw = business
+        self.id = business.get('id')
+        self.name = business.get('name', 'Unknown Business')
+        self.category = _intern(business.get('category_name', 'Yoga studio'))
+        self.address = business.get('address', '')
+        self.city = _intern(business.get('city', ''))
+        self.website = business.get('website', '')
+        self.phone = business.get('phone_number', '')
+        self.email = business.get('email_address', '')
+        self.instagram = business.get('instagram_url', '')
+        self.facebook = business.get('facebook_url', '')
+        self.description = business.get('business_description', '')
+        self.opening_hours = business.get('opening_hours', '')
+        self.review_score = business.get('review_score')
+        self.yoga_styles = decode_list(business.get('yoga_styles', []))
+        self.amenities = decode_list(business.get('amenities', []))
+        self.languages = decode_list(business.get('languages_spoken', []))
+        self._score = None
+        self._details = None
+
+    @classmethod
+    def of(cls, business):
+        """Return business as a record, normalizing it if it is still a raw dict"""
+        return business if isinstance(business, cls) else cls(business)
+
+    @property
+    def has_opening_hours(self):
+        return bool(self.opening_hours) and self.opening_hours != '[]'
+
+    @property
+    def completeness_score(self):
+        """Completeness score (0-100), computed on first use"""
+        if self._score is None:
+            self._score = score_record(self)
+        return self._score
+
+    @property
+    def details(self):
+        """
+        The "- Field: value" block describing this business in a prompt
+
+        Only fields with a value are listed; the prompt's instructions treat
+        anything missing as unknown.
+        """
+        if self._details is None:
+            location = ', '.join(part for part in (self.address, self.city) if part)
+            lines = [f"- Name: {self.name}"]
+            for label, value in (
+                ('Category', self.category),
+                ('Location', f"{location}, Bali" if location else None),
+                ('Website', self.website),
+                ('Current Description', self.description),
+                ('Current Yoga Styles', self.yoga_styles),
+                ('Current Amenities', self.amenities),
+                ('Current Languages', self.languages),
+                ('Current Opening Hours', self.opening_hours if self.has_opening_hours else None),
+                ('Current Phone', self.phone),
+                ('Current Email', self.email),
+                ('Instagram', self.instagram),
+                ('Facebook', self.facebook)
+            ):
+                if value:
+                    lines.append(f"- {label}: {format_value(value)}")
+            self._details = '\n'.join(lines)
+        return self._details
+
+    @property
+    def fingerprint(self):
+        """
+        Hash of every field the enhancement prompt is built from
+
+        Taken over the field values rather than the prompt text, so a change
+        to the prompt layout doesn't make every business look changed.
+        """
+        values = (
+            self.name, self.category, self.address, self.city, self.website,
+            self.description, self.yoga_styles, self.amenities, self.languages,
+            self.opening_hours, self.phone, self.email, self.instagram, self.facebook
+        )
+        text = json.dumps(values, ensure_ascii=False, default=str)
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def format_value(value):
+    """Prompt text for a field value: lists of strings comma-separated, other structures as JSON"""
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return ', '.join(value)
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def score_record(record):
+    """
+    Calculate how complete a yoga business's data is (0-100)
+
+    Args:
+        record (BusinessRecord): Normalized business
+
+    Returns:
+        int: Completeness score out of 100
+    """
+    score = 0
+
+    # Essential information (50 points total)
+    # Website score (15 points)
+    if record.website:
+        score += 15
+
+    # Opening hours score (15 points)
+    if record.has_opening_hours:
+        score += 15
+
+    # Phone number score (10 points)
+    if record.phone:
+        score += 10
+
+    # Review score (10 points)
+    if record.review_score is not None:
+        score += 10
+
+    # Enhanced information (50 points total)
+    # Yoga styles score (15 points)
+    yoga_styles = record.yoga_styles or []
+    if len(yoga_styles) >= 3:
+        score += 15
+    elif len(yoga_styles) >= 1:
+        score += 10
+
+    # Business description score (15 points)
+    description = record.description or ''
+    if len(description) > 150:
+        score += 15
+    elif len(description) > 75:
+        score += 10
+    elif len(description) > 25:
+        score += 5
+
+    # Amenities score (10 points)
+    amenities = record.amenities or []
+    if len(amenities) >= 3:
+        score += 10
+    elif len(amenities) >= 1:
+        score += 5
+
+    # Languages score (5 points)
+    if len(record.languages or []) >= 1:
+        score += 5
+
+    # Social media score (5 points)
+    has_instagram = bool(record.instagram)
+    has_facebook = bool(record.facebook)
+    if has_instagram and has_facebook:
+        score += 5
+    elif has_instagram or has_facebook:
+        score += 3
+
+    return min(score, 100)
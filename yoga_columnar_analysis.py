@@ -0,0 +1,407 @@
+"""
+COLUMNAR COMPLETENESS ANALYSIS
+==============================
+Vectorized version of the completeness analysis in yoga_ai_enhancer.py for
+large datasets:
+1. The fields the score depends on are pulled into NumPy columns, one chunk at a time
+2. Every completeness score and coverage statistic is computed on whole columns
+3. Also reports the score distribution and a per-city breakdown
+
+Scores match calculate_completeness_score exactly. Without NumPy the same
+results are computed with a plain loop.
+
+Run directly to benchmark against calculate_completeness_score and the per-record loop:
+    python yoga_columnar_analysis.py --records 1000000
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import argparse
+import random
+import time
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from yoga_business_record import BusinessRecord, decode_list
+from yoga_json_stream import iter_chunks
+
+# Score distribution buckets: 0-9, 10-19, ..., 90-100
+SCORE_BUCKET_WIDTH = 10
+
+# Businesses scored per vectorized pass
+ANALYSIS_CHUNK_SIZE = 10_000
+
+
+def _score_bucket_labels():
+    labels = [f"{low}-{low + SCORE_BUCKET_WIDTH - 1}" for low in range(0, 90, SCORE_BUCKET_WIDTH)]
+    return labels + ["90-100"]
+
+
+# Feature columns pulled from each business, in row order
+FEATURES = (
+    'has_website', 'has_opening_hours', 'has_phone', 'has_review', 'has_description',
+    'has_instagram', 'has_facebook', 'has_yoga_styles', 'styles_len', 'amenities_len', 'languages_len', 'description_len'
+)
+
+
+@lru_cache(maxsize=65536)
+def _json_list_len(text):
+    """
+    Length of a JSON-string list field, decoded as BusinessRecord decodes it
+
+    A string that isn't valid JSON decodes to [] and scores nothing. The
+    same few strings repeat across records, hence the cache.
+    """
+    return len(decode_list(text) or ())
+
+
+def has_list_value(value):
+    """
+    Whether a list field counts towards coverage: any value but an empty one or '[]'
+
+    As the analysis has always counted it, from the raw value, so a string
+    that isn't valid JSON counts as covered even though it scores nothing.
+    """
+    return bool(value) and value != '[]'
+
+
+def _list_len(value):
+    if isinstance(value, str):
+        return _json_list_len(value)
+    return len(value or ())
+
+
+def business_features(business):
+    """
+    The values the completeness score depends on, read straight from a raw dict
+
+    Args:
+        business (dict): Business data
+
+    Returns:
+        tuple: One int per name in FEATURES
+    """
+    opening_hours = business.get('opening_hours')
+    description = business.get('business_description') or ''
+    yoga_styles = business.get('yoga_styles')
+    return (
+        bool(business.get('website')),
+        bool(opening_hours) and opening_hours != '[]',
+        bool(business.get('phone_number')),
+        business.get('review_score') is not None,
+        bool(description),
+        bool(business.get('instagram_url')),
+        bool(business.get('facebook_url')),
+        has_list_value(yoga_styles),
+        _list_len(yoga_styles),
+        _list_len(business.get('amenities')),
+        _list_len(business.get('languages_spoken')),
+        len(description)
+    )
+
+
+class CompletenessColumns:
+    def __init__(self, businesses):
+        """
+        Pull the fields scoring depends on into NumPy columns in one pass
+
+        Args:
+            businesses (list): Raw business dicts or BusinessRecords
+        """
+        raw = [business.raw if isinstance(business, BusinessRecord) else business for business in businesses]
+        self.count = len(raw)
+        rows = np.fromiter(
+            chain.from_iterable(map(business_features, raw)), np.int32, self.count * len(FEATURES)
+        ).reshape(self.count, len(FEATURES))
+
+        # Cities as integer codes into self.cities
+        codes = {}
+        city_codes = np.fromiter(
+            (codes.setdefault(business.get('city') or '', len(codes)) for business in raw), np.int32, self.count
+        )
+        self._set_columns(rows, city_codes, list(codes))
+
+    @classmethod
+    def from_arrays(cls, rows, city_codes, cities):
+        """
+        Columns already extracted, e.g. stored in a snapshot file
+
+        Args:
+            rows (ndarray): One row of FEATURES per business
+            city_codes (ndarray): Index into cities of each business's city
+            cities (list): City names ('' for none)
+        """
+        columns = cls.__new__(cls)
+        columns._set_columns(rows, city_codes, cities)
+        return columns
+
+    def _set_columns(self, rows, city_codes, cities):
+        self.count = len(rows)
+        for index, name in enumerate(FEATURES):
+            setattr(self, name, rows[:, index])
+        self.city_codes = city_codes
+        self.cities = cities
+
+    def scores(self):
+        """Completeness score (0-100) for every business, as in score_record"""
+        score = (15 * self.has_website + 15 * self.has_opening_hours +
+                 10 * self.has_phone + 10 * self.has_review)
+        score += np.select([self.styles_len >= 3, self.styles_len >= 1], [15, 10], 0)
+        score += np.select(
+            [self.description_len > 150, self.description_len > 75, self.description_len > 25], [15, 10, 5], 0
+        )
+        score += np.select([self.amenities_len >= 3, self.amenities_len >= 1], [10, 5], 0)
+        score += 5 * (self.languages_len >= 1)
+        social = self.has_instagram + self.has_facebook
+        score += np.select([social == 2, social == 1], [5, 3], 0)
+        return np.minimum(score, 100)
+
+
+class CompletenessAnalysis:
+    def __init__(self, threshold=70):
+        """
+        Accumulate completeness statistics over chunks of businesses
+
+        Feed chunks with add(); only the per-business scores and flags (one
+        byte each with NumPy) and the aggregates are kept, so a dataset can
+        be analyzed as a stream.
+
+        Args:
+            threshold (int): Minimum completeness score to skip enhancement
+        """
+        self.threshold = threshold
+        self.count = 0
+        self.needing_enhancement = 0
+        self.score_total = 0
+        self.coverage = dict.fromkeys(
+            ('with_websites', 'with_opening_hours', 'with_yoga_styles', 'with_descriptions', 'with_phone'), 0
+        )
+        self.buckets = [0] * 10
+        self.cities = defaultdict(lambda: [0, 0, 0])  # city -> [businesses, score total, needing enhancement]
+        self.scores = []
+        self.needs = []
+
+    def add(self, businesses):
+        """
+        Score one chunk
+
+        Args:
+            businesses (list): Raw business dicts or BusinessRecords
+
+        Returns:
+            Sequence of bools: whether each business needs enhancement
+        """
+        if np is None:
+            return self._add_loop([BusinessRecord.of(business) for business in businesses])
+        return self.add_columns(CompletenessColumns(businesses))
+
+    def add_columns(self, columns):
+        """
+        Score one chunk already pulled into columns
+
+        Args:
+            columns (CompletenessColumns): Columns of the chunk
+
+        Returns:
+            ndarray: Whether each business needs enhancement
+        """
+        scores = columns.scores()
+        needs = scores < self.threshold
+
+        self.count += columns.count
+        self.needing_enhancement += int(np.count_nonzero(needs))
+        self.score_total += int(scores.sum())
+        for key, column in (('with_websites', columns.has_website),
+                            ('with_opening_hours', columns.has_opening_hours),
+                            ('with_yoga_styles', columns.has_yoga_styles),
+                            ('with_descriptions', columns.has_description),
+                            ('with_phone', columns.has_phone)):
+            self.coverage[key] += int(np.count_nonzero(column))
+        for bucket, count in enumerate(np.bincount(np.minimum(scores // SCORE_BUCKET_WIDTH, 9), minlength=10)):
+            self.buckets[bucket] += int(count)
+
+        city_counts = np.bincount(columns.city_codes, minlength=len(columns.cities))
+        city_totals = np.bincount(columns.city_codes, weights=scores, minlength=len(columns.cities))
+        city_needs = np.bincount(columns.city_codes, weights=needs, minlength=len(columns.cities))
+        for code, city in enumerate(columns.cities):
+            row = self.cities[city]
+            row[0] += int(city_counts[code])
+            row[1] += int(city_totals[code])
+            row[2] += int(city_needs[code])
+
+        self.scores.append(scores.astype(np.uint8))
+        self.needs.append(needs)
+        return needs
+
+    def _add_loop(self, records):
+        """Same as add(), one record at a time"""
+        scores = [record.completeness_score for record in records]
+        needs = [score < self.threshold for score in scores]
+
+        self.count += len(records)
+        self.needing_enhancement += sum(needs)
+        self.score_total += sum(scores)
+        self.coverage['with_websites'] += sum(1 for r in records if r.website)
+        self.coverage['with_opening_hours'] += sum(1 for r in records if r.has_opening_hours)
+        self.coverage['with_yoga_styles'] += sum(1 for r in records if has_list_value(r.raw.get('yoga_styles')))
+        self.coverage['with_descriptions'] += sum(1 for r in records if r.description)
+        self.coverage['with_phone'] += sum(1 for r in records if r.phone)
+        for record, score, need in zip(records, scores, needs):
+            self.buckets[min(score // SCORE_BUCKET_WIDTH, 9)] += 1
+            row = self.cities[record.city or '']
+            row[0] += 1
+            row[1] += score
+            row[2] += need
+
+        self.scores.append(scores)
+        self.needs.append(needs)
+        return needs
+
+    def result(self):
+        """
+        Returns:
+            dict: scores, needs_enhancement flags, average, coverage counts,
+                score_distribution (bucket label -> count) and city_breakdown
+                (city -> businesses, average score, needing enhancement)
+        """
+        if np is not None:
+            scores = np.concatenate(self.scores) if self.scores else np.zeros(0, np.uint8)
+            needs = np.concatenate(self.needs) if self.needs else np.zeros(0, bool)
+        else:
+            scores = list(chain.from_iterable(self.scores))
+            needs = list(chain.from_iterable(self.needs))
+
+        return {
+            'scores': scores,
+            'needs_enhancement': needs,
+            'average_completeness': self.score_total / self.count if self.count else 0,
+            'coverage': dict(self.coverage),
+            'score_distribution': dict(zip(_score_bucket_labels(), self.buckets)),
+            'city_breakdown': {
+                city: {'businesses': n, 'average_completeness': total / n, 'needing_enhancement': need}
+                for city, (n, total, need) in self.cities.items()
+            }
+        }
+
+
+def analyze_completeness(businesses, threshold=70, chunk_size=ANALYSIS_CHUNK_SIZE):
+    """
+    Score every business and gather coverage statistics
+
+    Args:
+        businesses (iterable): Raw business dicts or BusinessRecords
+        threshold (int): Minimum completeness score to skip enhancement
+        chunk_size (int): Businesses scored per vectorized pass
+
+    Returns:
+        dict: See CompletenessAnalysis.result
+    """
+    analysis = CompletenessAnalysis(threshold)
+    for chunk in iter_chunks(businesses, chunk_size):
+        analysis.add(chunk)
+    return analysis.result()
+
+
+def synthetic_businesses(count, seed=42):
+    """
+    Random business dicts covering every branch of the completeness score
+
+    Args:
+        count (int): Number of businesses
+        seed (int): Random seed
+
+    Returns:
+        list: Business dicts
+    """
+    rng = random.Random(seed)
+    cities = ['Ubud', 'Canggu', 'Seminyak', 'Uluwatu', 'Sanur', 'Amed', 'Lovina', 'Denpasar', None]
+    styles = ['Hatha', 'Vinyasa', 'Yin', 'Ashtanga', 'Kundalini', 'Restorative']
+    amenities = ['Mats', 'Showers', 'Pool', 'Cafe', 'Parking', 'Lockers']
+
+    def maybe(value, chance=0.6):
+        return value if rng.random() < chance else rng.choice([None, ''])
+
+    businesses = []
+    for i in range(count):
+        businesses.append({
+            'id': f"synthetic-{i}",
+            'name': f"Synthetic Yoga {i}",
+            'city': rng.choice(cities),
+            'website': maybe(f"https://yoga{i}.example.com"),
+            'opening_hours': rng.choice(['', '[]', None, '[{"day": "Monday", "hours": "7 AM to 7 PM"}]']),
+            'phone_number': maybe(f"+62 812 {i:07d}"),
+            'review_score': rng.choice([None, 4.5, 4.9]),
+            'yoga_styles': rng.choice([None, [], rng.sample(styles, rng.randint(1, 4)), '["Hatha", "Yin"]', 'not json']),
+            'amenities': rng.choice([None, [], rng.sample(amenities, rng.randint(1, 4)), 'Pool, Cafe']),
+            'languages_spoken': rng.choice([None, [], ['English'], '["English", "Indonesian"]', '["English"']),
+            'business_description': rng.choice([None, '', 'x' * 30, 'x' * 80, 'x' * 200]),
+            'instagram_url': maybe('https://instagram.com/yoga', 0.5),
+            'facebook_url': maybe('https://facebook.com/yoga', 0.3)
+        })
+    return businesses
+
+
+def run_benchmark(count):
+    """Time the enhancer's scorer and the per-record loop against the columnar path and check they agree"""
+    from yoga_ai_enhancer import YogaBusinessAIEnhancer
+
+    print(f"🧪 Generating {count:,} synthetic businesses...")
+    businesses = synthetic_businesses(count)
+
+    # The path the columnar analysis replaces, scoring one raw dict at a time
+    scorer = YogaBusinessAIEnhancer.__new__(YogaBusinessAIEnhancer)  # Scoring needs no API client
+    start = time.perf_counter()
+    baseline_scores = [scorer.calculate_completeness_score(business) for business in businesses]
+    baseline_time = time.perf_counter() - start
+    print(f"🐌 calculate_completeness_score (from raw dicts): {baseline_time:.2f}s")
+
+    start = time.perf_counter()
+    records = [BusinessRecord(business) for business in businesses]
+    normalize_time = time.perf_counter() - start
+    print(f"   Normalized in {normalize_time:.2f}s")
+
+    start = time.perf_counter()
+    loop_results = CompletenessAnalysis(70)
+    loop_results._add_loop(records)
+    loop_results = loop_results.result()
+    loop_time = time.perf_counter() - start
+    print(f"🐢 Per-record loop: {loop_time:.2f}s")
+
+    if np is None:
+        print("⚠️  NumPy not installed, skipping the columnar benchmark. Run: pip install numpy")
+        return
+
+    start = time.perf_counter()
+    columnar_results = analyze_completeness(businesses, 70)
+    columnar_time = time.perf_counter() - start
+    print(f"⚡ Columnar (from raw dicts): {columnar_time:.2f}s, "
+          f"{baseline_time / columnar_time:.1f}x calculate_completeness_score, "
+          f"{(normalize_time + loop_time) / columnar_time:.1f}x normalize + loop, "
+          f"{loop_time / columnar_time:.1f}x the loop alone")
+
+    assert np.array_equal(np.asarray(baseline_scores), columnar_results['scores']), \
+        "scores differ between calculate_completeness_score and columnar results"
+    assert np.array_equal(np.asarray(baseline_scores) < 70, columnar_results['needs_enhancement']), \
+        "needs_enhancement differs between calculate_completeness_score and columnar results"
+    for key in ('scores', 'needs_enhancement'):
+        assert np.array_equal(loop_results[key], columnar_results[key]), f"{key} differs between loop and columnar results"
+    for key in ('coverage', 'score_distribution', 'city_breakdown'):
+        assert loop_results[key] == columnar_results[key], f"{key} differs between loop and columnar results"
+    print("✅ Scores match calculate_completeness_score; coverage, distribution and city breakdown match the per-record loop")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the columnar completeness analysis")
+    parser.add_argument("--records", "-n", type=int, default=1_000_000, help="Synthetic businesses to generate (default: 1000000)")
+    args = parser.parse_args()
+    run_benchmark(args.records)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+TOKEN ACCOUNTING AND COST LEDGER
+================================
+Exact cost tracking for yoga_ai_enhancer.py:
+1. A pricing table for the OpenAI chat models we might run with
+2. A local token counter (tiktoken when installed) for pre-flight projections
+3. A ledger that charges API-reported usage and reserves budget for requests in flight
+4. A SQLite-backed ledger that lets several worker processes or machines share one budget
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import os
+import socket
+import sqlite3
+import uuid
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    'gpt-4o-mini': {'input': 0.15, 'cached_input': 0.075, 'output': 0.60},
+    'gpt-4o': {'input': 2.50, 'cached_input': 1.25, 'output': 10.00},
+    'gpt-4.1': {'input': 2.00, 'cached_input': 0.50, 'output': 8.00},
+    'gpt-4.1-mini': {'input': 0.40, 'cached_input': 0.10, 'output': 1.60},
+    'gpt-4.1-nano': {'input': 0.10, 'cached_input': 0.025, 'output': 0.40},
+    'o4-mini': {'input': 1.10, 'cached_input': 0.275, 'output': 4.40},
+    'o3-mini': {'input': 1.10, 'cached_input': 0.55, 'output': 4.40},
+    'gpt-4-turbo': {'input': 10.00, 'cached_input': 10.00, 'output': 30.00},
+    'gpt-3.5-turbo': {'input': 0.50, 'cached_input': 0.50, 'output': 1.50},
+}
+
+# Chat format overhead: tokens added per message and to prime the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+
+def get_pricing(model):
+    """
+    Look up pricing for a model, matching dated snapshots to their base model
+
+    Args:
+        model (str): Model name, e.g. "gpt-4o-mini" or "gpt-4o-mini-2024-07-18"
+
+    Returns:
+        dict: USD per 1M tokens for input, cached_input and output
+    """
+    if model in MODEL_PRICING:
+        return MODEL_PRICING[model]
+    # Longest prefix wins, so "gpt-4o-mini-..." doesn't match "gpt-4o"
+    for known in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(known + '-'):
+            return MODEL_PRICING[known]
+    raise ValueError(f"No pricing known for model '{model}'. Add it to MODEL_PRICING.")
+
+
+def price_tokens(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """
+    Cost of a call in USD
+
+    Args:
+        model (str): Model name
+        prompt_tokens (int): Input tokens, including any cached ones
+        completion_tokens (int): Output tokens
+        cached_tokens (int): Input tokens served from the provider's prompt cache
+
+    Returns:
+        float: Cost in USD
+    """
+    pricing = get_pricing(model)
+    uncached_tokens = max(0, prompt_tokens - cached_tokens)
+    return (uncached_tokens * pricing['input'] +
+            cached_tokens * pricing['cached_input'] +
+            completion_tokens * pricing['output']) / 1_000_000
+
+
+def usage_tokens(usage):
+    """
+    Read token counts from a response usage object or a batch result dict
+
+    Returns:
+        tuple: (prompt_tokens, completion_tokens, cached_tokens)
+    """
+    if usage is None:
+        return 0, 0, 0
+    if isinstance(usage, dict):
+        details = usage.get('prompt_tokens_details') or {}
+        return (usage.get('prompt_tokens') or 0, usage.get('completion_tokens') or 0,
+                details.get('cached_tokens') or 0)
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return (usage.prompt_tokens or 0, usage.completion_tokens or 0,
+            (getattr(details, 'cached_tokens', 0) or 0) if details else 0)
+
+
+class TokenCounter:
+    def __init__(self, model):
+        """
+        Count tokens the way the model's tokenizer does
+
+        Uses tiktoken when it is installed and falls back to ~4 characters per
+        token otherwise (or when the encoding can't be downloaded), which is
+        close enough for English prompts.
+
+        Args:
+            model (str): Model name, used to pick the encoding
+        """
+        self.encoding = None
+        try:
+            import tiktoken
+        except ImportError:
+            return
+        try:
+            try:
+                self.encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self.encoding = tiktoken.get_encoding('o200k_base')
+        except Exception as e:
+            print(f"⚠️  tiktoken encoding unavailable ({e.__class__.__name__}), estimating tokens from length")
+
+    @property
+    def exact(self):
+        return self.encoding is not None
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.encoding is None:
+            return max(1, len(text) // 4)
+        return len(self.encoding.encode_ordinary(text))
+
+    def count_many(self, texts):
+        """Count tokens for many texts at once (multi-threaded with tiktoken)"""
+        texts = list(texts)
+        if self.encoding is None:
+            return [max(1, len(text) // 4) if text else 0 for text in texts]
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+
+    def count_messages(self, messages):
+        """Prompt tokens for a list of chat messages, including format overhead"""
+        return (sum(self.count(message['content']) + TOKENS_PER_MESSAGE for message in messages) +
+                TOKENS_PER_REPLY)
+
+
+class CostLedger:
+    def __init__(self, max_cost):
+        """
+        Track spend against a budget
+
+        Budget is reserved at a worst-case estimate before a request is sent
+        and released when it finishes; the actual cost is charged from the
+        API-reported usage. A request is only admitted if spend plus every
+        outstanding reservation stays within max_cost.
+
+        Args:
+            max_cost (float): Budget in USD
+        """
+        self.max_cost = max_cost
+        self.spent = 0.0
+        self.reserved = 0.0
+        self.calls = 0
+        self.cached_calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def remaining(self):
+        return self.max_cost - self.spent - self.reserved
+
+    @property
+    def exhausted(self):
+        """Whether the budget is fully spent"""
+        return self.spent >= self.max_cost
+
+    def reserve(self, amount):
+        """
+        Reserve budget for a request about to be sent
+
+        Args:
+            amount (float): Worst-case cost of the request
+
+        Returns:
+            bool: False (and nothing reserved) if it doesn't fit in the budget
+        """
+        if self.spent + self.reserved + amount > self.max_cost:
+            return False
+        self.reserved += amount
+        return True
+
+    def release(self, amount):
+        """Give back a reservation once its request has finished"""
+        self.reserved = max(0.0, self.reserved - amount)
+
+    def charge(self, model, prompt_tokens, completion_tokens, cached_tokens=0, multiplier=1.0):
+        """
+        Record the actual cost of a finished call
+
+        Args:
+            model (str): Model that served the call
+            prompt_tokens (int): Input tokens, including any cached ones
+            completion_tokens (int): Output tokens
+            cached_tokens (int): Input tokens served from the prompt cache
+            multiplier (float): Price multiplier (e.g. the Batch API discount)
+
+        Returns:
+            float: Cost in USD
+        """
+        cost = price_tokens(model, prompt_tokens, completion_tokens, cached_tokens) * multiplier
+        self.spent += cost
+        self.calls += 1
+        if cached_tokens:
+            self.cached_calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_prompt_tokens += cached_tokens
+        self.completion_tokens += completion_tokens
+        return cost
+
+    def charge_usage(self, model, usage, multiplier=1.0):
+        """Charge a call from its response usage (object or dict)"""
+        return self.charge(model, *usage_tokens(usage), multiplier=multiplier)
+
+    def report(self):
+        return {
+            'spent': round(self.spent, 6),
+            'calls': self.calls,
+            'cached_calls': self.cached_calls,
+            'prompt_tokens': self.prompt_tokens,
+            'cached_prompt_tokens': self.cached_prompt_tokens,
+            'completion_tokens': self.completion_tokens
+        }
+
+
+class SharedCostLedger(CostLedger):
+    def __init__(self, path, max_cost):
+        """
+        A cost ledger whose budget is shared by every process using the same file
+
+        Spend and reservations live in a SQLite database, and each
+        reservation is checked and taken in one write transaction, so
+        workers on one machine, or on several sharing the file over a
+        filesystem with working locks, can never together overshoot
+        max_cost. Token counts and this worker's own spend are still kept
+        locally for its report.
+
+        The budget is set by whichever worker creates the file first.
+
+        Args:
+            path (str|Path): Ledger database
+            max_cost (float): Budget in USD, if the ledger is new
+        """
+        super().__init__(max_cost)
+        self.path = path
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        # Autocommit; transactions are opened explicitly where they matter
+        self.conn = sqlite3.connect(str(path), timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS budget ("
+            "id INTEGER PRIMARY KEY CHECK (id = 1), max_cost REAL NOT NULL, spent REAL NOT NULL DEFAULT 0)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservations (worker TEXT PRIMARY KEY, amount REAL NOT NULL)"
+        )
+        self.conn.execute("INSERT OR IGNORE INTO budget (id, max_cost) VALUES (1, ?)", (max_cost,))
+        self.max_cost = self.conn.execute("SELECT max_cost FROM budget WHERE id = 1").fetchone()[0]
+
+    def _totals(self):
+        spent, = self.conn.execute("SELECT spent FROM budget WHERE id = 1").fetchone()
+        reserved, = self.conn.execute("SELECT COALESCE(SUM(amount), 0) FROM reservations").fetchone()
+        return spent, reserved
+
+    @property
+    def total_spent(self):
+        """Spend of every worker sharing the ledger"""
+        return self._totals()[0]
+
+    @property
+    def remaining(self):
+        spent, reserved = self._totals()
+        return self.max_cost - spent - reserved
+
+    @property
+    def exhausted(self):
+        return self.total_spent >= self.max_cost
+
+    def reserve(self, amount):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            spent, reserved = self._totals()
+            if spent + reserved + amount > self.max_cost:
+                return False
+            self.conn.execute(
+                "INSERT INTO reservations (worker, amount) VALUES (?, ?) "
+                "ON CONFLICT(worker) DO UPDATE SET amount = amount + excluded.amount",
+                (self.worker, amount)
+            )
+            self.reserved += amount
+            return True
+        finally:
+            self.conn.execute("COMMIT")
+
+    def release(self, amount):
+        super().release(amount)
+        self.conn.execute("UPDATE reservations SET amount = ? WHERE worker = ?", (self.reserved, self.worker))
+
+    def charge(self, model, prompt_tokens, completion_tokens, cached_tokens=0, multiplier=1.0):
+        cost = super().charge(model, prompt_tokens, completion_tokens, cached_tokens, multiplier)
+        self.conn.execute("UPDATE budget SET spent = spent + ? WHERE id = 1", (cost,))
+        return cost
+
+    def clear_reservations(self):
+        """Drop reservations left behind by workers that crashed; only safe while no worker is running"""
+        self.conn.execute("DELETE FROM reservations")
+
+    def close(self):
+        """Hand back anything still reserved and close the database"""
+        self.conn.execute("DELETE FROM reservations WHERE worker = ?", (self.worker,))
+        self.conn.close()
@@ -0,0 +1,303 @@
+"""
+DUPLICATE BUSINESS DETECTION
+============================
+Finds the same studio listed more than once in the scraped input, so
+yoga_ai_enhancer.py pays to enhance one copy instead of every one:
+1. Businesses are put in blocks by normalized phone, website domain, Instagram handle, and postcode + name word
+2. Names are compared only within a block, with a looser bar when a contact detail already matches
+   (businesses in different postcodes are branches, never duplicates)
+3. Matches are joined into clusters (union-find), so A~B and B~C put all three together
+4. The most complete business of each cluster is enhanced; the rest copy its result
+
+Blocking keeps the work near-linear: no pair of businesses is compared
+unless it shares a key, and oversized blocks (a shared agency phone, a
+directory site) are ignored as evidence.
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from urllib.parse import urlparse
+
+from yoga_business_record import BusinessRecord
+
+# Name similarity needed for a match: a shared phone, domain or handle is strong
+# evidence on its own; a shared postcode and name word is not, so those names
+# must be nearly the same spelling, with at least two words ("canggu" alone is
+# a place, not a business)
+CONTACT_NAME_THRESHOLD = 0.6
+POSTCODE_NAME_THRESHOLD = 0.95
+
+# Blocks bigger than this say more about the key than about the businesses
+MAX_BLOCK_SIZE = 50
+
+NAME_STOPWORDS = frozenset({
+    'the', 'and', 'by', 'of', 'at', 'in', 'a', 'bali', 'indonesia', 'yoga', 'studio', 'studios'
+})
+
+# Sites that host many unrelated businesses, so sharing one proves nothing
+SHARED_DOMAINS = frozenset({
+    'instagram.com', 'facebook.com', 'fb.com', 'm.facebook.com', 'linktr.ee', 'wa.me', 'api.whatsapp.com',
+    'google.com', 'sites.google.com', 'goo.gl', 'maps.app.goo.gl', 'g.page', 'bit.ly', 'youtube.com',
+    'tiktok.com', 'booking.com', 'airbnb.com', 'tripadvisor.com', 'bookretreats.com', 'bookyogaretreats.com',
+    'mindbodyonline.com', 'wixsite.com', 'linkin.bio'
+})
+_INSTAGRAM_NON_HANDLES = frozenset({'p', 'reel', 'reels', 'explore', 'stories', 'tv'})
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+_NON_DIGIT = re.compile(r'\D+')
+
+
+def normalize_name(name):
+    """Lowercase ASCII words of a name, without punctuation or generic words"""
+    text = unicodedata.normalize('NFKD', str(name or '')).encode('ascii', 'ignore').decode().lower()
+    words = [word for word in _NON_WORD.split(text) if word and word not in NAME_STOPWORDS]
+    return ' '.join(words)
+
+
+def normalize_phone(phone):
+    """National significant number of an Indonesian phone, e.g. '+62 817-764' and '0817 764' match"""
+    digits = _NON_DIGIT.sub('', str(phone or ''))
+    if digits.startswith('62'):
+        digits = digits[2:]
+    digits = digits.lstrip('0')
+    return digits if len(digits) >= 7 else None
+
+
+def website_domain(website):
+    """Registered host of a website, or None for shared hosting sites"""
+    if not website or not isinstance(website, str):
+        return None
+    url = website.strip().lower()
+    if '://' not in url:
+        url = 'http://' + url
+    try:
+        host = urlparse(url).hostname or ''
+    except ValueError:
+        return None
+    if host.startswith('www.'):
+        host = host[4:]
+    if not host or '.' not in host:
+        return None
+    if host in SHARED_DOMAINS or any(host.endswith('.' + domain) for domain in SHARED_DOMAINS):
+        return None
+    return host
+
+
+def instagram_handle(business):
+    """Instagram handle from instagram_handle or instagram_url"""
+    handle = business.get('instagram_handle')
+    if not handle:
+        url = business.get('instagram_url')
+        if not url or not isinstance(url, str):
+            return None
+        url = url.strip()
+        if '://' not in url:
+            url = 'https://' + url
+        try:
+            path = urlparse(url).path
+        except ValueError:
+            return None
+        handle = next((part for part in path.split('/') if part), None)
+        if handle in _INSTAGRAM_NON_HANDLES:
+            return None
+    handle = str(handle or '').strip().lstrip('@').lower()
+    return handle or None
+
+
+def normalize_postcode(postcode):
+    if postcode is None or postcode == '':
+        return None
+    try:
+        return str(int(float(postcode)))
+    except (TypeError, ValueError):
+        return str(postcode).strip() or None
+
+
+def name_similarity(first, second, containment=True):
+    """
+    How alike two normalized names are (0-1)
+
+    All of a name's words appearing in the other ("samyama meditation
+    center" in "samyama meditation center retreats") counts as a full
+    match, if there are at least two of them; a single shared word says
+    little.
+
+    Args:
+        first (str): Normalized name
+        second (str): Normalized name
+        containment (bool): Whether a name within the other counts as a match
+    """
+    if not first or not second:
+        return 0.0
+    if first == second:
+        return 1.0
+    first_words, second_words = set(first.split()), set(second.split())
+    if containment and min(len(first_words), len(second_words)) >= 2 and (
+            first_words <= second_words or second_words <= first_words):
+        return 1.0
+    matcher = SequenceMatcher(None, first, second, autojunk=False)
+    if matcher.real_quick_ratio() < CONTACT_NAME_THRESHOLD:
+        return 0.0
+    return matcher.ratio()
+
+
+class DuplicateFinder:
+    def __init__(self, contact_threshold=CONTACT_NAME_THRESHOLD, postcode_threshold=POSTCODE_NAME_THRESHOLD,
+                 max_block_size=MAX_BLOCK_SIZE):
+        """
+        Collect businesses and cluster the ones that are the same place
+
+        Args:
+            contact_threshold (float): Name similarity needed when a phone, domain or handle matches
+            postcode_threshold (float): Name similarity needed when only postcode and a name word match
+                (a name within the other isn't enough here)
+            max_block_size (int): Blocks with more businesses than this are ignored
+        """
+        self.contact_threshold = contact_threshold
+        self.postcode_threshold = postcode_threshold
+        self.max_block_size = max_block_size
+        self.ids = []
+        self.names = []
+        self.postcodes = []
+        self.scores = []
+        self.blocks = {}  # key -> indexes of the businesses sharing it
+        self.oversized_blocks = 0
+
+    def add(self, record):
+        """
+        Add one business
+
+        Args:
+            record (BusinessRecord): Business to consider
+        """
+        index = len(self.ids)
+        name = normalize_name(record.name)
+        postcode = normalize_postcode(record.raw.get('postcode'))
+        self.ids.append(str(record.id))
+        self.names.append(name)
+        self.postcodes.append(postcode)
+        self.scores.append(record.completeness_score)
+
+        keys = set()
+        phone = normalize_phone(record.phone)
+        if phone:
+            keys.add(('phone', phone))
+        domain = website_domain(record.website)
+        if domain:
+            keys.add(('domain', domain))
+        handle = instagram_handle(record.raw)
+        if handle:
+            keys.add(('instagram', handle))
+        if postcode:
+            keys.update(('postcode', postcode, word) for word in name.split())
+        for key in keys:
+            self.blocks.setdefault(key, []).append(index)
+
+    def clusters(self):
+        """
+        Group the businesses added so far into duplicate clusters
+
+        Returns:
+            list: Clusters of two or more business indexes, each in input order
+        """
+        parent = list(range(len(self.ids)))
+        # Postcode of each cluster, so chains can't join businesses in different ones
+        cluster_postcode = list(self.postcodes)
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        compared = set()
+        for key, members in self.blocks.items():
+            if len(members) < 2:
+                continue
+            if len(members) > self.max_block_size:
+                self.oversized_blocks += 1
+                continue
+            by_postcode = key[0] == 'postcode'
+            threshold = self.postcode_threshold if by_postcode else self.contact_threshold
+            for position, first in enumerate(members):
+                for second in members[position + 1:]:
+                    root_first, root_second = find(first), find(second)
+                    if root_first == root_second or (first, second, threshold) in compared:
+                        continue
+                    postcodes = {cluster_postcode[root_first], cluster_postcode[root_second]} - {None}
+                    if len(postcodes) > 1:
+                        continue
+                    compared.add((first, second, threshold))
+                    if by_postcode and min(self.names[first].count(' '), self.names[second].count(' ')) < 1:
+                        continue
+                    if name_similarity(self.names[first], self.names[second], containment=not by_postcode) >= threshold:
+                        root, merged = min(root_first, root_second), max(root_first, root_second)
+                        parent[merged] = root
+                        cluster_postcode[root] = next(iter(postcodes), None)
+
+        groups = {}
+        for index in range(len(self.ids)):
+            groups.setdefault(find(index), []).append(index)
+        return [members for members in groups.values() if len(members) > 1]
+
+    def canonical_map(self):
+        """
+        Pick the business to enhance for each cluster
+
+        The most complete business is kept, since its prompt carries the
+        most information; ties go to the first in the input.
+
+        Returns:
+            dict: str(duplicate id) -> str(canonical id), for every business that needn't be enhanced itself
+        """
+        duplicates = {}
+        for members in self.clusters():
+            canonical = max(members, key=lambda index: (self.scores[index], -index))
+            for index in members:
+                if index != canonical and self.ids[index] != self.ids[canonical]:
+                    duplicates[self.ids[index]] = self.ids[canonical]
+        return duplicates
+
+
+# Fields an enhancement writes, copied from the canonical business as they are
+_ENHANCEMENT_FIELDS = (
+    'yoga_styles', 'amenities', 'languages_spoken', 'meditation_offered', 'teacher_training',
+    'drop_in_price_usd', 'price_range', 'ai_enhancement_confidence', 'ai_enhanced', 'ai_enhancement_timestamp'
+)
+
+
+def copy_enhancement(duplicate, canonical):
+    """
+    A duplicate listing with its canonical business's enhancement copied over
+
+    The enhancement is copied rather than merged again, so the duplicate
+    keeps the canonical business's timestamp. Details the duplicate already
+    has of its own (phone, website, email, opening hours, a longer
+    description) are kept, and its input fingerprint is taken from the
+    duplicate as read, so --incremental sees it unchanged next run.
+
+    Args:
+        duplicate (dict): Duplicate business as read
+        canonical (dict): Enhanced canonical business
+
+    Returns:
+        dict: Enhanced duplicate
+    """
+    record = BusinessRecord.of(duplicate)
+    enhanced = record.raw.copy()
+    enhanced.update((field, canonical[field]) for field in _ENHANCEMENT_FIELDS if field in canonical)
+    own_details = (
+        ('opening_hours', record.has_opening_hours), ('phone_number', record.phone),
+        ('website', record.website), ('email_address', record.email)
+    )
+    for field, has_own in own_details:
+        if not has_own and canonical.get(field):
+            enhanced[field] = canonical[field]
+    description = canonical.get('business_description')
+    if description and len(str(description)) > len(str(record.description)):
+        enhanced['business_description'] = description
+    enhanced['ai_input_fingerprint'] = record.fingerprint
+    return enhanced
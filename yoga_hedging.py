@@ -0,0 +1,125 @@
+"""
+HEDGED REQUESTS
+===============
+Trims the latency tail of yoga_ai_enhancer.py, where one chat completion
+taking ten times the median holds up the whole batch it belongs to:
+1. The latencies of recent calls' first requests (those that answered) are kept in a sliding window
+2. A call still running past a chosen percentile of that window gets a duplicate
+   request, to the same model or a cheaper fallback
+3. Whichever answers first is used and the other is cancelled
+4. Hedges spend from their own slice of the budget; a cancelled call reports no
+   usage, so it is charged as if it had written the answer that won
+5. p99 latency is reported as the run saw it and as the first requests alone gave it
+
+Nothing is hedged until the window holds enough calls to say what slow is.
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+from array import array
+from collections import deque
+
+from yoga_cost_ledger import get_pricing
+from yoga_response_schema import supports_structured_output
+
+DEFAULT_HEDGE_PERCENTILE = 95
+DEFAULT_HEDGE_BUDGET_SHARE = 0.05  # Of the run's budget
+
+HEDGE_WINDOW = 200  # Recent calls the trigger is taken from
+HEDGE_MIN_SAMPLES = 20  # Calls seen before anything is hedged
+MIN_HEDGE_DELAY = 0.05  # Seconds; never hedge sooner than this
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted sequence, or None if it's empty"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+class HedgePolicy:
+    def __init__(self, percentile=DEFAULT_HEDGE_PERCENTILE, budget=0.0, model=None,
+                 window=HEDGE_WINDOW, min_samples=HEDGE_MIN_SAMPLES, min_delay=MIN_HEDGE_DELAY):
+        """
+        Decide when a slow call gets a duplicate request, and pay for it
+
+        Args:
+            percentile (float): Latency percentile of recent calls after which a call is hedged
+            budget (float): USD hedges may add to the run's spend
+            model (str): Model the duplicate goes to (default: the run's model)
+            window (int): Recent calls the percentile is taken over
+            min_samples (int): Calls to see before hedging anything
+            min_delay (float): Shortest wait in seconds before hedging
+
+        Raises:
+            ValueError: If the fallback model has no known pricing
+        """
+        if model:
+            get_pricing(model)  # Fail fast, before any hedge needs pricing
+        self.percentile = percentile
+        self.budget = budget
+        self.model = model
+        self.recent = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.spent = 0.0
+        self.reserved = 0.0
+        # How long each call's first request took; a cancelled one counts up to
+        # when it was cancelled, so these percentiles are lower bounds
+        self.unhedged_latencies = array('d')
+
+    def delay(self):
+        """Seconds to wait for a call before hedging it, or None while too few calls are known"""
+        if len(self.recent) < self.min_samples:
+            return None
+        return max(self.min_delay, percentile(sorted(self.recent), self.percentile))
+
+    def observe(self, seconds, completed=True):
+        """
+        Record how long a call's first request took
+
+        Args:
+            seconds (float): Until it answered, or until it was cancelled
+            completed (bool): Whether it answered; a cancelled request's time is only a
+                lower bound, so it doesn't count towards when calls are hedged
+        """
+        if completed:
+            self.recent.append(seconds)
+        self.unhedged_latencies.append(seconds)
+
+    def fits(self, amount):
+        """Whether a hedge of this worst-case cost fits what is left of the hedge budget"""
+        return self.spent + self.reserved + amount <= self.budget
+
+    def reserve(self, amount):
+        self.reserved += amount
+
+    def settle(self, reservation, cost):
+        """Release a hedge's reservation and add what it actually cost"""
+        self.reserved = max(0.0, self.reserved - reservation)
+        self.spent += cost
+
+    def request_params(self, params):
+        """Request parameters for the duplicate, in a response format its model supports"""
+        if (self.model and not supports_structured_output(self.model) and
+                params.get('response_format', {}).get('type') == 'json_schema'):
+            return {**params, 'response_format': {'type': 'json_object'}}
+        return params
+
+    def report(self, latencies):
+        """
+        Hedging summary for the end of a run
+
+        Args:
+            latencies (iterable): Seconds until each call had an answer, hedged or not
+
+        Returns:
+            dict: Spend, budget, and p99 latency with hedging and for first requests alone
+        """
+        return {
+            'spent': round(self.spent, 6),
+            'budget': self.budget,
+            'p99_hedged': percentile(sorted(latencies), 99),
+            'p99_unhedged': percentile(sorted(self.unhedged_latencies), 99)
+        }
@@ -0,0 +1,86 @@
+"""
+INCREMENTAL ENHANCEMENT AGAINST A PREVIOUS OUTPUT
+=================================================
+Lets yoga_ai_enhancer.py (--incremental) skip businesses whose inputs haven't
+changed since the last run, so a nightly refresh costs what changed:
+1. Every enhanced business carries ai_input_fingerprint, a hash of the fields its prompt is built from
+2. The previous output's fingerprints, timestamps and AI-written fields are indexed in a temporary SQLite file
+3. A business is only re-enhanced if it is new, its fingerprint changed, or its enhancement is older than the TTL
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from yoga_json_stream import iter_chunks
+from yoga_snapshot import iter_businesses
+
+STATUS_NEW = 'new'
+STATUS_CHANGED = 'changed'
+STATUS_EXPIRED = 'expired'
+STATUS_UNCHANGED = 'unchanged'
+
+INDEX_CHUNK_SIZE = 5000
+
+
+class PreviousOutput:
+    def __init__(self, path, fields, ttl_days=30):
+        """
+        Index the enhanced businesses of a previous output file
+
+        Args:
+            path (str|Path): Previous output file, JSON or snapshot
+            fields (tuple): AI-written fields to keep for reuse
+            ttl_days (float): Enhancements older than this are redone
+        """
+        self.path = path
+        self.fields = fields
+        self.cutoff = datetime.now() - timedelta(days=ttl_days) if ttl_days is not None else None
+
+        # An empty name gives a private on-disk database, removed on close
+        self.conn = sqlite3.connect('')
+        self.conn.execute(
+            "CREATE TABLE previous (id TEXT PRIMARY KEY, fingerprint TEXT, enhanced_at TEXT, fields TEXT NOT NULL)"
+        )
+        self.count = 0
+        for chunk in iter_chunks(iter_businesses(path), INDEX_CHUNK_SIZE):
+            rows = [
+                (str(business['id']), business.get('ai_input_fingerprint'), business.get('ai_enhancement_timestamp'),
+                 json.dumps({field: business.get(field) for field in fields if field in business}, ensure_ascii=False))
+                for business in chunk if business.get('ai_enhanced') and business.get('id') is not None
+            ]
+            self.conn.executemany("INSERT OR REPLACE INTO previous VALUES (?, ?, ?, ?)", rows)
+            self.count += len(rows)
+        self.conn.commit()
+
+    def check(self, record):
+        """
+        Decide whether a business needs enhancing again
+
+        Args:
+            record (BusinessRecord): Business from the current input
+
+        Returns:
+            tuple: (status, the previous AI-written fields if unchanged else None)
+        """
+        row = self.conn.execute(
+            "SELECT fingerprint, enhanced_at, fields FROM previous WHERE id = ?", (str(record.id),)
+        ).fetchone()
+        if row is None:
+            return STATUS_NEW, None
+
+        fingerprint, enhanced_at, fields = row
+        if fingerprint != record.fingerprint:
+            return STATUS_CHANGED, None
+        if self.cutoff is not None:
+            try:
+                if not enhanced_at or datetime.fromisoformat(enhanced_at) < self.cutoff:
+                    return STATUS_EXPIRED, None
+            except ValueError:
+                return STATUS_EXPIRED, None
+        return STATUS_UNCHANGED, json.loads(fields)
+
+    def close(self):
+        self.conn.close()
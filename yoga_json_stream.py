@@ -0,0 +1,260 @@
+"""
+STREAMING JSON DATASET READER AND WRITER
+========================================
+Incremental I/O for the {"metadata": ..., "businesses": [...]} dataset files
+used by yoga_ai_enhancer.py, so memory use doesn't grow with the dataset:
+1. The "businesses" array is read one record at a time from fixed-size chunks
+2. Output records are written as they are produced
+3. The metadata envelope is written after the records, so it can carry final stats
+
+Output goes to a temporary file that replaces the target only once complete.
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import json
+from itertools import islice
+from pathlib import Path
+
+READ_CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\n\r'
+
+
+def iter_chunks(iterable, size):
+    """Yield lists of up to size items from any iterable"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class _JsonStreamReader:
+    def __init__(self, file):
+        self.file = file
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Read another chunk, dropping the part of the buffer already consumed"""
+        chunk = self.file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, or '' at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found or 'end of file'}' in JSON stream")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value, reading more input as needed"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self._fill():
+                    raise
+                continue
+            # A number cut off at the end of the buffer would decode short
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self):
+        """Move past the next value, an array one item at a time instead of decoded whole"""
+        if self.peek() != '[':
+            self.value()
+            return
+        self.pos += 1
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            self.value()
+            if self.peek() == ']':
+                self.pos += 1
+                return
+            self.expect(',')
+
+
+def iter_json_array(path, key='businesses'):
+    """
+    Stream the items of one array in a top-level JSON object
+
+    Other top-level values (e.g. metadata) are decoded and skipped.
+
+    Args:
+        path (str|Path): JSON file
+        key (str): Top-level key holding the array
+
+    Yields:
+        Each item of the array, in order
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        reader = _JsonStreamReader(file)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                reader.expect('[')
+                if reader.peek() == ']':
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield reader.value()
+                        if reader.peek() == ']':
+                            reader.pos += 1
+                            break
+                        reader.expect(',')
+            else:
+                reader.value()
+            if reader.peek() == '}':
+                return
+            reader.expect(',')
+
+
+def read_json_value(path, key='metadata'):
+    """
+    Decode one top-level value of a JSON object, streaming past large arrays
+
+    Useful for the metadata envelope, which DatasetWriter puts after the
+    businesses array.
+
+    Args:
+        path (str|Path): JSON file
+        key (str): Top-level key to read
+
+    Returns:
+        The value, or None if the key isn't there
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        reader = _JsonStreamReader(file)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return None
+        while True:
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                return reader.value()
+            reader.skip_value()
+            if reader.peek() == '}':
+                return None
+            reader.expect(',')
+
+
+def read_envelope(path, key='businesses'):
+    """
+    Decode every top-level value of a JSON object except one large array
+
+    Args:
+        path (str|Path): JSON file
+        key (str): Top-level key holding the array, streamed past
+
+    Returns:
+        dict: Top-level values in file order, with None in place of the array
+    """
+    envelope = {}
+    with open(path, 'r', encoding='utf-8') as file:
+        reader = _JsonStreamReader(file)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return envelope
+        while True:
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                reader.skip_value()
+                envelope[name] = None
+            else:
+                envelope[name] = reader.value()
+            if reader.peek() == '}':
+                return envelope
+            reader.expect(',')
+
+
+class DatasetWriter:
+    def __init__(self, path):
+        """
+        Start writing a dataset file
+
+        Args:
+            path (str|Path): Output JSON file
+        """
+        self.path = Path(path)
+        self.temp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        self.file = open(self.temp_path, 'w', encoding='utf-8')
+        self.file.write('{\n  "businesses": [')
+        self.count = 0
+        self.columns = 0
+
+    def write(self, business):
+        """Append one business to the array"""
+        if self.count == 0:
+            self.columns = len(business)
+        else:
+            self.file.write(',')
+        text = json.dumps(business, indent=2, ensure_ascii=False)
+        self.file.write('\n    ' + text.replace('\n', '\n    '))
+        self.count += 1
+
+    def replace(self, replacements):
+        """
+        Swap businesses already written for new versions, matched by id
+
+        The records written so far are streamed into a fresh temporary file
+        with the replacements applied, so nothing else is held in memory.
+
+        Args:
+            replacements (dict): str(business id) -> replacement business
+        """
+        if not replacements:
+            return
+        self.file.write(('\n  ' if self.count else '') + ']\n}')
+        self.file.close()
+        written_path = self.temp_path.with_suffix('.old')
+        self.temp_path.replace(written_path)
+
+        self.file = open(self.temp_path, 'w', encoding='utf-8')
+        self.file.write('{\n  "businesses": [')
+        self.count = 0
+        for business in iter_json_array(written_path, 'businesses'):
+            self.write(replacements.get(str(business.get('id')), business))
+        written_path.unlink()
+
+    def close(self, metadata):
+        """
+        Write the metadata envelope and move the file into place
+
+        Args:
+            metadata (dict): Metadata object, written after the records
+        """
+        text = json.dumps(metadata, indent=2, ensure_ascii=False)
+        self.file.write(('\n  ' if self.count else '') + '],\n  "metadata": ' + text.replace('\n', '\n  ') + '\n}')
+        self.file.close()
+        self.temp_path.replace(self.path)
+
+    def abort(self):
+        """Discard a partly written file"""
+        self.file.close()
+        self.temp_path.unlink(missing_ok=True)
@@ -0,0 +1,298 @@
+"""
+RUN METRICS AND CALL TRACING
+============================
+Live instrumentation for yoga_ai_enhancer.py, so a long run can be charted
+while it happens instead of read from a final stats dump:
+1. Per-stage timings (slot wait, rate-limit wait, request, parse, merge) go into fixed-bucket histograms
+2. Counters track API calls, tokens, cache lookups and business outcomes
+3. Gauges read spend and reservations from the cost ledger when exported
+4. Exported as Prometheus text over HTTP (--metrics-port) and/or periodic JSON snapshots (--metrics-file)
+5. --trace-file writes one JSON line per API call with its timings, tokens and outcome
+
+When none of these are asked for, the enhancer gets NULL_METRICS, whose
+methods do nothing, so instrumentation can stay in the code path for free.
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import json
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = 'yoga_enhancer'
+DEFAULT_SNAPSHOT_INTERVAL = 15.0
+
+# Upper bounds in seconds; calls range from sub-millisecond parses to minute-long retries
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SLOT_WAIT = 'slot_wait'
+STAGE_QUEUE_WAIT = 'queue_wait'
+STAGE_REQUEST = 'request'
+STAGE_PARSE = 'parse'
+STAGE_MERGE = 'merge'
+
+_HELP = {
+    'stage_seconds': 'Time spent per stage of an enhancement (slot_wait, queue_wait, request, parse, merge)',
+    'api_calls_total': 'Chat completion attempts by outcome',
+    'tokens_total': 'Tokens reported by the API by kind',
+    'cache_lookups_total': 'Response cache lookups by result',
+    'hedges_total': 'Hedge requests sent for slow calls, by whether the hedge answered first',
+    'businesses_total': 'Businesses processed by outcome',
+    'cost_spent_usd': 'Actual spend so far',
+    'cost_reserved_usd': 'Worst-case cost held by requests in flight',
+    'cost_limit_usd': 'Budget for the run'
+}
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'count', 'sum')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None past the last bound)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            running += count
+            if running >= target:
+                return bound
+        return None
+
+
+class RunMetrics:
+    enabled = True
+
+    def __init__(self, trace_path=None):
+        """
+        Collect metrics for one enhancement run
+
+        Args:
+            trace_path (str|Path): JSONL file to write one line per API call to
+        """
+        self.lock = threading.Lock()
+        self.histograms = {}  # (name, labels key) -> _Histogram
+        self.counters = {}  # (name, labels key) -> number
+        self.gauges = {}  # name -> callable returning a number
+        self.started = time.time()
+        self.trace = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+        self.server = None
+        self.snapshot_path = None
+        self.snapshot_thread = None
+        self.stop_event = threading.Event()
+
+    def observe(self, stage, seconds):
+        """Add one timing to a stage histogram"""
+        key = ('stage_seconds', (('stage', stage),))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, amount=1, **labels):
+        """Increase a counter"""
+        if not amount:
+            return
+        key = (name, _labels_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def gauge(self, name, read):
+        """Register a gauge, read only when metrics are exported"""
+        self.gauges[name] = read
+
+    def call(self, label, outcome, queue_wait, latency, usage_tokens=(0, 0, 0), attempt=0, status=None):
+        """
+        Record one chat completion attempt
+
+        Args:
+            label (str): What was being enhanced
+            outcome (str): 'ok', 'retried' or 'error'
+            queue_wait (float): Seconds waiting on the rate limiter
+            latency (float): Seconds the request took
+            usage_tokens (tuple): (prompt, completion, cached) tokens reported
+            attempt (int): Retry number, 0 for the first attempt
+            status (int): HTTP status of a failed attempt
+        """
+        prompt, completion, cached = usage_tokens
+        self.observe(STAGE_QUEUE_WAIT, queue_wait)
+        self.observe(STAGE_REQUEST, latency)
+        self.count('api_calls_total', outcome=outcome)
+        self.count('tokens_total', prompt - cached, kind='prompt')
+        self.count('tokens_total', cached, kind='cached_prompt')
+        self.count('tokens_total', completion, kind='completion')
+        if self.trace:
+            event = {
+                'time': datetime.now().isoformat(),
+                'label': label,
+                'outcome': outcome,
+                'attempt': attempt,
+                'status': status,
+                'queue_wait_ms': round(queue_wait * 1000, 1),
+                'latency_ms': round(latency * 1000, 1),
+                'prompt_tokens': prompt,
+                'cached_tokens': cached,
+                'completion_tokens': completion
+            }
+            with self.lock:
+                self.trace.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+    def snapshot(self):
+        """Current values of every metric as a JSON-serializable dict"""
+        with self.lock:
+            histograms = {
+                f"{name}{_format_labels(labels)}": {
+                    'count': histogram.count,
+                    'sum': round(histogram.sum, 6),
+                    'p50_le': histogram.quantile(0.5),
+                    'p95_le': histogram.quantile(0.95),
+                    'p99_le': histogram.quantile(0.99)
+                }
+                for (name, labels), histogram in self.histograms.items()
+            }
+            counters = {f"{name}{_format_labels(labels)}": value for (name, labels), value in self.counters.items()}
+        return {
+            'time': datetime.now().isoformat(),
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'histograms': histograms,
+            'counters': counters,
+            'gauges': {name: read() for name, read in self.gauges.items()}
+        }
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {METRIC_PREFIX}_{name} {_HELP.get(name, name)}")
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name} {kind}")
+
+        with self.lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                describe(name, 'histogram')
+                running = 0
+                for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), histogram.buckets):
+                    running += count
+                    lines.append(f"{METRIC_PREFIX}_{name}_bucket{_format_labels(labels, (('le', bound),))} {running}")
+                lines.append(f"{METRIC_PREFIX}_{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{METRIC_PREFIX}_{name}_count{_format_labels(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name, 'counter')
+                lines.append(f"{METRIC_PREFIX}_{name}{_format_labels(labels)} {value}")
+        for name, read in self.gauges.items():
+            describe(name, 'gauge')
+            lines.append(f"{METRIC_PREFIX}_{name} {read()}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Serve /metrics in Prometheus text format from a background thread
+
+        Args:
+            port (int): Port to listen on (0 picks a free one)
+            host (str): Interface to bind
+
+        Returns:
+            int: The port being served
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_address[1]
+
+    def write_snapshot(self, path):
+        """Append a JSON snapshot line to a file"""
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(self.snapshot()) + '\n')
+
+    def write_snapshots(self, path, interval=DEFAULT_SNAPSHOT_INTERVAL):
+        """Append a JSON snapshot to a file every interval seconds, and once more on close"""
+        def loop():
+            while not self.stop_event.wait(interval):
+                self.write_snapshot(path)
+
+        self.snapshot_path = path
+        self.snapshot_thread = threading.Thread(target=loop, daemon=True)
+        self.snapshot_thread.start()
+
+    def close(self):
+        """Stop exporting, writing a final snapshot"""
+        self.stop_event.set()
+        if self.snapshot_thread:
+            self.snapshot_thread.join()
+            self.write_snapshot(self.snapshot_path)
+            self.snapshot_thread = None
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.trace:
+            self.trace.close()
+            self.trace = None
+
+
+class _NullMetrics:
+    """Stands in for RunMetrics when nothing is being exported"""
+    enabled = False
+
+    def observe(self, stage, seconds):
+        pass
+
+    def count(self, name, amount=1, **labels):
+        pass
+
+    def gauge(self, name, read):
+        pass
+
+    def call(self, label, outcome, queue_wait, latency, usage_tokens=(0, 0, 0), attempt=0, status=None):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_METRICS = _NullMetrics()
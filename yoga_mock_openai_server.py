@@ -0,0 +1,475 @@
+"""
+LOCAL STAND-IN FOR THE OPENAI API
+=================================
+Small HTTP server that implements the endpoints yoga_ai_enhancer.py uses, so
+enhancement runs can be tested without a real API key or spending money:
+1. POST /v1/chat/completions returns a plausible enhancement JSON with usage
+   (keyed by business id when several businesses are packed in one prompt),
+   reporting a repeated system message of 1024+ tokens as cached like the real API,
+   and answering only the fields a json_schema response_format lists
+2. POST /v1/files, GET /v1/files/{id}/content store and serve JSONL files
+3. POST /v1/batches, GET /v1/batches/{id} run a batch after a short delay
+4. Optional chat latency (fixed, uniform, lognormal or exponential) plus time per
+   output token, injected 429/5xx errors and malformed answers, for benchmarks
+   (see yoga_benchmark.py)
+
+Usage:
+    python yoga_mock_openai_server.py --port 8765
+    python yoga_mock_openai_server.py --latency-ms 400 --latency-distribution lognormal --error-rate 0.02
+    OPENAI_API_KEY=test python yoga_ai_enhancer.py --base-url http://127.0.0.1:8765/v1
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import argparse
+import email
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+YOGA_STYLES = ["Hatha", "Vinyasa", "Yin", "Ashtanga", "Kundalini", "Restorative", "Aerial", "Power"]
+AMENITIES = ["Yoga mats", "Props", "Showers", "Changing rooms", "Cafe", "Pool", "Parking", "Wi-Fi"]
+LANGUAGES = ["English", "Indonesian", "Russian", "French", "German"]
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal', 'exponential')
+
+# The API caches prompt prefixes of at least this many tokens, in fixed increments
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+
+def count_tokens(text):
+    """Rough token count, good enough for synthetic usage numbers"""
+    return max(1, len(text) // 4)
+
+
+def fake_enhancement(prompt):
+    """
+    Build a deterministic enhancement response for a prompt
+
+    Args:
+        prompt (str): User prompt sent to the model
+
+    Returns:
+        dict: Response in the enhancement JSON format
+    """
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    name_match = re.search(r'Name: (.+)', prompt)
+    name = name_match.group(1).strip() if name_match else "This studio"
+    return {
+        "enhanced_yoga_styles": rng.sample(YOGA_STYLES, rng.randint(2, 4)),
+        "enhanced_amenities": rng.sample(AMENITIES, rng.randint(2, 5)),
+        "enhanced_languages": rng.sample(LANGUAGES, rng.randint(1, 2)),
+        "enhanced_description": f"{name} is a welcoming yoga space in Bali offering classes for all levels in a calm, tropical setting.",
+        "enhanced_opening_hours": [{"day": day, "hours": "7 AM to 7 PM"} for day in
+                                   ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday")],
+        "enhanced_phone_number": f"+62 8{rng.randint(10, 99)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}",
+        "enhanced_website": None,
+        "enhanced_email": None,
+        "meditation_offered": rng.random() < 0.6,
+        "teacher_training": rng.random() < 0.2,
+        "drop_in_price_usd": rng.choice([8, 10, 12, 15, 18, 20]),
+        "price_range": rng.choice(["budget", "mid-range", "luxury"]),
+        "confidence_score": rng.randint(55, 90)
+    }
+
+
+def fake_response(prompt):
+    """
+    Answer a single-business prompt, or a packed prompt with one answer per [id: ...] block
+
+    Args:
+        prompt (str): User prompt sent to the model
+
+    Returns:
+        dict: Enhancement JSON, keyed by business id for packed prompts
+    """
+    blocks = re.split(r'^\[id: ([^\]]+)\]$', prompt, flags=re.MULTILINE)
+    if len(blocks) == 1:
+        return fake_enhancement(prompt)
+    # re.split alternates: preamble, id, details, id, details, ...
+    return {business_id: fake_enhancement(details) for business_id, details in zip(blocks[1::2], blocks[2::2])}
+
+
+def malform(content, rng):
+    """Damage an answer the ways models do: code fences, chatter, truncation, or no JSON at all"""
+    kind = rng.randrange(4)
+    if kind == 0:
+        return f"```json\n{content}\n```"
+    if kind == 1:
+        return f"Here is the enhanced data:\n{content}\nLet me know if you need anything else."
+    if kind == 2:
+        return content[:max(1, len(content) * 2 // 3)]
+    return "I'm sorry, I can't provide details about this business."
+
+
+class MockOpenAIState:
+    def __init__(self, batch_delay=2.0, latency_ms=0.0, latency_distribution='lognormal',
+                 latency_spread=0.5, ms_per_output_token=0.0, rate_limit_rate=0.0,
+                 server_error_rate=0.0, malformed_rate=0.0, seed=None):
+        """
+        Shared state for all request handlers
+
+        Args:
+            batch_delay (float): Seconds a batch stays in progress before completing
+            latency_ms (float): Median chat completion latency in milliseconds
+            latency_distribution (str): One of LATENCY_DISTRIBUTIONS
+            latency_spread (float): Sigma for lognormal, +/- fraction for uniform
+            ms_per_output_token (float): Generation time added per completion token, in milliseconds
+            rate_limit_rate (float): Share of chat requests answered with a 429
+            server_error_rate (float): Share of chat requests answered with a 500 or 503
+            malformed_rate (float): Share of chat answers that aren't clean JSON
+            seed (int): Random seed for latency and fault injection
+        """
+        self.batch_delay = batch_delay
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_spread = latency_spread
+        self.ms_per_output_token = ms_per_output_token
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.injected = {'rate_limited': 0, 'server_errors': 0, 'malformed': 0}
+        self.lock = threading.RLock()
+        self.files = {}
+        self.batches = {}
+        self.request_count = 0
+        self.cached_prefixes = set()
+
+    def cached_tokens(self, prefix):
+        """Tokens of a prompt prefix served from cache, remembering it for later requests"""
+        tokens = count_tokens(prefix) // PROMPT_CACHE_INCREMENT * PROMPT_CACHE_INCREMENT
+        if tokens < PROMPT_CACHE_MIN_TOKENS:
+            return 0
+        key = hashlib.sha256(prefix.encode('utf-8')).digest()
+        with self.lock:
+            if key in self.cached_prefixes:
+                return tokens
+            self.cached_prefixes.add(key)
+        return 0
+
+    def latency(self):
+        """Seconds to hold the next chat completion, drawn from the configured distribution"""
+        if not self.latency_ms:
+            return 0.0
+        median = self.latency_ms / 1000
+        with self.lock:
+            if self.latency_distribution == 'uniform':
+                return median * self.rng.uniform(1 - self.latency_spread, 1 + self.latency_spread)
+            if self.latency_distribution == 'lognormal':
+                return median * self.rng.lognormvariate(0, self.latency_spread)
+            if self.latency_distribution == 'exponential':
+                # Median of an exponential is ln(2) / rate
+                return self.rng.expovariate(0.6931471805599453 / median)
+        return median
+
+    def generation_time(self, completion_tokens):
+        """Seconds a model would spend writing an answer of this many tokens"""
+        return completion_tokens * self.ms_per_output_token / 1000
+
+    def injected_error(self):
+        """
+        Decide whether the next chat completion fails
+
+        Returns:
+            tuple: (HTTP status, message, headers) or None to answer normally
+        """
+        with self.lock:
+            roll = self.rng.random()
+            if roll < self.rate_limit_rate:
+                self.injected['rate_limited'] += 1
+                return 429, "Rate limit reached for requests", {"retry-after-ms": "200", "x-ratelimit-remaining-requests": "0"}
+            if roll < self.rate_limit_rate + self.server_error_rate:
+                self.injected['server_errors'] += 1
+                return self.rng.choice((500, 503)), "The server had an error while processing your request", {}
+        return None
+
+    def chat_completion(self, body):
+        """Answer a chat completion request body"""
+        messages = body.get('messages', [])
+        system = "\n".join(str(message.get('content', '')) for message in messages if message.get('role') == 'system')
+        prompt = "\n".join(str(message.get('content', '')) for message in messages if message.get('role') != 'system')
+        answer = fake_response(prompt)
+        schema = ((body.get('response_format') or {}).get('json_schema') or {}).get('schema')
+        if schema and 'properties' in schema:
+            # Answer only the fields a (possibly reduced) structured-output schema asks for
+            answer = {field: answer.get(field) for field in schema['properties']}
+        content = json.dumps(answer)
+        with self.lock:
+            if self.malformed_rate and self.rng.random() < self.malformed_rate:
+                content = malform(content, self.rng)
+                self.injected['malformed'] += 1
+        prompt_tokens = count_tokens(system) + count_tokens(prompt)
+        completion_tokens = min(count_tokens(content), body.get('max_tokens') or 800)
+        cached_tokens = self.cached_tokens(system) if system else 0
+        with self.lock:
+            self.request_count += 1
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get('model', 'gpt-4o-mini'),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, "refusal": None},
+                "finish_reason": "stop",
+                "logprobs": None
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }
+        }
+
+    def add_file(self, filename, purpose, content):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.files[file_id] = {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(content),
+                "created_at": int(time.time()),
+                "filename": filename,
+                "purpose": purpose,
+                "status": "processed",
+                "content": content
+            }
+        return self.file_object(file_id)
+
+    def file_object(self, file_id):
+        return {key: value for key, value in self.files[file_id].items() if key != 'content'}
+
+    def create_batch(self, body):
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get('endpoint', '/v1/chat/completions'),
+            "input_file_id": body['input_file_id'],
+            "completion_window": body.get('completion_window', '24h'),
+            "status": "in_progress",
+            "created_at": int(time.time()),
+            "in_progress_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": body.get('metadata')
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+        return batch
+
+    def retrieve_batch(self, batch_id):
+        """Return a batch, running it once its in-progress delay has passed"""
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch['status'] == 'in_progress' and time.time() - batch['created_at'] >= self.batch_delay:
+                self._run_batch(batch)
+            return dict(batch)
+
+    def _run_batch(self, batch):
+        input_lines = self.files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+        output_lines = []
+        for line in input_lines:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            output_lines.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": request['custom_id'],
+                "response": {
+                    "status_code": 200,
+                    "request_id": uuid.uuid4().hex,
+                    "body": self.chat_completion(request['body'])
+                },
+                "error": None
+            }))
+        content = ("\n".join(output_lines) + "\n").encode('utf-8')
+        output_file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self.files[output_file_id] = {
+            "id": output_file_id, "object": "file", "bytes": len(content),
+            "created_at": int(time.time()), "filename": "batch_output.jsonl",
+            "purpose": "batch_output", "status": "processed", "content": content
+        }
+        batch.update({
+            "status": "completed",
+            "completed_at": int(time.time()),
+            "output_file_id": output_file_id,
+            "request_counts": {"total": len(output_lines), "completed": len(output_lines), "failed": 0}
+        })
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "MockOpenAI/1.0"
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, error_type="invalid_request_error"):
+        self._send_json({"error": {"message": message, "type": error_type, "code": None}}, status)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_POST(self):
+        path = self.path.split('?')[0].rstrip('/')
+        body = self._read_body()
+
+        if path.endswith('/chat/completions'):
+            time.sleep(self.state.latency())
+            error = self.state.injected_error()
+            if error:
+                status, message, headers = error
+                error_type = "requests" if status == 429 else "server_error"
+                return self._send_json({"error": {"message": message, "type": error_type, "code": None}}, status, headers)
+            response = self.state.chat_completion(json.loads(body or b'{}'))
+            time.sleep(self.state.generation_time(response['usage']['completion_tokens']))
+            self._send_json(response, headers={
+                "x-ratelimit-limit-requests": "10000",
+                "x-ratelimit-limit-tokens": "10000000"
+            })
+        elif path.endswith('/files'):
+            self._handle_file_upload(body)
+        elif path.endswith('/batches'):
+            self._send_json(self.state.create_batch(json.loads(body or b'{}')))
+        else:
+            self._send_error(404, f"Unknown endpoint {path}")
+
+    def do_GET(self):
+        path = self.path.split('?')[0].rstrip('/')
+
+        batch_match = re.search(r'/batches/([^/]+)$', path)
+        content_match = re.search(r'/files/([^/]+)/content$', path)
+        file_match = re.search(r'/files/([^/]+)$', path)
+
+        if batch_match:
+            if batch_match.group(1) not in self.state.batches:
+                return self._send_error(404, "No such batch")
+            self._send_json(self.state.retrieve_batch(batch_match.group(1)))
+        elif content_match:
+            stored = self.state.files.get(content_match.group(1))
+            if not stored:
+                return self._send_error(404, "No such file")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(stored['content'])))
+            self.end_headers()
+            self.wfile.write(stored['content'])
+        elif file_match:
+            if file_match.group(1) not in self.state.files:
+                return self._send_error(404, "No such file")
+            self._send_json(self.state.file_object(file_match.group(1)))
+        else:
+            self._send_error(404, f"Unknown endpoint {path}")
+
+    def _handle_file_upload(self, body):
+        message = email.message_from_bytes(
+            f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode('utf-8') + body,
+            policy=default_policy
+        )
+        filename, purpose, content = "upload.jsonl", "batch", b''
+        for part in message.iter_parts():
+            field = part.get_param('name', header='content-disposition')
+            if field == 'file':
+                filename = part.get_filename() or filename
+                content = part.get_payload(decode=True) or b''
+            elif field == 'purpose':
+                purpose = part.get_content().strip()
+        self._send_json(self.state.add_file(filename, purpose, content))
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, batch_delay=2.0, verbose=False, **behaviour):
+        """
+        Create the server (port 0 picks a free port)
+
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind
+            batch_delay (float): Seconds before a submitted batch completes
+            verbose (bool): Log every request
+            **behaviour: Latency and fault injection settings (see MockOpenAIState)
+        """
+        super().__init__((host, port), MockOpenAIHandler)
+        self.state = MockOpenAIState(batch_delay=batch_delay, **behaviour)
+        self.verbose = verbose
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose, e.g. on the losing copy of a hedged request
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start_in_thread(self):
+        """Serve in a background thread (for tests and benchmarks)"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI API")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", "-p", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="Seconds before a batch completes (default: 2.0)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Median chat completion latency (default: 0)")
+    parser.add_argument("--latency-distribution", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="Shape of the latency distribution (default: lognormal)")
+    parser.add_argument("--latency-spread", type=float, default=0.5, help="Lognormal sigma, or +/- fraction for uniform (default: 0.5)")
+    parser.add_argument("--ms-per-output-token", type=float, default=0.0, help="Generation time per completion token (default: 0)")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of chat requests answered with 429 (default: 0)")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="Share of chat requests answered with 500/503 (default: 0)")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of chat answers that aren't clean JSON (default: 0)")
+    parser.add_argument("--seed", type=int, help="Random seed for latency and fault injection")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Log every request")
+
+    args = parser.parse_args()
+
+    server = MockOpenAIServer(
+        args.host, args.port, batch_delay=args.batch_delay, verbose=args.verbose,
+        latency_ms=args.latency_ms, latency_distribution=args.latency_distribution,
+        latency_spread=args.latency_spread, ms_per_output_token=args.ms_per_output_token,
+        rate_limit_rate=args.rate_limit_rate,
+        server_error_rate=args.server_error_rate, malformed_rate=args.malformed_rate,
+        seed=args.seed
+    )
+    print(f"🧪 Mock OpenAI server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+
+if __name__ == "__main__":
+    main()
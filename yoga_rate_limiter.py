@@ -0,0 +1,290 @@
+"""
+ADAPTIVE RATE LIMITER FOR OPENAI REQUESTS
+=========================================
+Token-bucket scheduler used by yoga_ai_enhancer.py to pace API calls on
+both requests per minute (RPM) and tokens per minute (TPM):
+1. Each request waits until both buckets have room for it
+2. Rate-limit response headers keep the buckets in line with the server's view: they can lower
+   the configured limits and hold requests until an exhausted limit resets, never raise them
+3. 429 and 5xx responses back off with jitter, honouring retry-after hints
+4. Achieved RPM/TPM is reported at the end of a run
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import asyncio
+import random
+import re
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Default limits for gpt-4o-mini on a usage tier 1 account
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_SECONDS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_reset_duration(value):
+    """
+    Parse an x-ratelimit-reset-* header value such as "1s", "6m0s" or "20ms"
+
+    Args:
+        value (str): Header value
+
+    Returns:
+        float: Seconds until the limit resets, or None if unparseable
+    """
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_SECONDS[unit] for amount, unit in parts)
+
+
+def parse_retry_after(headers):
+    """
+    Read the server's retry hint from response headers
+
+    Args:
+        headers (Mapping): Response headers
+
+    Returns:
+        float: Seconds to wait before retrying, or None if no hint was sent
+    """
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    # No explicit hint: wait for whichever exhausted limit resets last
+    resets = [
+        parse_reset_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+        for kind in ('requests', 'tokens')
+        if headers.get(f'x-ratelimit-remaining-{kind}') in ('0', 0)
+    ]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+class TokenBucket:
+    def __init__(self, capacity_per_minute):
+        """
+        Initialize a bucket that refills continuously over one minute
+
+        Args:
+            capacity_per_minute (float): Bucket size and refill amount per minute
+        """
+        self.limit = float(capacity_per_minute)  # As configured; the capacity never goes above it
+        self.capacity = self.limit
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    @property
+    def refill_rate(self):
+        return self.capacity / 60.0
+
+    def refill(self, now=None):
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+            self.updated_at = now
+
+    def wait_time(self, amount):
+        """Seconds until `amount` can be taken (0 if available now)"""
+        self.refill()
+        # A request larger than the whole bucket only needs a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_rate
+
+    def consume(self, amount):
+        self.refill()
+        self.tokens -= amount
+
+    def set_capacity(self, capacity_per_minute):
+        """
+        Follow a limit the server reports, up to the configured one
+
+        The server's x-ratelimit-limit-* is the whole account's limit; a
+        lower --rpm/--tpm, or one worker's share of it, must still hold.
+        """
+        self.refill()
+        self.capacity = min(self.limit, float(capacity_per_minute))
+        self.tokens = min(self.tokens, self.capacity)
+
+    def sync_remaining(self, remaining):
+        """
+        Align the bucket with the server's remaining allowance
+
+        Only ever lowers the local count: with requests in flight the header
+        can lag behind what has already been consumed locally.
+        """
+        self.refill()
+        self.tokens = min(self.tokens, float(remaining))
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 max_retries=5, base_backoff=1.0, max_backoff=60.0):
+        """
+        Initialize the rate limiter
+
+        Args:
+            requests_per_minute (int): Request budget per minute
+            tokens_per_minute (int): Token budget per minute (prompt + max output)
+            max_retries (int): Retries per request on 429/5xx/connection errors
+            base_backoff (float): First backoff step in seconds
+            max_backoff (float): Upper bound for a single backoff in seconds
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.paused_until = 0.0
+
+        # Achieved throughput
+        self.started_at = None
+        self.requests_sent = 0
+        self.tokens_used = 0
+        self.rate_limited_responses = 0
+        self.server_errors = 0
+
+    async def acquire(self, estimated_tokens):
+        """
+        Wait until one request of `estimated_tokens` fits in both buckets
+
+        Args:
+            estimated_tokens (int): Prompt tokens plus max output tokens
+        """
+        while True:
+            now = time.monotonic()
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+            if wait <= 0:
+                self.requests.consume(1)
+                self.tokens.consume(estimated_tokens)
+                if self.started_at is None:
+                    self.started_at = now
+                self.requests_sent += 1
+                return
+            await asyncio.sleep(wait)
+
+    def try_acquire(self, estimated_tokens):
+        """
+        Take room for one request only if both buckets have it right now
+
+        For optional requests (hedges) that are worth nothing if they wait.
+
+        Returns:
+            bool: Whether the request may be sent
+        """
+        now = time.monotonic()
+        if self.paused_until > now or self.requests.wait_time(1) > 0 or self.tokens.wait_time(estimated_tokens) > 0:
+            return False
+        self.requests.consume(1)
+        self.tokens.consume(estimated_tokens)
+        if self.started_at is None:
+            self.started_at = now
+        self.requests_sent += 1
+        return True
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Refund (or charge) the difference between the reserved and real token count"""
+        self.tokens.refill()
+        self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + estimated_tokens - actual_tokens)
+        self.tokens_used += actual_tokens
+
+    def update_from_headers(self, headers):
+        """
+        Adjust both buckets from x-ratelimit-* response headers
+
+        A limit can only lower a bucket below its configured size. When the
+        server says a limit is used up, new requests wait until it resets.
+
+        Args:
+            headers (Mapping): Response headers
+        """
+        if not headers:
+            return
+        for bucket, kind in ((self.requests, 'requests'), (self.tokens, 'tokens')):
+            limit = headers.get(f'x-ratelimit-limit-{kind}')
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            try:
+                if limit is not None:
+                    bucket.set_capacity(float(limit))
+                if remaining is not None:
+                    bucket.sync_remaining(float(remaining))
+            except ValueError:
+                continue
+            if remaining in ('0', 0):
+                reset = parse_reset_duration(headers.get(f'x-ratelimit-reset-{kind}'))
+                if reset:
+                    self.paused_until = max(self.paused_until, time.monotonic() + reset)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """
+        Delay before retry number `attempt` (0-based)
+
+        Uses the server's retry-after hint when present, otherwise exponential
+        backoff with jitter so concurrent requests don't retry in lockstep.
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_backoff)
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        return random.uniform(ceiling / 2, ceiling)
+
+    def pause(self, seconds):
+        """Hold back every new request for `seconds` after a 429"""
+        self.rate_limited_responses += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def report(self):
+        """
+        Achieved throughput since the first request
+
+        Returns:
+            dict: requests, tokens, achieved RPM/TPM and retry counters
+        """
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        minutes = elapsed / 60 if elapsed > 0 else 0.0
+        return {
+            'requests': self.requests_sent,
+            'tokens': self.tokens_used,
+            'elapsed_seconds': round(elapsed, 1),
+            'achieved_rpm': round(self.requests_sent / minutes, 1) if minutes else 0.0,
+            'achieved_tpm': round(self.tokens_used / minutes, 1) if minutes else 0.0,
+            'rpm_limit': self.requests.capacity,
+            'tpm_limit': self.tokens.capacity,
+            'rate_limited_responses': self.rate_limited_responses,
+            'server_errors': self.server_errors
+        }
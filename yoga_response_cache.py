@@ -0,0 +1,182 @@
+"""
+PERSISTENT LLM RESPONSE CACHE
+=============================
+Content-addressed SQLite cache used by yoga_ai_enhancer.py so reruns don't pay
+for the same prompt twice:
+1. Entries are keyed by a hash of model, system message, prompt and sampling parameters
+2. Each entry stores the raw response text and the token usage it cost
+3. Entries older than max_age_days, or beyond max_size_mb (least recently used first), are evicted
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_FILE = ".yoga_ai_cache.sqlite"
+
+
+def make_cache_key(model, system_message, prompt, params):
+    """
+    Hash everything that determines an LLM response
+
+    Args:
+        model (str): Model name
+        system_message (str): System message content
+        prompt (str): User prompt
+        params (dict): Sampling parameters (temperature, max_tokens, ...)
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    payload = json.dumps(
+        [model, system_message, prompt, params],
+        sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path, max_age_days=30, max_size_mb=200):
+        """
+        Open (or create) the cache database
+
+        Args:
+            path (str|Path): SQLite file path
+            max_age_days (float): Entries older than this are ignored and evicted
+            max_size_mb (float): Total response size kept before evicting least recently used
+        """
+        self.path = Path(path)
+        self.max_age_seconds = max_age_days * 86400 if max_age_days else None
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                content TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.conn.commit()
+
+    def _is_fresh(self, created_at):
+        return self.max_age_seconds is None or time.time() - created_at <= self.max_age_seconds
+
+    def contains(self, key):
+        """Check for a fresh entry without counting a hit or miss"""
+        row = self.conn.execute("SELECT created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        return row is not None and self._is_fresh(row[0])
+
+    def get(self, key):
+        """
+        Look up a cached response
+
+        Args:
+            key (str): Key from make_cache_key
+
+        Returns:
+            dict: content, model, prompt_tokens, completion_tokens, or None on a miss
+        """
+        row = self.conn.execute(
+            "SELECT model, content, prompt_tokens, completion_tokens, created_at FROM responses WHERE key = ?",
+            (key,)
+        ).fetchone()
+
+        if row is None or not self._is_fresh(row[4]):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        return {
+            'model': row[0],
+            'content': row[1],
+            'prompt_tokens': row[2],
+            'completion_tokens': row[3]
+        }
+
+    def put(self, key, model, content, prompt_tokens=0, completion_tokens=0):
+        """
+        Store a response
+
+        Args:
+            key (str): Key from make_cache_key
+            model (str): Model that produced the response
+            content (str): Raw response text
+            prompt_tokens (int): Input tokens the call used
+            completion_tokens (int): Output tokens the call used
+        """
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses "
+            "(key, model, content, prompt_tokens, completion_tokens, size, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, model, content, prompt_tokens or 0, completion_tokens or 0,
+             len(content.encode('utf-8')), now, now)
+        )
+        self.conn.commit()
+
+    def average_completion_tokens(self, model=None):
+        """
+        Average output size of cached responses, for cost projections
+
+        Args:
+            model (str): Only consider responses from this model
+
+        Returns:
+            float: Average completion tokens, or None if nothing is cached
+        """
+        query = "SELECT AVG(completion_tokens) FROM responses WHERE completion_tokens > 0"
+        params = ()
+        if model:
+            query += " AND model = ?"
+            params = (model,)
+        return self.conn.execute(query, params).fetchone()[0]
+
+    def evict(self):
+        """
+        Drop expired entries, then least recently used ones until under the size limit
+
+        Returns:
+            int: Number of entries removed
+        """
+        removed = 0
+        if self.max_age_seconds is not None:
+            cursor = self.conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,)
+            )
+            removed += cursor.rowcount
+
+        if self.max_size_bytes is not None:
+            total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total_size > self.max_size_bytes:
+                excess = total_size - self.max_size_bytes
+                stale_keys = []
+                for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+                    if excess <= 0:
+                        break
+                    stale_keys.append((key,))
+                    excess -= size
+                self.conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+                removed += len(stale_keys)
+
+        self.conn.commit()
+        return removed
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,339 @@
+"""
+ENHANCEMENT RESPONSE SCHEMA, VALIDATION AND REPAIR
+==================================================
+Keeps a paid enhancement call from being thrown away over a formatting slip:
+1. Requests ask for JSON-schema structured output (json_object for packed prompts)
+2. Answers are pulled out of code fences and trailing prose, and truncated objects are closed
+3. Each field is validated and coerced to its expected type (prices, scores, booleans, lists)
+4. Fields that still fail are reported, so only they need to be asked for again
+5. max_tokens is sized to the fields a request asks for, so asking for a few costs a few
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import json
+import re
+
+PRICE_RANGES = ('budget', 'mid-range', 'luxury')
+
+_STRING_LIST = {'type': 'array', 'items': {'type': 'string'}}
+_OPTIONAL_STRING = {'type': ['string', 'null']}
+
+# JSON schema of every field in the enhancement answer, in prompt order
+ENHANCEMENT_FIELD_SCHEMAS = {
+    'enhanced_yoga_styles': _STRING_LIST,
+    'enhanced_amenities': _STRING_LIST,
+    'enhanced_languages': _STRING_LIST,
+    'enhanced_description': {'type': 'string'},
+    'enhanced_opening_hours': {
+        'type': ['array', 'null'],
+        'items': {
+            'type': 'object',
+            'properties': {'day': {'type': 'string'}, 'hours': {'type': 'string'}},
+            'required': ['day', 'hours'],
+            'additionalProperties': False
+        }
+    },
+    'enhanced_phone_number': _OPTIONAL_STRING,
+    'enhanced_website': _OPTIONAL_STRING,
+    'enhanced_email': _OPTIONAL_STRING,
+    'meditation_offered': {'type': 'boolean'},
+    'teacher_training': {'type': 'boolean'},
+    'drop_in_price_usd': {'type': ['number', 'null']},
+    'price_range': {'type': ['string', 'null'], 'enum': [*PRICE_RANGES, None]},
+    'confidence_score': {'type': 'integer'}
+}
+ENHANCEMENT_FIELDS = tuple(ENHANCEMENT_FIELD_SCHEMAS)
+
+# Generous output tokens per answer field (key, value and punctuation), so a
+# request for a few fields gets a max_tokens that fits them and no more
+FIELD_OUTPUT_TOKENS = {
+    'enhanced_yoga_styles': 60,
+    'enhanced_amenities': 80,
+    'enhanced_languages': 30,
+    'enhanced_description': 150,
+    'enhanced_opening_hours': 220,
+    'enhanced_phone_number': 25,
+    'enhanced_website': 30,
+    'enhanced_email': 30,
+    'meditation_offered': 10,
+    'teacher_training': 10,
+    'drop_in_price_usd': 12,
+    'price_range': 12,
+    'confidence_score': 10
+}
+ANSWER_OVERHEAD_TOKENS = 20  # Braces, and room for whitespace the model adds
+
+# Answers keyed by business id can't be described by a strict schema
+PACKED_RESPONSE_FORMAT = {'type': 'json_object'}
+
+# Models that predate json_schema response formats
+_NO_STRUCTURED_OUTPUT = ('gpt-3.5-turbo', 'gpt-4-turbo')
+
+_CODE_FENCE = re.compile(r'```(?:json)?\s*(.*?)(?:```|$)', re.DOTALL | re.IGNORECASE)
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_NULL_STRINGS = {'', 'null', 'none', 'n/a', 'unknown', 'not available'}
+
+
+def supports_structured_output(model):
+    return not model.startswith(_NO_STRUCTURED_OUTPUT)
+
+
+def response_format(model, fields=None):
+    """
+    The response_format request parameter for an enhancement answer
+
+    Args:
+        model (str): Model the request goes to
+        fields (iterable): Fields to ask for (all of them by default)
+
+    Returns:
+        dict: A strict json_schema format, or json_object for older models
+    """
+    if not supports_structured_output(model):
+        return {'type': 'json_object'}
+    fields = list(fields or ENHANCEMENT_FIELDS)
+    return {
+        'type': 'json_schema',
+        'json_schema': {
+            'name': 'yoga_business_enhancement',
+            'strict': True,
+            'schema': {
+                'type': 'object',
+                'properties': {field: ENHANCEMENT_FIELD_SCHEMAS[field] for field in fields},
+                'required': fields,
+                'additionalProperties': False
+            }
+        }
+    }
+
+
+def output_token_limit(fields, ceiling):
+    """
+    max_tokens for an answer holding the given fields
+
+    Args:
+        fields (iterable): Fields asked for
+        ceiling (int): Limit never to exceed (the full answer's max_tokens)
+
+    Returns:
+        int: Output token limit
+    """
+    return min(ceiling, ANSWER_OVERHEAD_TOKENS + sum(FIELD_OUTPUT_TOKENS[field] for field in fields))
+
+
+def close_truncated(text):
+    """
+    Cut a JSON object cut off mid-way back to its last complete value and close it
+
+    Args:
+        text (str): JSON text starting at its opening brace
+
+    Returns:
+        str: Text that parses, if the truncated part was the only problem
+    """
+    stack = []
+    in_string = escaped = False
+    safe_end, safe_stack = 0, []
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+            safe_end, safe_stack = index + 1, stack.copy()
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                return text[:index + 1]
+            safe_end, safe_stack = index + 1, stack.copy()
+        elif char == ',':
+            safe_end, safe_stack = index, stack.copy()
+    return text[:safe_end] + ''.join(reversed(safe_stack))
+
+
+def extract_json_object(content):
+    """
+    Find the JSON object in a model answer
+
+    Tolerates markdown code fences, prose before or after the object, and an
+    object truncated at max_tokens.
+
+    Args:
+        content (str): Raw message content
+
+    Returns:
+        tuple: (dict, True if the answer needed any repair)
+
+    Raises:
+        ValueError: If no JSON object can be recovered
+    """
+    text = (content or '').strip()
+    repaired = False
+    fence = _CODE_FENCE.search(text)
+    if fence:
+        text = fence.group(1).strip()
+        repaired = True
+
+    start = text.find('{')
+    if start < 0:
+        raise ValueError("No JSON object in response")
+    try:
+        value, end = json.JSONDecoder().raw_decode(text, start)
+        repaired = repaired or start > 0 or end < len(text)
+    except json.JSONDecodeError:
+        value = json.loads(close_truncated(text[start:]))
+        repaired = True
+    if not isinstance(value, dict):
+        raise ValueError("AI response is not a JSON object")
+    return value, repaired
+
+
+def _string_list(value):
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = value.split(',')
+    if not isinstance(value, list):
+        raise ValueError("expected a list")
+    return [item.strip() for item in value if isinstance(item, str) and item.strip()]
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ValueError("expected a string")
+    return value.strip()
+
+
+def _optional_string(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if value is None or (isinstance(value, str) and value.strip().lower() in _NULL_STRINGS):
+        return None
+    if not isinstance(value, str):
+        raise ValueError("expected a string or null")
+    return value.strip()
+
+
+def _opening_hours(value):
+    if isinstance(value, str):
+        if value.strip().lower() in _NULL_STRINGS:
+            return None
+        value = json.loads(value)
+    if value is None:
+        return None
+    if not isinstance(value, list):
+        raise ValueError("expected a list of days")
+    hours = [{'day': str(entry['day']), 'hours': str(entry['hours'])}
+             for entry in value if isinstance(entry, dict) and entry.get('day') and entry.get('hours')]
+    if value and not hours:
+        raise ValueError("no usable day/hours entries")
+    return hours or None
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'yes'):
+        return True
+    if isinstance(value, str) and value.strip().lower() in ('false', 'no'):
+        return False
+    raise ValueError("expected true or false")
+
+
+def _price(value):
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        if value.strip().lower() in _NULL_STRINGS:
+            return None
+        # "$15", "15 USD", or a range like "10-20" (its midpoint)
+        numbers = [float(number) for number in _NUMBER.findall(value.replace(',', ''))]
+        if numbers:
+            price = sum(numbers[:2]) / len(numbers[:2])
+            return int(price) if price.is_integer() else round(price, 2)
+    raise ValueError("expected a price in USD")
+
+
+def _price_range(value):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise ValueError("expected a price range")
+    normalized = value.strip().lower().replace(' ', '-').replace('_', '-')
+    if normalized in _NULL_STRINGS:
+        return None
+    if normalized in ('mid', 'midrange', 'moderate'):
+        normalized = 'mid-range'
+    if normalized not in PRICE_RANGES:
+        raise ValueError(f"expected one of {', '.join(PRICE_RANGES)}")
+    return normalized
+
+
+def _confidence(value):
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        if not match:
+            raise ValueError("expected a number")
+        value = float(match.group())
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("expected a number")
+    # A 0-1 fraction instead of a percentage
+    if isinstance(value, float) and 0 < value < 1:
+        value *= 100
+    return int(round(min(max(value, 0), 100)))
+
+
+_COERCERS = {
+    'enhanced_yoga_styles': _string_list,
+    'enhanced_amenities': _string_list,
+    'enhanced_languages': _string_list,
+    'enhanced_description': _text,
+    'enhanced_opening_hours': _opening_hours,
+    'enhanced_phone_number': _optional_string,
+    'enhanced_website': _optional_string,
+    'enhanced_email': _optional_string,
+    'meditation_offered': _boolean,
+    'teacher_training': _boolean,
+    'drop_in_price_usd': _price,
+    'price_range': _price_range,
+    'confidence_score': _confidence
+}
+
+
+def validate_enhancement(data, fields=None):
+    """
+    Validate an enhancement answer field by field, coercing near-misses
+
+    Args:
+        data (dict): Decoded answer
+        fields (iterable): Fields expected in it (all of them by default)
+
+    Returns:
+        tuple: (dict of valid fields, list of fields missing or invalid)
+    """
+    valid = {}
+    failed = []
+    for field in fields or ENHANCEMENT_FIELDS:
+        if field not in data:
+            failed.append(field)
+            continue
+        try:
+            valid[field] = _COERCERS[field](data[field])
+        except (ValueError, TypeError, KeyError):
+            failed.append(field)
+    return valid, failed
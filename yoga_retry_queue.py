@@ -0,0 +1,183 @@
+"""
+END-OF-RUN RETRY QUEUE AND DEAD-LETTER FILE
+===========================================
+Second chances for businesses whose enhancement failed, used by
+yoga_ai_enhancer.py so a flaky call doesn't mean rerunning the whole dataset:
+1. Transient failures (timeouts, 429, 5xx, unusable answers) are queued instead of given up on
+2. Once the main pass is done, the queue is drained with exponential backoff per business
+3. Attempts per business are capped; whatever still fails goes to a dead-letter JSONL file
+4. --retry-dead-letter processes just the businesses in that file
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import asyncio
+import json
+import random
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 2.0
+RETRY_MAX_DELAY = 60.0
+DEAD_LETTER_SUFFIX = '.dead_letter.jsonl'
+
+
+def retry_delay(attempts, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """
+    Exponential backoff with jitter before the next attempt
+
+    Args:
+        attempts (int): Attempts made so far
+
+    Returns:
+        float: Seconds to wait
+    """
+    delay = min(max_delay, base_delay * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class RetryItem:
+    __slots__ = ('record', 'attempts', 'error')
+
+    def __init__(self, record, attempts, error):
+        self.record = record
+        self.attempts = attempts
+        self.error = error
+
+
+class RetryQueue:
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        """
+        Collect failed businesses during a run and retry them at the end
+
+        Args:
+            max_attempts (int): Attempts per business, including the first one
+            base_delay (float): Backoff before the first retry, doubled for each one after
+            max_delay (float): Longest backoff between attempts
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.items = []
+        self.dead = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, record, error, transient=True, attempts=1):
+        """
+        Queue a failed business for another attempt, or dead-letter it
+
+        Args:
+            record (BusinessRecord): Business whose enhancement failed
+            error (str): Why it failed
+            transient (bool): Whether trying again could help
+            attempts (int): Attempts made so far
+        """
+        item = RetryItem(record, attempts, error)
+        if transient and attempts < self.max_attempts:
+            self.items.append(item)
+        else:
+            self.dead.append(item)
+
+    def give_up(self, error):
+        """Dead-letter everything still queued, e.g. once the budget is spent"""
+        for item in self.items:
+            item.error = error
+        self.dead.extend(self.items)
+        self.items = []
+
+    async def _attempt(self, item, attempt, semaphore):
+        await asyncio.sleep(retry_delay(item.attempts, self.base_delay, self.max_delay))
+        async with semaphore:
+            result, error, transient = await attempt(item.record)
+        return item, result, error, transient
+
+    async def drain(self, attempt, concurrency=8):
+        """
+        Retry every queued business until it succeeds or runs out of attempts
+
+        Each business waits out its own backoff, so one slow retry doesn't
+        hold up the rest.
+
+        Args:
+            attempt (callable): Coroutine function taking a record and returning
+                (result or None, error or None, transient)
+            concurrency (int): Retries in flight at once
+
+        Returns:
+            list: (record, result) for each business that succeeded on a retry
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        pending = {asyncio.create_task(self._attempt(item, attempt, semaphore)) for item in self.items}
+        self.items = []
+        succeeded = []
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                item, result, error, transient = task.result()
+                item.attempts += 1
+                if result is not None:
+                    succeeded.append((item.record, result))
+                elif transient and item.attempts < self.max_attempts:
+                    item.error = error
+                    pending.add(asyncio.create_task(self._attempt(item, attempt, semaphore)))
+                else:
+                    item.error = error
+                    self.dead.append(item)
+        return succeeded
+
+
+def dead_letter_path(output_path):
+    """Dead-letter file kept next to an output dataset"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.stem + DEAD_LETTER_SUFFIX)
+
+
+def write_dead_letter(path, items, output_path):
+    """
+    Write permanently failed businesses to a dead-letter JSONL file
+
+    An empty list removes the file, so a stale one isn't retried again.
+
+    Args:
+        path (str|Path): Dead-letter file
+        items (list): RetryItems that ran out of attempts
+        output_path (str|Path): Output dataset the businesses belong in
+
+    Returns:
+        int: Businesses written
+    """
+    path = Path(path)
+    if not items:
+        path.unlink(missing_ok=True)
+        return 0
+    temp_path = path.with_suffix(path.suffix + '.tmp')
+    failed_at = datetime.now().isoformat()
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        for item in items:
+            file.write(json.dumps({
+                'id': item.record.id,
+                'attempts': item.attempts,
+                'error': item.error,
+                'failed_at': failed_at,
+                'output': str(output_path),
+                'business': item.record.raw
+            }, ensure_ascii=False) + '\n')
+    temp_path.replace(path)
+    return len(items)
+
+
+def load_dead_letter(path):
+    """
+    Read a dead-letter file back
+
+    Args:
+        path (str|Path): Dead-letter file
+
+    Returns:
+        list: One dict per failed business, with its raw data under 'business'
+    """
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
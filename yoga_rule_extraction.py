@@ -0,0 +1,227 @@
+"""
+RULE-BASED PRE-EXTRACTION
+=========================
+Fills the gaps that plain text rules can find before yoga_ai_enhancer.py
+pays for a model call:
+1. Yoga styles, amenities and languages named in a business's name, category or description
+   are matched with one compiled regex per vocabulary (the same labels the prompt asks for)
+2. Meditation and teacher-training flags are set from keywords ("vipassana", "200 hour", "YTT", ...)
+3. The Instagram handle and profile URL are derived from each other when only one is known
+4. Flags already in the data (meditation_offered, jungle_setting, ...) become styles and amenities
+
+Rules only ever add: values already present are kept, and a flag is only
+turned on. Businesses that reach the enhancement threshold this way are
+complete enough and never sent to the model; the rest go with the extracted
+values in their prompt.
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import re
+
+from yoga_business_record import BusinessRecord, decode_list
+from yoga_dedup import instagram_handle
+
+# Extra ways a vocabulary label is written; every label also matches itself
+STYLE_ALIASES = {
+    'Hatha': ('hatha',),
+    'Vinyasa': ('vinyasa', 'flow yoga'),
+    'Meditation': ('meditation', 'mindfulness', 'vipassana', 'pranayama', 'breathwork'),
+    'Restorative': ('restorative',),
+    'Kundalini': ('kundalini',),
+    'Power Yoga': ('power yoga', 'power flow'),
+    'Hot Yoga': ('hot yoga', 'bikram'),
+    'Iyengar': ('iyengar',),
+    'Aerial Yoga': ('aerial', 'anti-gravity', 'antigravity'),
+    'Gentle Yoga': ('gentle yoga', 'beginner yoga', 'yoga for beginners')
+}
+AMENITY_ALIASES = {
+    'Showers': ('shower', 'showers'),
+    'Yoga Mats Provided': ('mats provided', 'mat rental', 'mat hire', 'free mats'),
+    'Yoga Shop': ('yoga shop',),
+    'Changing Rooms': ('changing room', 'changing rooms', 'locker room', 'lockers'),
+    'Massage Services': ('massage', 'massages'),
+    'Spa Services': ('spa', 'spa treatments'),
+    'Yoga Props': ('props', 'bolster', 'bolsters'),
+    'Cafe': ('cafe', 'café', 'coffee shop'),
+    'Free WiFi': ('wifi', 'wi-fi'),
+    'Parking Available': ('parking',),
+    'Accommodation': ('accommodation', 'villa', 'villas', 'bungalow', 'bungalows', 'guesthouse', 'resort', 'hotel'),
+    'Garden Setting': ('garden', 'gardens'),
+    'Swimming Pool': ('pool', 'swimming pool'),
+    'Restaurant': ('restaurant',),
+    'Organic Food': ('organic', 'vegan', 'vegetarian', 'plant-based'),
+    'Sound System': ('sound system',),
+    'Air Conditioning': ('air conditioning', 'air-conditioned', 'air conditioned'),
+    'Scenic Views': ('rice field', 'rice fields', 'rice terrace', 'ocean view', 'sea view', 'jungle view', 'volcano view')
+}
+
+# Columns already in the scraped data that imply a style or amenity when true
+FLAG_STYLES = {'meditation_offered': 'Meditation'}
+FLAG_AMENITIES = {
+    'pool': 'Swimming Pool', 'spa': 'Spa Services', 'accommodation': 'Accommodation',
+    'rice_field_view': 'Scenic Views', 'jungle_setting': 'Scenic Views', 'river_view': 'Scenic Views',
+    'mountain_view': 'Scenic Views'
+}
+
+MEDITATION_PATTERN = re.compile(r'\b(?:meditat\w*|mindfulness|vipassana|pranayama|breathwork)\b', re.IGNORECASE)
+TEACHER_TRAINING_PATTERN = re.compile(
+    r'\b(?:teacher[\s-]+trainings?|[23]00[\s-]*(?:hours?|hrs?|h)|ytt|yttc|ttc|ryt|yoga alliance)\b', re.IGNORECASE
+)
+
+INSTAGRAM_URL = 'https://www.instagram.com/{}/'
+
+
+def vocabulary_pattern(labels, aliases):
+    """
+    One case-insensitive regex matching every way of writing any label
+
+    Longer phrases are tried first, so "swimming pool" wins over "pool".
+
+    Args:
+        labels (iterable): Vocabulary labels
+        aliases (dict): Label -> extra phrases that mean it
+
+    Returns:
+        tuple: (compiled pattern, dict of lowercased phrase -> label)
+    """
+    phrases = {}
+    for label in labels:
+        for phrase in (label, *aliases.get(label, ())):
+            phrases.setdefault(phrase.lower(), label)
+    alternation = '|'.join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf'(?<!\w)(?:{alternation})(?!\w)', re.IGNORECASE), phrases
+
+
+def _short_name(label):
+    """First word of a label that isn't "yoga", as the scraped data writes it ("Hot Yoga" -> "hot")"""
+    return next((word for word in label.lower().split() if word != 'yoga'), label.lower())
+
+
+def label_lookup(labels, aliases):
+    """
+    Map every way the scraped data writes a value to its vocabulary label
+
+    Args:
+        labels (iterable): Vocabulary labels
+        aliases (dict): Label -> extra phrases that mean it
+
+    Returns:
+        dict: Lowercased phrase or short name ("hot", "mat rental") -> label
+    """
+    labels = list(labels)
+    lookup = {}
+    for label in labels:
+        for phrase in (label, *aliases.get(label, ())):
+            lookup.setdefault(phrase.lower(), label)
+    for label in labels:
+        lookup.setdefault(_short_name(label), label)
+    return lookup
+
+
+def _add(values, found, phrases):
+    """
+    values plus the labels in found that it doesn't already cover, in order
+
+    The scraped data writes values its own way ("spa", "mat_rental", "Hot"),
+    so an existing value covers a label when it is one of the label's
+    phrases or its short name.
+    """
+    covered = set()
+    for value in values:
+        text = str(value).lower().replace('_', ' ').strip()
+        covered.add(phrases.get(text, text))
+    covered |= {label for label in set(phrases.values()) if _short_name(label) in covered}
+    added = [label for label in dict.fromkeys(found) if label not in covered]
+    return list(values) + added, bool(added)
+
+
+class RuleExtractor:
+    def __init__(self, styles, amenities, languages, threshold):
+        """
+        Compile the extraction rules
+
+        Args:
+            styles (iterable): Yoga style labels
+            amenities (iterable): Amenity labels
+            languages (iterable): Language names
+            threshold (int): Completeness below which a business is worth extracting from
+        """
+        self.threshold = threshold
+        self.style_pattern, self.style_phrases = vocabulary_pattern(styles, STYLE_ALIASES)
+        self.amenity_pattern, self.amenity_phrases = vocabulary_pattern(amenities, AMENITY_ALIASES)
+        self.language_pattern, self.language_phrases = vocabulary_pattern(languages, {})
+        self.extracted = 0  # Businesses given at least one field
+        self.lifted = 0  # ... of which reached the threshold
+
+    def reset(self):
+        self.extracted = 0
+        self.lifted = 0
+
+    def _matches(self, pattern, phrases, text):
+        return [phrases[match.group(0).lower()] for match in pattern.finditer(text)]
+
+    def extract(self, business):
+        """
+        Fill what the rules can find in one business
+
+        Businesses already at the threshold are returned as they are.
+
+        Args:
+            business (dict): Business as read
+
+        Returns:
+            dict: The business, or an updated copy listing what was filled in rule_extracted_fields
+        """
+        record = BusinessRecord(business)
+        if record.completeness_score >= self.threshold:
+            return business
+
+        description = record.description if isinstance(record.description, str) else ''
+        category = record.category if isinstance(record.category, str) else ''
+        text = ' \n '.join((str(record.name or ''), category, description))
+        updates = {}
+
+        styles = self._matches(self.style_pattern, self.style_phrases, text)
+        styles += [style for flag, style in FLAG_STYLES.items() if business.get(flag) is True]
+        merged, added = _add(record.yoga_styles or [], styles, self.style_phrases)
+        if added:
+            updates['yoga_styles'] = merged
+
+        amenities = self._matches(self.amenity_pattern, self.amenity_phrases, text)
+        amenities += [amenity for flag, amenity in FLAG_AMENITIES.items() if business.get(flag) is True]
+        merged, added = _add(record.amenities or [], amenities, self.amenity_phrases)
+        if added:
+            updates['amenities'] = merged
+
+        # Languages only from the description; a name like "Dutch Yoga Bali" says nothing about teaching
+        languages = self._matches(self.language_pattern, self.language_phrases, description)
+        merged, added = _add(record.languages or [], languages, self.language_phrases)
+        if added:
+            updates['languages_spoken'] = merged
+
+        if not business.get('meditation_offered') and MEDITATION_PATTERN.search(text):
+            updates['meditation_offered'] = True
+        if not business.get('teacher_training') and TEACHER_TRAINING_PATTERN.search(text):
+            updates['teacher_training'] = True
+
+        handle = instagram_handle(business)
+        if handle and not business.get('instagram_handle'):
+            updates['instagram_handle'] = handle
+        if handle and not record.instagram:
+            updates['instagram_url'] = INSTAGRAM_URL.format(handle)
+
+        if not updates:
+            return business
+        extracted = dict(business)
+        extracted.update(updates)
+        extracted['rule_extracted_fields'] = sorted(set(decode_list(business.get('rule_extracted_fields')) or []) | set(updates))
+        self.extracted += 1
+        if BusinessRecord(extracted).completeness_score >= self.threshold:
+            self.lifted += 1
+        return extracted
+
+    def extract_all(self, businesses):
+        """Extract from every business in a stream, in order"""
+        for business in businesses:
+            yield self.extract(business)
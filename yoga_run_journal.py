@@ -0,0 +1,124 @@
+"""
+CRASH-SAFE ENHANCEMENT RUN JOURNAL
+==================================
+Append-only JSONL journal used by yoga_ai_enhancer.py so a crashed or
+interrupted run can be resumed without paying for finished businesses again:
+1. Every processed business is appended as a {"type": "record"} line
+2. Lines are buffered and written in batches, each followed by fsync
+3. Each batch ends with a {"type": "checkpoint"} line carrying the run's cost and stats
+4. On resume, only records up to the last checkpoint are trusted
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+
+class RunJournal:
+    def __init__(self, path, checkpoint_fn, flush_every=25, flush_interval=2.0):
+        """
+        Open the journal for appending
+
+        Args:
+            path (str|Path): Journal file path
+            checkpoint_fn (callable): Returns the run state dict to write with each flush
+            flush_every (int): Flush after this many buffered records
+            flush_interval (float): Flush when the oldest buffered record is this many seconds old
+        """
+        self.path = Path(path)
+        self.checkpoint_fn = checkpoint_fn
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.buffered_since = None
+        self.records_written = 0
+        _truncate_to_last_checkpoint(self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def append(self, business_id, status, record):
+        """
+        Buffer one finished business
+
+        Args:
+            business_id (str): Business id
+            status (str): "enhanced" or "failed"
+            record (dict): Business data to put in the output
+        """
+        self.buffer.append(json.dumps(
+            {'type': 'record', 'id': business_id, 'status': status, 'record': record},
+            ensure_ascii=False
+        ))
+        if self.buffered_since is None:
+            self.buffered_since = time.monotonic()
+
+        if (len(self.buffer) >= self.flush_every or
+                time.monotonic() - self.buffered_since >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Write buffered records plus a checkpoint in one write, then fsync"""
+        if not self.buffer:
+            return
+        checkpoint = dict(self.checkpoint_fn(), type='checkpoint', timestamp=time.time())
+        self.buffer.append(json.dumps(checkpoint, ensure_ascii=False))
+        self.file.write('\n'.join(self.buffer) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.records_written += len(self.buffer) - 1
+        self.buffer = []
+        self.buffered_since = None
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def _truncate_to_last_checkpoint(path):
+    """Cut anything after the last checkpoint left by a crash, so new lines start cleanly"""
+    if not path.exists():
+        return
+    with open(path, 'rb+') as file:
+        keep = 0
+        offset = 0
+        for line in file:
+            offset += len(line)
+            if line.endswith(b'\n') and b'"type": "checkpoint"' in line:
+                keep = offset
+        file.truncate(keep)
+
+
+def load_journal(path):
+    """
+    Read a journal back for resuming
+
+    Records written after the last checkpoint (a flush cut short by a crash)
+    are dropped, so the restored stats always match the restored records.
+
+    Args:
+        path (str|Path): Journal file path
+
+    Returns:
+        tuple: (dict of id -> {'status', 'record'}, last checkpoint dict or None)
+    """
+    completed = {}
+    pending = {}
+    checkpoint = None
+
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Torn final line from an interrupted write
+                break
+            if entry.get('type') == 'record':
+                pending[entry['id']] = {'status': entry['status'], 'record': entry['record']}
+            elif entry.get('type') == 'checkpoint':
+                completed.update(pending)
+                pending = {}
+                checkpoint = entry
+
+    return completed, checkpoint
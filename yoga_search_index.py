@@ -0,0 +1,354 @@
+"""
+SEARCH AND FACET INDEX SIDECAR
+==============================
+A compact index written next to each yoga_ai_enhancer.py output, so the
+website (lib/search-utils.ts, lib/filter-options.ts, lib/advanced-search-utils.ts)
+can answer filter queries with set intersections instead of scanning records:
+1. yoga_styles, amenities and languages_spoken are mapped to the website's filter labels
+   and inverted to sorted lists of integer record ids, as is price_range
+2. city is mapped to the website's location filter, a region of Bali, and facet counts are kept
+   per region, for the counts shown next to each filter
+3. opening_hours is parsed into a weekly bitmap of 30-minute slots per record
+4. Each record keeps its integer id from one run to the next: only records whose indexed
+   fields changed are indexed again, new ones get new ids, and removed ones leave a gap
+
+The enhancer writes it after every output file unless --no-search-index is
+given; --index-only brings it up to date for an existing output.
+
+Facet values use the website's ids: the label lowercased with spaces as
+dashes ("Power Yoga" -> "power-yoga"), with the label itself under "labels".
+Locations are the region ids of LOCATION_FILTERS in lib/filter-options.ts
+("south-bali", "central-bali", ...), with cities grouped into regions as
+LOCATION_GROUPS in lib/search-utils.ts groups them; a city in no region is
+left out of the location facet.
+
+Sidecar layout (output.search.json):
+    records: integer record id -> business id (null once removed)
+    facets: facet -> value id -> sorted record ids
+    labels: facet -> value id -> label
+    location_facets: region id -> {"businesses": n, facet -> value id -> count}
+    open_hours: integer record id -> hex of a weekly bitmap, or null if the hours are unknown;
+        bit day * 48 + slot (Monday = 0, slot 0 = 00:00-00:30) is set when open at the slot's start
+    fingerprints: integer record id -> hash of the record's indexed fields
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import hashlib
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+from yoga_business_record import decode_list
+from yoga_rule_extraction import AMENITY_ALIASES, STYLE_ALIASES, label_lookup
+
+SEARCH_INDEX_VERSION = 2
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+
+# Facet -> field it is read from
+FACET_FIELDS = (
+    ('yoga_styles', 'yoga_styles'),
+    ('amenities', 'amenities'),
+    ('languages', 'languages_spoken'),
+    ('price_range', 'price_range'),
+    ('location', 'city')
+)
+_INDEXED_FIELDS = tuple(field for _, field in FACET_FIELDS) + ('opening_hours',)
+
+# Website location filter -> the cities in it, as lib/search-utils.ts groups them ("South Bali" -> "south-bali")
+LOCATION_GROUPS = {
+    'South Bali': (
+        'Badung Regency', 'Denpasar City', 'Denpasar', 'Uluwatu', 'Padang-Padang', 'Canggu',
+        'Seminyak', 'Sanur', 'Jimbaran', 'Kuta'
+    ),
+    'Central Bali': ('Gianyar Regency', 'Ubud', 'Bangli Regency', 'Gianyar', 'Tegallalang'),
+    'East Bali': (
+        'Karangasem Regency', 'Abang', 'Klungkung Regency', 'Karangasem', 'Klungkung', 'Amed',
+        'Candidasa', 'Tulamben'
+    ),
+    'North Bali': ('Buleleng Regency', 'Buleleng', 'Singaraja', 'Lovina', 'Pemuteran'),
+    'West Bali': (
+        'Jembrana Regency', 'Tabanan Regency', 'Gunung', 'Jembrana', 'Tabanan', 'Bedugul', 'Balian'
+    ),
+    'Islands': ('Nusa Penida', 'Nusa Lembongan', 'Nusa Ceningan')
+}
+_REGIONS = {city.lower(): region for region, cities in LOCATION_GROUPS.items() for city in cities}
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+_TIME = r'(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?'
+_TIME_RANGE = re.compile(rf'^{_TIME}\s*(?:to|-|–)\s*{_TIME}$', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def search_index_path(output_path):
+    """Sidecar kept next to an output file, e.g. out.json -> out.search.json"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.stem + '.search.json')
+
+
+def value_id(label):
+    """Id the website gives a filter value: lowercased, with spaces as dashes"""
+    return _SPACES.sub('-', label.strip().lower())
+
+
+def _minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem[0].lower() == 'p' else 0)
+    return hour * 60 + minute
+
+
+def parse_time_range(text):
+    """
+    Minutes after midnight a range like "7:30 to 9 AM" or "10 PM to 2 AM" covers
+
+    A start without AM/PM takes the end's, unless that would put it after
+    the end ("11 to 1 PM" starts at 11 AM). An end before the start runs
+    past midnight.
+
+    Returns:
+        tuple: (start, end), end possibly past 1440; or None if it can't be read
+    """
+    match = _TIME_RANGE.match(text.strip())
+    if not match:
+        return None
+    start_hour, start_minute, start_meridiem, end_hour, end_minute, end_meridiem = match.groups()
+    end = _minutes(end_hour, end_minute, end_meridiem)
+    start = _minutes(start_hour, start_minute, start_meridiem or end_meridiem)
+    if not start_meridiem and end_meridiem and start > end:
+        flipped = _minutes(start_hour, start_minute, 'am' if end_meridiem[0].lower() == 'p' else 'pm')
+        if flipped < end:
+            start = flipped
+    if end <= start:
+        end += 24 * 60
+    return start, end
+
+
+def open_hours_bitmap(opening_hours):
+    """
+    Weekly bitmap of the 30-minute slots a business is open at the start of
+
+    Args:
+        opening_hours: [{"day": "Monday", "hours": "7 AM to 7 PM"}, ...], or that list as JSON
+
+    Returns:
+        int: Bit day * SLOTS_PER_DAY + slot set when open; None if the hours are missing or can't be read
+    """
+    if isinstance(opening_hours, str):
+        try:
+            opening_hours = json.loads(opening_hours)
+        except ValueError:
+            return None
+    if not opening_hours or not isinstance(opening_hours, list):
+        return None
+    bitmap = 0
+    for entry in opening_hours:
+        if not isinstance(entry, dict) or str(entry.get('day', '')).strip().lower() not in DAYS:
+            return None
+        day = DAYS.index(entry['day'].strip().lower())
+        hours = _SPACES.sub(' ', str(entry.get('hours') or '')).strip().lower()
+        if hours == 'closed':
+            continue
+        if hours in ('open 24 hours', '24 hours'):
+            ranges = [(0, 24 * 60)]
+        else:
+            ranges = [parse_time_range(part) for part in hours.split(',')]
+            if None in ranges:
+                return None
+        for start, end in ranges:
+            first = -(-start // SLOT_MINUTES)
+            last = -(-end // SLOT_MINUTES)
+            for slot in range(day * SLOTS_PER_DAY + first, day * SLOTS_PER_DAY + last):
+                bitmap |= 1 << (slot % WEEK_SLOTS)
+    return bitmap
+
+
+def _fingerprint(business):
+    values = [business.get(field) for field in _INDEXED_FIELDS]
+    text = json.dumps(values, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class SearchIndex:
+    def __init__(self, styles, amenities, languages):
+        """
+        Start an empty index
+
+        Args:
+            styles (iterable): Yoga style labels
+            amenities (iterable): Amenity labels
+            languages (iterable): Language names
+        """
+        styles, amenities, languages = list(styles), list(amenities), list(languages)
+        self.lookups = {
+            'yoga_styles': label_lookup(styles, STYLE_ALIASES),
+            'amenities': label_lookup(amenities, AMENITY_ALIASES),
+            'languages': label_lookup(languages, {})
+        }
+        # Indexes built with other labels map values differently, so they are rebuilt
+        self.vocabulary = hashlib.blake2b(
+            json.dumps([styles, amenities, languages]).encode('utf-8'), digest_size=8
+        ).hexdigest()
+        self.records = []  # Integer record id -> business id, None once removed
+        self.fingerprints = []
+        self.open_hours = []
+        self.positions = {}  # str(business id) -> integer record id
+        self.postings = {facet: {} for facet, _ in FACET_FIELDS}  # facet -> value id -> set of record ids
+        self.labels = {facet: {} for facet, _ in FACET_FIELDS}
+        self.keys = []  # Integer record id -> (facet, value id) pairs it is posted under
+        self.seen = set()
+        self.added = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.removed = 0
+        self.unreadable_hours = 0
+
+    @classmethod
+    def load(cls, path, styles, amenities, languages):
+        """
+        Open the index a previous run wrote, to update it in place
+
+        A missing sidecar, or one written by another version or with other
+        labels, gives an empty index.
+
+        Args:
+            path (str|Path): Sidecar file
+
+        Returns:
+            SearchIndex: The index, with every record not yet seen this run
+        """
+        index = cls(styles, amenities, languages)
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return index
+        if data.get('version') != SEARCH_INDEX_VERSION or data.get('vocabulary') != index.vocabulary:
+            return index
+
+        index.records = data['records']
+        index.fingerprints = data['fingerprints']
+        index.open_hours = data['open_hours']
+        index.positions = {business_id: position for position, business_id in enumerate(index.records)
+                           if business_id is not None}
+        index.keys = [[] for _ in index.records]
+        for facet, values in data['facets'].items():
+            for value, positions in values.items():
+                index.postings[facet][value] = set(positions)
+                for position in positions:
+                    index.keys[position].append((facet, value))
+        index.labels = {facet: dict(data['labels'].get(facet, {})) for facet, _ in FACET_FIELDS}
+        return index
+
+    def _facet_values(self, facet, value):
+        """(value id, label) pairs a field value is indexed under"""
+        if facet in self.lookups:
+            labels = []
+            for item in decode_list(value) or []:
+                text = str(item).replace('_', ' ').strip()
+                if text:
+                    labels.append(self.lookups[facet].get(_SPACES.sub(' ', text.lower()), text))
+        elif facet == 'location':
+            region = _REGIONS.get(_SPACES.sub(' ', str(value or '').strip().lower()))
+            labels = [region] if region else []
+        else:
+            labels = [str(value).strip()] if value not in (None, '') else []
+        return {value_id(label): label for label in labels if value_id(label)}
+
+    def add(self, business):
+        """
+        Index one business of the output, reusing its entry if its indexed fields haven't changed
+
+        Args:
+            business (dict): Business as written
+        """
+        business_id = str(business.get('id'))
+        fingerprint = _fingerprint(business)
+        position = self.positions.get(business_id)
+        self.seen.add(business_id)
+        if position is not None and self.fingerprints[position] == fingerprint:
+            self.unchanged += 1
+            return
+
+        if position is None:
+            position = len(self.records)
+            self.records.append(business_id)
+            self.fingerprints.append(None)
+            self.open_hours.append(None)
+            self.keys.append([])
+            self.positions[business_id] = position
+            self.added += 1
+        else:
+            self._unpost(position)
+            self.updated += 1
+
+        for facet, field in FACET_FIELDS:
+            for value, label in self._facet_values(facet, business.get(field)).items():
+                self.postings[facet].setdefault(value, set()).add(position)
+                self.labels[facet].setdefault(value, label)
+                self.keys[position].append((facet, value))
+        bitmap = open_hours_bitmap(business.get('opening_hours'))
+        if bitmap is None and business.get('opening_hours') not in (None, '', '[]', []):
+            self.unreadable_hours += 1
+        self.open_hours[position] = None if bitmap is None else f"{bitmap:0{WEEK_SLOTS // 4}x}"
+        self.fingerprints[position] = fingerprint
+
+    def _unpost(self, position):
+        for facet, value in self.keys[position]:
+            positions = self.postings[facet].get(value)
+            if positions is not None:
+                positions.discard(position)
+                if not positions:
+                    del self.postings[facet][value]
+                    self.labels[facet].pop(value, None)
+        self.keys[position] = []
+
+    def finish(self):
+        """Remove the businesses the output no longer has; their record ids aren't reused"""
+        for business_id, position in list(self.positions.items()):
+            if business_id in self.seen:
+                continue
+            self._unpost(position)
+            self.records[position] = None
+            self.fingerprints[position] = None
+            self.open_hours[position] = None
+            del self.positions[business_id]
+            self.removed += 1
+
+    def location_facets(self):
+        """Region id -> businesses there and the count of every other facet value among them"""
+        facets = {}
+        for region, in_region in self.postings['location'].items():
+            counts = {'businesses': len(in_region)}
+            for facet, _ in FACET_FIELDS:
+                if facet != 'location':
+                    counts[facet] = {value: len(positions & in_region)
+                                     for value, positions in sorted(self.postings[facet].items())
+                                     if not positions.isdisjoint(in_region)}
+            facets[region] = counts
+        return facets
+
+    def save(self, path):
+        """Write the sidecar as compact JSON, replacing any previous one once complete"""
+        path = Path(path)
+        data = {
+            'version': SEARCH_INDEX_VERSION,
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'vocabulary': self.vocabulary,
+            'slot_minutes': SLOT_MINUTES,
+            'records': self.records,
+            'facets': {facet: {value: sorted(positions) for value, positions in sorted(values.items())}
+                       for facet, values in self.postings.items()},
+            'labels': {facet: dict(sorted(labels.items())) for facet, labels in self.labels.items()},
+            'location_facets': self.location_facets(),
+            'open_hours': self.open_hours,
+            'fingerprints': self.fingerprints
+        }
+        temp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+        temp_path.replace(path)
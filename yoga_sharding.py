@@ -0,0 +1,274 @@
+"""
+SHARDED MULTI-PROCESS ENHANCEMENT RUNS
+======================================
+Splits one enhancement run of yoga_ai_enhancer.py across worker processes,
+or machines, that share a single budget:
+1. Businesses are assigned to shards by a hash of their id, so every worker sees a stable subset
+2. Each worker enhances its shard into its own output file, reserving spend in a shared SQLite ledger
+3. The shard outputs are merged back into input order, with their enhancement_stats summed
+4. Dead-letter files from every shard are combined next to the merged output
+
+On one machine, --workers N does all of this. Across machines, run each
+worker with --shard I/N --shared-ledger PATH (the ledger on storage every
+machine can lock), then combine the outputs with --merge-shards.
+
+For: Bali Yoga Studios & Retreats Project
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+from yoga_retry_queue import dead_letter_path
+from yoga_snapshot import dataset_writer, iter_businesses, read_metadata
+
+
+def shard_of(business_id, shard_count):
+    """
+    Shard a business belongs to, the same in every process and on every machine
+
+    Args:
+        business_id: Business id
+        shard_count (int): Number of shards
+
+    Returns:
+        int: Shard index from 0 to shard_count - 1
+    """
+    digest = hashlib.blake2b(str(business_id).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+
+def parse_shard(text):
+    """
+    Parse a shard given as INDEX/COUNT, e.g. 0/4
+
+    Returns:
+        tuple: (index, count)
+    """
+    index, _, count = text.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"shard index must be between 0 and {count - 1}")
+    return index, count
+
+
+def shard_path(path, index, count):
+    """A per-shard file next to path, e.g. out.json -> out.shard-0-of-4.json"""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.shard-{index}-of-{count}{path.suffix}")
+
+
+def shared_ledger_path(output_path):
+    """Shared ledger kept next to the merged output while workers run"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.stem + '.ledger.sqlite')
+
+
+def merge_stats(stats_list):
+    """
+    Combine the enhancement_stats of several shards
+
+    Every stat is a count or a cost, so they add up.
+
+    Args:
+        stats_list (list): enhancement_stats dicts
+
+    Returns:
+        dict: Summed stats
+    """
+    merged = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def merge_shards(input_path, shard_paths, output_path):
+    """
+    Merge shard outputs back into one dataset in input order
+
+    The input is streamed once; each business is taken from the shard its
+    id hashes to. Shards keep their own businesses in input order, so the
+    merge needs only one open position per shard, however large the data.
+
+    Args:
+        input_path (str|Path): Input dataset the shards were run on
+        shard_paths (list): Shard output files, in any order
+        output_path (str|Path): Merged output file
+
+    Returns:
+        dict: The merged metadata
+
+    Raises:
+        ValueError: If the shards are incomplete or don't match the input
+    """
+    shards = {}
+    count = None
+    metadata = []
+    for path in shard_paths:
+        shard_metadata = read_metadata(path) or {}
+        shard = shard_metadata.get('shard')
+        if not shard:
+            raise ValueError(f"{path} is not a shard output (no shard in its metadata)")
+        if count is not None and shard['count'] != count:
+            raise ValueError(f"{path} is shard {shard['index']}/{shard['count']}, expected one of {count}")
+        count = shard['count']
+        shards[shard['index']] = Path(path)
+        metadata.append(shard_metadata)
+    if count is None or len(shards) != count:
+        missing = sorted(set(range(count or 1)) - set(shards))
+        raise ValueError(f"Missing shard outputs: {', '.join(f'{index}/{count}' for index in missing)}")
+
+    readers = {index: iter_businesses(path) for index, path in shards.items()}
+    writer = dataset_writer(output_path)
+    try:
+        for business in iter_businesses(input_path):
+            index = shard_of(business.get('id'), count)
+            merged = next(readers[index], None)
+            if merged is None or str(merged.get('id')) != str(business.get('id')):
+                raise ValueError(f"Shard {index}/{count} doesn't match the input at business {business.get('id')}")
+            writer.write(merged)
+        for index, reader in readers.items():
+            if next(reader, None) is not None:
+                raise ValueError(f"Shard {index}/{count} has businesses that aren't in the input")
+    except BaseException:
+        writer.abort()
+        raise
+
+    merged_metadata = {key: value for key, value in metadata[0].items() if key != 'shard'}
+    merged_metadata.update({
+        'total_businesses': writer.count,
+        'columns': writer.columns,
+        'shards': count,
+        'enhancement_stats': merge_stats(shard_metadata.get('enhancement_stats', {}) for shard_metadata in metadata)
+    })
+    writer.close(merged_metadata)
+    return merged_metadata
+
+
+def merge_dead_letters(shard_paths, output_path):
+    """
+    Combine the shards' dead-letter files into one next to the merged output
+
+    Returns:
+        int: Businesses in the combined file
+    """
+    target = dead_letter_path(output_path)
+    lines = []
+    for path in shard_paths:
+        source = dead_letter_path(path)
+        if not source.exists():
+            continue
+        with open(source, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    entry['output'] = str(output_path)
+                    lines.append(json.dumps(entry, ensure_ascii=False))
+    if lines:
+        with open(target, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+    else:
+        target.unlink(missing_ok=True)
+    return len(lines)
+
+
+def strip_options(argv, with_value=(), flags=()):
+    """
+    Remove options from a command line, e.g. before passing it on to workers
+
+    Args:
+        argv (list): Arguments, without the program name
+        with_value (iterable): Options followed by a value (--name value or --name=value)
+        flags (iterable): Options without a value
+
+    Returns:
+        list: The remaining arguments, with any --name=value split in two
+    """
+    with_value, flags = set(with_value), set(flags)
+    kept = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in with_value:
+            skip = True
+        elif arg in flags:
+            continue
+        elif arg.startswith('--') and '=' in arg:
+            name, value = arg.split('=', 1)
+            if name not in with_value:
+                kept.extend((name, value))
+        else:
+            kept.append(arg)
+    return kept
+
+
+def worker_args(argv, index, count):
+    """
+    One worker's copy of a command line
+
+    Metrics and trace files get a per-shard name and the metrics port is
+    offset by the shard, so workers don't overwrite or collide with each other.
+
+    Args:
+        argv (list): Arguments from strip_options
+        index (int): Shard index
+        count (int): Number of shards
+
+    Returns:
+        list: Arguments for the worker
+    """
+    args = list(argv)
+    for position, arg in enumerate(args[:-1]):
+        if arg in ('--metrics-file', '--trace-file'):
+            args[position + 1] = str(shard_path(args[position + 1], index, count))
+        elif arg == '--metrics-port' and int(args[position + 1]):
+            args[position + 1] = str(int(args[position + 1]) + 1 + index)
+    return args
+
+
+def _relay(process, prefix):
+    for line in process.stdout:
+        print(f"{prefix} {line}", end='', flush=True)
+
+
+def run_workers(script, worker_args):
+    """
+    Run one worker process per shard and wait for all of them
+
+    Each worker's output is relayed with its shard as a prefix.
+
+    Args:
+        script (str|Path): Enhancer script to run
+        worker_args (list): Command-line arguments for each worker, in shard order
+
+    Returns:
+        list: Exit code of each worker
+    """
+    env = {**os.environ, 'PYTHONUNBUFFERED': '1', 'PYTHONIOENCODING': 'utf-8'}
+    processes = []
+    relays = []
+    for index, args in enumerate(worker_args):
+        process = subprocess.Popen(
+            [sys.executable, str(script), *args],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8', env=env
+        )
+        relay = threading.Thread(target=_relay, args=(process, f"[{index}/{len(worker_args)}]"), daemon=True)
+        relay.start()
+        processes.append(process)
+        relays.append(relay)
+    try:
+        codes = [process.wait() for process in processes]
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        raise
+    for relay in relays:
+        relay.join()
+    return codes